@@ -0,0 +1,45 @@
+# Мікробенчмарк етапу збору ознак спам-фільтра.
+# Запуск з кореня проєкту: python -m benchmarks.bench_message_features
+import re
+import timeit
+
+from bot.features.message_filtering.antispam_service import extract_message_features
+
+
+def legacy_features(message_text: str):
+    """Попередня реалізація: повторні пошуки за рядковими шаблонами та генератор для КАПСу."""
+    text_lower = message_text.lower()
+    url_pattern = r'(https?://|www\.|t\.me/)[^\s]+'
+    urls_count = len(re.findall(url_pattern, text_lower)) if re.search(url_pattern, text_lower) else 0
+    mentions_count = len(re.findall(r'@\w+', text_lower))
+    if mentions_count > 2:
+        mentions_count = len(re.findall(r'@\w+', text_lower))
+    caps = len(message_text) > 10 and (sum(1 for c in message_text if c.isupper()) / len(message_text)) > 0.7
+    return urls_count, mentions_count, caps
+
+
+def build_message(repeats: int, emoji: bool = False) -> str:
+    chunk = "ЗАРОБІТОК БЕЗ ВКЛАДЕНЬ пиши @manager та @helper https://t.me/joinchat/abc www.example.com "
+    if emoji:
+        chunk += "🔥💰 "
+    return chunk * repeats
+
+
+def main():
+    for repeats, emoji in ((1, False), (10, False), (50, False), (50, True)):
+        message = build_message(repeats, emoji)
+        features = extract_message_features(message)
+        legacy = legacy_features(message)
+        assert (features.url_count, features.mention_count) == legacy[:2]
+        assert (features.length > 10 and features.uppercase_ratio > 0.7) == legacy[2]
+
+        number = 2000
+        legacy_time = timeit.timeit(lambda: legacy_features(message), number=number)
+        new_time = timeit.timeit(lambda: extract_message_features(message), number=number)
+        label = "з емодзі" if emoji else "без емодзі"
+        print(f"{len(message):>6} символів ({label}): legacy {legacy_time / number * 1e6:8.1f} мкс, "
+              f"features {new_time / number * 1e6:8.1f} мкс, прискорення x{legacy_time / new_time:.2f}")
+
+
+if __name__ == "__main__":
+    main()
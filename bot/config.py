@@ -14,4 +14,26 @@ except (TypeError, ValueError):
     logging.critical("ПОМИЛКА: Перевірте, що ADMIN_ID вказано у файлі .env і є числом.")
     exit()
 
-DB_NAME = "bot_database_v6.db"
\ No newline at end of file
+DB_NAME = "bot_database_v6.db"
+
+# Скільки днів зберігати записи action_logs (0 - зберігати завжди, як і до появи очищення).
+# Для окремої групи можна задати власний термін у налаштуваннях групи.
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "0"))
+# Каталог для gzip-архівів видалених логів (порожньо - без архівації)
+LOG_ARCHIVE_DIR = os.getenv("LOG_ARCHIVE_DIR", "")
+
+# Ключ для підпису кнопок капчі (якщо не задано - виводиться з BOT_TOKEN)
+CAPTCHA_SECRET = os.getenv("CAPTCHA_SECRET")
+
+# Спосіб отримання оновлень: "polling" (за замовчуванням) або "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+# Публічна адреса веб-сервера для вебхука (за замовчуванням - адреса Web App)
+WEBHOOK_URL = os.getenv("WEBHOOK_URL") or WEB_APP_URL
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+# Секрет, який Telegram надсилає в заголовку X-Telegram-Bot-Api-Secret-Token
+# (якщо не задано - виводиться з BOT_TOKEN; дозволені лише A-Z, a-z, 0-9, _ та -)
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+
+# Кількість процесів-обробників. 1 - усе в одному процесі; більше - головний процес
+# лише приймає оновлення і розподіляє чати між обробниками за chat_id
+WORKER_PROCESSES = max(1, int(os.getenv("WORKER_PROCESSES", "1")))
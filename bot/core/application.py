@@ -1,8 +1,30 @@
 from telegram.ext import Application
 from bot.config import BOT_TOKEN
+from bot.infrastructure.async_database import shutdown_db_executor
+from bot.infrastructure.chat_persistence import ChatStatePersistence
+from bot.infrastructure.db_connection import close_all_connections
+from bot.infrastructure.live_stats import live_stats
+from bot.infrastructure.write_buffer import stats_buffer
+from bot.infrastructure.outbound_dispatcher import shutdown_outbound_dispatcher
 
 def create_application() -> Application:
     """Створює та повертає екземпляр Application."""
     if not BOT_TOKEN:
         raise ValueError("BOT_TOKEN не знайдено! Перевірте .env файл.")
-    return Application.builder().token(BOT_TOKEN).concurrent_updates(True).build()
\ No newline at end of file
+    # Стан чатів у пам'яті (трекер флуду, спроби спільної капчі) зберігається в БД між перезапусками
+    return (Application.builder().token(BOT_TOKEN).concurrent_updates(True)
+            .persistence(ChatStatePersistence()).build())
+
+
+async def shutdown_resources():
+    """Звільняє ресурси процесу бота в правильному порядку (викликається при зупинці)."""
+    # Зупиняємо розсилку живої статистики (обробник передає головному процесу залишок)
+    live_stats.stop()
+    # Зупиняємо чергу вихідних запитів до Telegram
+    await shutdown_outbound_dispatcher()
+    # Дочікуємось запитів, що ще виконуються в потоках БД
+    shutdown_db_executor()
+    # Записуємо в БД логи та статистику, що ще лежать у буфері
+    stats_buffer.stop()
+    # Закриваємо довгоживучі з'єднання з БД (WAL-файл буде коректно зведено)
+    close_all_connections()
@@ -1,21 +1,78 @@
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, ChatMemberHandler, filters
+from telegram import Update
+from telegram.ext import Application, BaseHandler, CommandHandler, CallbackQueryHandler, MessageHandler, ChatMemberHandler, filters
 from telegram.constants import ChatMemberStatus
 
 # Імпортуємо всі наші обробники
 from bot.features.common_commands.start_handler import start
+from bot.features.common_commands.reload_translations_handler import reload_translations_command
 from bot.features.admin_panel_web.launch_handler import launch_settings_web_app
 from bot.features.group_join.new_member_handler import new_member_handler
 from bot.features.group_join.captcha_handler import captcha_handler
+from bot.features.group_join.captcha_timeout import captcha_timeouts_tick_job, load_captcha_timeouts_job
 from bot.features.message_filtering.message_handler import message_handler
 from bot.features.message_filtering.log_action_handler import log_action_handler
+from bot.features.message_filtering.antiflood_service import sweep_flood_trackers_job
+from bot.features.message_filtering.delete_message_job import delete_messages_job, DELETION_BUCKET_SECONDS
+from bot.infrastructure.log_retention import prune_action_logs_job, PRUNE_INTERVAL_SECONDS
+from bot.infrastructure.sharding import is_primary_shard
 from bot.features.bot_management.my_chat_member_handler import my_chat_member_handler
+from bot.features.bot_management.group_teardown_job import group_teardown_job
+
+def _message_update_types(message_filter) -> list:
+    """
+    Типи оновлень, які пропускає фільтр повідомлень. Без filters.UpdateType.MESSAGE
+    (чи EDITED_MESSAGE) серед умов, об'єднаних через &, проходять і редагування.
+    """
+    pending = [message_filter]
+    while pending:
+        current = pending.pop()
+        if current is filters.UpdateType.MESSAGE:
+            return [Update.MESSAGE]
+        if current is filters.UpdateType.EDITED_MESSAGE:
+            return [Update.EDITED_MESSAGE]
+        and_filter = getattr(current, 'and_filter', None)
+        if and_filter is not None:
+            pending.extend((current.base_filter, and_filter))
+    return [Update.MESSAGE, Update.EDITED_MESSAGE]
+
+
+def _handler_update_types(handler: BaseHandler) -> list:
+    """Типи оновлень, які може обробити обробник; None - невідомий тип обробника."""
+    if isinstance(handler, (CommandHandler, MessageHandler)):
+        return _message_update_types(handler.filters)
+    if isinstance(handler, CallbackQueryHandler):
+        return [Update.CALLBACK_QUERY]
+    if isinstance(handler, ChatMemberHandler):
+        return {
+            ChatMemberHandler.CHAT_MEMBER: [Update.CHAT_MEMBER],
+            ChatMemberHandler.MY_CHAT_MEMBER: [Update.MY_CHAT_MEMBER],
+        }.get(handler.chat_member_types, [Update.CHAT_MEMBER, Update.MY_CHAT_MEMBER])
+    return None
+
+
+def get_allowed_updates(app: Application) -> list:
+    """
+    Збирає типи оновлень, для яких зареєстровано обробники, щоб Telegram
+    не надсилав боту решту. Для невідомого обробника - всі типи.
+    """
+    allowed = set()
+    for handlers in app.handlers.values():
+        for handler in handlers:
+            update_types = _handler_update_types(handler)
+            if update_types is None:
+                return Update.ALL_TYPES
+            allowed.update(update_types)
+    return sorted(allowed)
+
 
 def register_handlers(app: Application):
     """Реєструє всі обробники в додатку."""
 
-    # 1. Команди
-    app.add_handler(CommandHandler("start", start))
-    app.add_handler(CommandHandler("settings", launch_settings_web_app))
+    # 1. Команди (редаговані повідомлення не обробляються - обробники читають update.message)
+    app.add_handler(CommandHandler("start", start, filters=filters.UpdateType.MESSAGE))
+    app.add_handler(CommandHandler("settings", launch_settings_web_app, filters=filters.UpdateType.MESSAGE))
+    app.add_handler(CommandHandler("reload_translations", reload_translations_command,
+                                   filters=filters.UpdateType.MESSAGE))
 
     # 2. Обробники подій у групі (вхід, капча, логи)
     app.add_handler(ChatMemberHandler(new_member_handler, ChatMemberHandler.CHAT_MEMBER))
@@ -23,5 +80,23 @@ def register_handlers(app: Application):
     app.add_handler(CallbackQueryHandler(log_action_handler, pattern=r"^log:"))
 
     # 3. Обробник повідомлень (має бути одним з останніх)
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND & filters.ChatType.GROUPS, message_handler))
+    app.add_handler(MessageHandler(filters.UpdateType.MESSAGE & filters.TEXT & ~filters.COMMAND & filters.ChatType.GROUPS,
+                                   message_handler))
     app.add_handler(ChatMemberHandler(my_chat_member_handler, ChatMemberHandler.MY_CHAT_MEMBER))
+
+    # 4. Періодичні завдання
+    # Таймаути капчі: відновлення після перезапуску та обробка колеса таймерів щосекунди
+    app.job_queue.run_once(load_captcha_timeouts_job, 0, name="captcha_timeouts_load")
+    app.job_queue.run_repeating(captcha_timeouts_tick_job, interval=1, first=1, name="captcha_timeouts_tick")
+    # Пакетне видалення службових повідомлень (попередження, результати капчі)
+    app.job_queue.run_repeating(delete_messages_job, interval=DELETION_BUCKET_SECONDS, first=DELETION_BUCKET_SECONDS,
+                                name="scheduled_message_deletion")
+    # Прибирання неактивних користувачів з трекерів флуду (для чатів, де повідомлень більше немає)
+    app.job_queue.run_repeating(sweep_flood_trackers_job, interval=60, first=60, name="flood_tracker_sweep")
+
+    # Завдання для всієї БД виконує лише один процес-обробник
+    if is_primary_shard():
+        # Очищення логів, старших за термін зберігання
+        app.job_queue.run_repeating(prune_action_logs_job, interval=PRUNE_INTERVAL_SECONDS, first=300, name="action_logs_prune")
+        # Продовження видалення даних груп, перерваного зупинкою бота
+        app.job_queue.run_once(group_teardown_job, 5, name="group_teardown")
@@ -0,0 +1,335 @@
+import asyncio
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from typing import Optional
+from telegram import Update
+
+from bot.core.application import create_application, shutdown_resources
+from bot.core.dispatcher import register_handlers
+from bot.infrastructure.chat_config_cache import chat_config_cache
+from bot.infrastructure.live_stats import live_stats
+from bot.infrastructure.localization import load_translations, reload_translations
+from bot.infrastructure.write_buffer import stats_buffer
+from bot.infrastructure.sharding import configure_shard, shard_for_chat, update_chat_id
+
+# Як часто процес-обробник відмічається, що живий
+HEARTBEAT_INTERVAL_SECONDS = 2
+# Процес без відмітки довше за цей час вважається завислим і перезапускається
+HEARTBEAT_TIMEOUT_SECONDS = 30
+# Як часто головний процес перевіряє стан обробників
+MONITOR_INTERVAL_SECONDS = 5
+# Скільки чекати на коректне завершення обробника перед примусовою зупинкою
+STOP_TIMEOUT_SECONDS = 10
+
+# Типи повідомлень у черзі процесу-обробника
+MSG_UPDATE = 'update'
+MSG_INVALIDATE = 'invalidate'
+MSG_RELOAD_TRANSLATIONS = 'reload_translations'
+MSG_LIVE_STATS_WATCH = 'live_stats_watch'
+MSG_STOP = 'stop'
+
+# Типи подій від обробника до головного процесу
+EVENT_LIVE_STATS = 'live_stats'
+EVENT_INVALIDATE = 'invalidate'
+EVENT_RELOAD_TRANSLATIONS = 'reload_translations'
+
+
+class WorkerPool:
+    """
+    Розподіл оновлень між процесами-обробниками.
+
+    Головний процес лише приймає оновлення (полінг або вебхук) і за хешем chat_id
+    передає кожне в чергу свого процесу. Усі оновлення одного чату завжди потрапляють
+    в один процес, тому стан чату в пам'яті (трекер флуду, спроби капчі, рейд)
+    лишається локальним. Завислі чи аварійно завершені процеси перезапускаються.
+    Інвалідації кешу конфігурації з обробників (зміна адміна, видалення даних групи)
+    передаються головному процесу, який застосовує їх сам і розсилає решті обробників.
+    Прирости живої статистики обробники передають назад через спільну чергу подій -
+    лише для чатів, відкритих у панелях (список розсилається так само, як інвалідації).
+    """
+
+    def __init__(self, count: int):
+        self.count = count
+        self._ctx = multiprocessing.get_context("spawn")
+        # Черги створюються один раз: після перезапуску процес отримує необроблені оновлення
+        self._queues = [self._ctx.Queue() for _ in range(count)]
+        self._heartbeats = [self._ctx.Value('d', 0.0) for _ in range(count)]
+        # Обробники -> головний процес: прирости живої статистики, запити на перезавантаження перекладів
+        self._events = self._ctx.Queue()
+        self._processes = [None] * count
+        self._routed = [0] * count
+        self._restarts = [0] * count
+        self._tasks = []
+        # Обробник, від якого прийшла інвалідація, що зараз застосовується (йому її не повертаємо)
+        self._invalidation_source = threading.local()
+
+    # --- Життєвий цикл процесів ---
+
+    def _spawn(self, index: int):
+        # Відлік таймауту - з моменту запуску, поки процес ще імпортує модулі
+        self._heartbeats[index].value = time.time()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(index, self.count, self._queues[index], self._heartbeats[index], self._events),
+            name=f"worker-{index}", daemon=True
+        )
+        process.start()
+        self._processes[index] = process
+        # Перезапущений процес має знати, за якими чатами вже стежать панелі
+        watched = live_stats.watched_chats()
+        if watched:
+            self._queues[index].put((MSG_LIVE_STATS_WATCH, watched))
+
+    def start(self, update_queue: asyncio.Queue):
+        """Запускає процеси-обробники та пересилання оновлень з update_queue."""
+        for index in range(self.count):
+            self._spawn(index)
+        # Зміни налаштувань через веб-панель мають скинути кеш і в обробниках
+        chat_config_cache.add_invalidation_listener(self.broadcast_invalidation)
+        live_stats.add_watch_listener(self.broadcast_watched_chats)
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._forward(update_queue)), loop.create_task(self._monitor()),
+                       loop.create_task(self._receive_events())]
+        logging.info(f"Запущено {self.count} процесів-обробників.")
+
+    def stop(self):
+        """Просить обробники завершитися, а тих, хто не встиг, зупиняє примусово."""
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        chat_config_cache.remove_invalidation_listener(self.broadcast_invalidation)
+        live_stats.remove_watch_listener(self.broadcast_watched_chats)
+        for worker_queue in self._queues:
+            worker_queue.put((MSG_STOP, None))
+        deadline = time.time() + STOP_TIMEOUT_SECONDS
+        for process in self._processes:
+            if process is None:
+                continue
+            process.join(max(0.0, deadline - time.time()))
+            if process.is_alive():
+                process.terminate()
+                process.join()
+
+    def check_health(self, now: float = None) -> list:
+        """Перезапускає процеси, що завершилися чи не відмічалися. Повертає їхні номери."""
+        now = time.time() if now is None else now
+        restarted = []
+        for index, process in enumerate(self._processes):
+            alive = process is not None and process.is_alive()
+            silent_for = now - self._heartbeats[index].value
+            if alive and silent_for <= HEARTBEAT_TIMEOUT_SECONDS:
+                continue
+            if alive:
+                logging.error(f"Обробник {index} не відповідає {silent_for:.0f} с. Перезапускаю.")
+                process.terminate()
+                process.join(STOP_TIMEOUT_SECONDS)
+            else:
+                exit_code = process.exitcode if process is not None else None
+                logging.error(f"Обробник {index} завершився (код {exit_code}). Перезапускаю.")
+            self._spawn(index)
+            self._restarts[index] += 1
+            restarted.append(index)
+        return restarted
+
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(MONITOR_INTERVAL_SECONDS)
+            self.check_health()
+
+    # --- Маршрутизація ---
+
+    def route(self, update: dict) -> int:
+        """Ставить сире оновлення в чергу процесу, якому належить його чат. Повертає номер процесу."""
+        chat_id = update_chat_id(update)
+        index = shard_for_chat(chat_id, self.count) if chat_id is not None else 0
+        self._queues[index].put((MSG_UPDATE, update))
+        self._routed[index] += 1
+        return index
+
+    async def _forward(self, update_queue: asyncio.Queue):
+        while True:
+            update = await update_queue.get()
+            try:
+                self.route(update.to_dict())
+            except Exception as e:
+                logging.error(f"Не вдалося передати оновлення {update.update_id} обробнику: {e}")
+
+    async def _receive_events(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await loop.run_in_executor(None, _next_message, self._events)
+            if message is not None:
+                self.handle_event(*message)
+
+    def handle_event(self, kind: str, data):
+        if kind == EVENT_LIVE_STATS:
+            live_stats.publish_many(data)
+        elif kind == EVENT_INVALIDATE:
+            # Кеш головного процесу (API, перевірки доступу) скидається; слухач розішле решті обробників
+            source, group_id = data
+            self._invalidation_source.index = source
+            try:
+                _apply_invalidation(group_id)
+            finally:
+                self._invalidation_source.index = None
+        elif kind == EVENT_RELOAD_TRANSLATIONS:
+            # Головний процес віддає /api/translations, тож перечитує переклади й сам
+            reload_translations()
+            self.broadcast(MSG_RELOAD_TRANSLATIONS)
+
+    def broadcast(self, kind: str, data=None):
+        for worker_queue in self._queues:
+            worker_queue.put((kind, data))
+
+    def broadcast_invalidation(self, group_id: Optional[int]):
+        source = getattr(self._invalidation_source, 'index', None)
+        for index, worker_queue in enumerate(self._queues):
+            if index != source:
+                worker_queue.put((MSG_INVALIDATE, group_id))
+
+    def broadcast_watched_chats(self, chat_ids):
+        self.broadcast(MSG_LIVE_STATS_WATCH, chat_ids)
+
+    def get_metrics(self) -> dict:
+        now = time.time()
+        return {
+            'workers': [
+                {
+                    'index': index,
+                    'pid': process.pid if process is not None else None,
+                    'alive': process is not None and process.is_alive(),
+                    'heartbeat_age': round(now - self._heartbeats[index].value, 1),
+                    'routed': self._routed[index],
+                    'restarts': self._restarts[index],
+                }
+                for index, process in enumerate(self._processes)
+            ]
+        }
+
+
+_worker_pool: Optional[WorkerPool] = None
+
+
+def get_worker_pool() -> Optional[WorkerPool]:
+    """Пул процесів-обробників або None, якщо бот працює в одному процесі."""
+    return _worker_pool
+
+
+def start_worker_pool(count: int, update_queue: asyncio.Queue) -> WorkerPool:
+    global _worker_pool
+    _worker_pool = WorkerPool(count)
+    _worker_pool.start(update_queue)
+    return _worker_pool
+
+
+def stop_worker_pool():
+    global _worker_pool
+    if _worker_pool is not None:
+        _worker_pool.stop()
+        _worker_pool = None
+
+
+def broadcast_translations_reload():
+    """
+    Після перезавантаження перекладів в одному процесі просить перечитати їх усі інші:
+    обробник передає запит головному процесу, а той - решті обробників.
+    В режимі одного процесу нічого не робить.
+    """
+    if _events_to_main is not None:
+        _events_to_main.put((EVENT_RELOAD_TRANSLATIONS, None))
+    elif _worker_pool is not None:
+        _worker_pool.broadcast(MSG_RELOAD_TRANSLATIONS)
+
+
+# --- Процес-обробник ---
+
+# Черга подій до головного процесу (задана лише в процесі-обробнику)
+_events_to_main = None
+# Позначка потоку, що застосовує інвалідацію від головного процесу (її не треба пересилати назад)
+_remote_invalidation = threading.local()
+
+
+def _apply_invalidation(group_id: Optional[int]):
+    if group_id is None:
+        chat_config_cache.invalidate_all()
+    else:
+        chat_config_cache.invalidate(group_id)
+
+def _next_message(worker_queue):
+    """Блокуюче читання з таймаутом, щоб потік не завис на зупинці процесу."""
+    try:
+        return worker_queue.get(timeout=1)
+    except queue.Empty:
+        return None
+
+
+async def _heartbeat(heartbeat):
+    while True:
+        heartbeat.value = time.time()
+        await asyncio.sleep(HEARTBEAT_INTERVAL_SECONDS)
+
+
+async def _run_worker(index: int, worker_queue, heartbeat, events):
+    loop = asyncio.get_running_loop()
+    heartbeat_task = loop.create_task(_heartbeat(heartbeat))
+    load_translations()
+    stats_buffer.start()
+    global _events_to_main
+    _events_to_main = events
+    # Панелі підключені до головного процесу - передаємо прирости туди
+    live_stats.set_forwarder(lambda deltas: events.put((EVENT_LIVE_STATS, deltas)))
+    live_stats.start()
+
+    def forward_invalidation(group_id: Optional[int]):
+        if not getattr(_remote_invalidation, 'active', False):
+            events.put((EVENT_INVALIDATE, (index, group_id)))
+
+    # Зміни адмінів і видалення груп відбуваються тут, а API обслуговує головний процес
+    chat_config_cache.add_invalidation_listener(forward_invalidation)
+    app = create_application()
+    register_handlers(app)
+    try:
+        async with app:
+            await app.start()
+            logging.info(f"Обробник {index} готовий.")
+            while True:
+                message = await loop.run_in_executor(None, _next_message, worker_queue)
+                if message is None:
+                    continue
+                kind, data = message
+                if kind == MSG_STOP:
+                    break
+                if kind == MSG_INVALIDATE:
+                    _remote_invalidation.active = True
+                    try:
+                        _apply_invalidation(data)
+                    finally:
+                        _remote_invalidation.active = False
+                    continue
+                if kind == MSG_RELOAD_TRANSLATIONS:
+                    load_translations()
+                    continue
+                if kind == MSG_LIVE_STATS_WATCH:
+                    live_stats.set_watched(data)
+                    continue
+                await app.update_queue.put(Update.de_json(data, app.bot))
+            await app.stop()
+    finally:
+        heartbeat_task.cancel()
+        await shutdown_resources()
+
+
+def _worker_main(index: int, count: int, worker_queue, heartbeat, events):
+    """Точка входу процесу-обробника."""
+    logging.basicConfig(
+        format=f"%(asctime)s - worker-{index} - %(name)s - %(levelname)s - %(message)s",
+        level=logging.INFO
+    )
+    configure_shard(index, count)
+    try:
+        asyncio.run(_run_worker(index, worker_queue, heartbeat, events))
+    except KeyboardInterrupt:
+        pass
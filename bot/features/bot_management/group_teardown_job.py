@@ -0,0 +1,40 @@
+import asyncio
+import logging
+from telegram.ext import ContextTypes
+
+from bot.infrastructure.async_database import get_pending_group_deletions, delete_group_data_chunk
+
+# Пауза між порціями, щоб модерація інших чатів отримувала доступ до БД
+CHUNK_PAUSE_SECONDS = 0.05
+
+_running = False
+
+
+async def finish_group_deletion(group_id: int):
+    """Дочищає дані групи порціями, кожна - окремим зверненням до потоку БД з паузою між ними."""
+    while not await delete_group_data_chunk(group_id):
+        await asyncio.sleep(CHUNK_PAUSE_SECONDS)
+
+
+async def group_teardown_job(context: ContextTypes.DEFAULT_TYPE):
+    """
+    Фонове видалення даних груп, з яких прибрали бота.
+    Обробляє чергу pending_group_deletions порціями; після перезапуску бота продовжує з місця зупинки.
+    """
+    global _running
+    # Одночасно працює лише одне завдання - решта груп чекає в тій самій черзі
+    if _running:
+        return
+    _running = True
+    try:
+        while True:
+            group_ids = await get_pending_group_deletions()
+            if not group_ids:
+                break
+            for group_id in group_ids:
+                logging.info(f"Видалення даних групи {group_id} частинами...")
+                await finish_group_deletion(group_id)
+    except Exception as e:
+        logging.error(f"Помилка фонового видалення даних груп: {e}")
+    finally:
+        _running = False
@@ -6,7 +6,12 @@ from telegram.ext import ContextTypes
 from telegram.constants import ChatMemberStatus
 
 # Імпортуємо нову та існуючі функції з бази даних
-from bot.infrastructure.database import add_group_if_not_exists, set_group_admin, delete_all_group_data
+from bot.infrastructure.async_database import (
+    add_group_if_not_exists, set_group_admin, schedule_group_deletion,
+    get_pending_group_deletions
+)
+from bot.infrastructure.outbound_dispatcher import dispatch, Priority
+from .group_teardown_job import group_teardown_job, finish_group_deletion
 
 
 async def my_chat_member_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -24,15 +29,21 @@ async def my_chat_member_handler(update: Update, context: ContextTypes.DEFAULT_T
     if new_status == ChatMemberStatus.ADMINISTRATOR and old_status != ChatMemberStatus.ADMINISTRATOR:
         logging.info(f"Бот був доданий в чат '{chat.title}' ({chat.id}) користувачем {user.full_name} ({user.id})")
 
+        # Якщо дані попереднього видалення ще не дочищені, завершуємо його (тими ж порціями),
+        # щоб фонове завдання не видалило налаштування нової групи
+        if chat.id in await get_pending_group_deletions():
+            await finish_group_deletion(chat.id)
+
         # Додаємо групу в БД, якщо її там немає
-        add_group_if_not_exists(chat.id, chat.title)
+        await add_group_if_not_exists(chat.id, chat.title)
 
         # Призначаємо користувача, що додав бота, як "Власника групи"
-        set_group_admin(chat.id, user.id)
+        await set_group_admin(chat.id, user.id)
 
         try:
             # Намагаємось надіслати привітальне повідомлення власнику
-            await context.bot.send_message(
+            await dispatch(
+                Priority.LOG, context.bot.send_message,
                 chat_id=user.id,
                 text=f"Привіт! Ви додали мене в чат «{chat.title}».\n\n"
                      f"Тепер ви можете керувати його налаштуваннями через мою панель. "
@@ -44,4 +55,7 @@ async def my_chat_member_handler(update: Update, context: ContextTypes.DEFAULT_T
     # Випадок 2: Бота видалили з чату або забанили
     elif new_status in [ChatMemberStatus.LEFT, ChatMemberStatus.BANNED]:
         logging.info(f"Бота видалили з чату '{chat.title}' ({chat.id}). Видаляю всі пов'язані дані.")
-        delete_all_group_data(chat.id)
\ No newline at end of file
+        await schedule_group_deletion(chat.id)
+        context.job_queue.run_once(group_teardown_job, 0, name="group_teardown")
+        # Стан чату в пам'яті більше не потрібен; PTB передасть видалення і в ChatStatePersistence
+        context.application.drop_chat_data(chat.id)
\ No newline at end of file
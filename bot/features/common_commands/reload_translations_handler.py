@@ -0,0 +1,20 @@
+from telegram import Update
+from telegram.ext import ContextTypes
+from bot.config import ADMIN_ID
+from bot.infrastructure.localization import get_text, reload_translations
+
+
+async def reload_translations_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Перечитує файли перекладів без перезапуску бота (тільки для власника бота)."""
+    user = update.effective_user
+    lang = user.language_code
+
+    if user.id != ADMIN_ID:
+        await update.message.reply_text(get_text(lang, "not_admin"))
+        return
+
+    languages = reload_translations()
+    # З кількома процесами-обробниками переклади мають оновитися в усіх (і в головному)
+    from bot.core.worker_pool import broadcast_translations_reload
+    broadcast_translations_reload()
+    await update.message.reply_text(get_text(lang, "translations_reloaded", languages=", ".join(languages)))
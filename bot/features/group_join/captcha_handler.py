@@ -1,10 +1,18 @@
 import logging
-from telegram import Update, ChatPermissions
+import time
+from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 from bot.infrastructure.localization import get_text
-from bot.infrastructure.database import log_action, increment_daily_stat
-from bot.features.message_filtering.delete_message_job import delete_message_job
+from bot.infrastructure.outbound_dispatcher import dispatch, Priority
+from bot.infrastructure.async_database import log_action, increment_daily_stat
+from bot.features.message_filtering.delete_message_job import schedule_message_deletion
+from .captcha_timeout import cancel_captcha_timeout
+from .captcha_service import (
+    decode_captcha_callback, correct_option_index, create_captcha_keyboard, get_captcha_state, new_captcha_nonce,
+    MEMBER_PERMISSIONS
+)
+from .raid_service import get_raid_state, SHARED_CAPTCHA_USER_ID
 
 MAX_ATTEMPTS = 2
 
@@ -15,83 +23,105 @@ async def captcha_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_who_clicked = query.from_user
     lang = user_who_clicked.language_code or 'en'
 
-    try:
-        _, user_id_str, chosen_emoji, correct_emoji = query.data.split(":", 3)
-        user_id_for_captcha = int(user_id_str)
-    except ValueError:
+    # Повідомлення з капчею вже недоступне (надто старе чи видалене)
+    if query.message is None:
+        await query.answer(get_text(lang, "captcha_expired"), show_alert=True)
+        return
+
+    # Дані капчі (користувач, чат, термін) - у підписаному callback_data, тому перевірка
+    # не потребує звернень до БД; у chat_data лише лічильник помилок
+    payload = decode_captcha_callback(query.data)
+    if payload is None or payload.chat_id != query.message.chat.id:
         await query.answer("Помилка даних", show_alert=True)
         return
+    # Спільна капча рейду: одне повідомлення для всіх учасників пакета,
+    # тому спроби рахуються в пам'яті, а саме повідомлення не змінюється
+    shared = payload.user_id == SHARED_CAPTCHA_USER_ID
+    raid_members = get_raid_state(context.chat_data).captcha_members if shared else None
+    user_id_for_captcha = user_who_clicked.id if shared else payload.user_id
 
-    if user_who_clicked.id != user_id_for_captcha:
+    if user_who_clicked.id != user_id_for_captcha or (shared and user_id_for_captcha not in raid_members):
         await query.answer(get_text(lang, "captcha_not_for_you"), show_alert=True)
         return
 
-    if 'captcha_attempts' not in context.chat_data:
-        context.chat_data['captcha_attempts'] = {}
-    if user_id_for_captcha not in context.chat_data['captcha_attempts']:
-        context.chat_data['captcha_attempts'][user_id_for_captcha] = 0
+    if shared:
+        captcha_state, previous_attempts = None, raid_members[user_id_for_captcha]
+    else:
+        captcha_state = get_captcha_state(context.chat_data)
+        previous_attempts = captcha_state.attempts_for(user_id_for_captcha, payload.nonce)
+    # previous_attempts is None - кнопки, замінені після помилки
+    if payload.expires_at < time.time() or previous_attempts is None:
+        await query.answer(get_text(lang, "captcha_expired"), show_alert=True)
+        return
 
-    if chosen_emoji == correct_emoji:
+    if payload.choice == correct_option_index(payload.user_id, payload.chat_id, payload.nonce):
         await query.answer(get_text(lang, "captcha_verified_short"), show_alert=True)
-        for job in context.job_queue.get_jobs_by_name(f"captcha_timeout_{user_id_for_captcha}_{query.message.chat.id}"):
-            job.schedule_removal()
+        if shared:
+            raid_members.pop(user_id_for_captcha, None)
+        else:
+            captcha_state.discard(user_id_for_captcha)
+        await cancel_captcha_timeout(query.message.chat.id, user_id_for_captcha)
 
-        log_action(query.message.chat.id, user_id_for_captcha, user_who_clicked.full_name, 'captcha_passed')
-        increment_daily_stat(query.message.chat.id, 'captcha_passed')
+        await log_action(query.message.chat.id, user_id_for_captcha, user_who_clicked.full_name, 'captcha_passed')
+        await increment_daily_stat(query.message.chat.id, 'captcha_passed')
 
         try:
-            await context.bot.restrict_chat_member(
+            await dispatch(
+                Priority.MODERATION, context.bot.restrict_chat_member,
                 chat_id=query.message.chat.id,
                 user_id=user_id_for_captcha,
-                permissions=ChatPermissions(
-                    can_send_messages=True,
-                    can_send_polls=True,
-                    can_send_other_messages=True,
-                    can_add_web_page_previews=True,
-                    can_invite_users=True
-                )
-            )
-            await query.edit_message_text(
-                get_text(lang, "captcha_verified", user_mention=user_who_clicked.mention_html()),
-                parse_mode=ParseMode.HTML
+                permissions=MEMBER_PERMISSIONS
             )
+            if not shared:
+                await dispatch(
+                    Priority.NOTIFICATION, query.edit_message_text,
+                    get_text(lang, "captcha_verified", user_mention=user_who_clicked.mention_html()),
+                    parse_mode=ParseMode.HTML, rate_chat_id=query.message.chat.id
+                )
 
-            # --- КРОК 2: Додаємо завдання на видалення повідомлення через 30 секунд ---
-            context.job_queue.run_once(
-                delete_message_job,
-                30,
-                data={'chat_id': query.message.chat_id, 'message_id': query.message.message_id},
-                name=f"delete_verified_msg_{query.message.message_id}"
-            )
+                # --- КРОК 2: Плануємо видалення повідомлення через 30 секунд ---
+                schedule_message_deletion(query.message.chat_id, query.message.message_id, 30)
 
         except Exception as e:
             logging.error(f"Помилка при знятті обмежень: {e}")
-        finally:
-            if user_id_for_captcha in context.chat_data.get('captcha_attempts', {}):
-                del context.chat_data['captcha_attempts'][user_id_for_captcha]
     else:
-        context.chat_data['captcha_attempts'][user_id_for_captcha] += 1
-        attempts = context.chat_data['captcha_attempts'][user_id_for_captcha]
+        attempts = previous_attempts + 1
 
         if attempts >= MAX_ATTEMPTS:
             await query.answer(get_text(lang, "captcha_too_many_attempts"), show_alert=True)
-            for job in context.job_queue.get_jobs_by_name(
-                    f"captcha_timeout_{user_id_for_captcha}_{query.message.chat.id}"):
-                job.schedule_removal()
+            if shared:
+                raid_members.pop(user_id_for_captcha, None)
+            else:
+                captcha_state.discard(user_id_for_captcha)
+            await cancel_captcha_timeout(query.message.chat.id, user_id_for_captcha)
 
-            log_action(query.message.chat.id, user_id_for_captcha, user_who_clicked.full_name, 'captcha_failed')
-            increment_daily_stat(query.message.chat.id, 'captcha_failed')
+            await log_action(query.message.chat.id, user_id_for_captcha, user_who_clicked.full_name, 'captcha_failed')
+            await increment_daily_stat(query.message.chat.id, 'captcha_failed')
 
             try:
-                await query.edit_message_text(get_text(lang, "captcha_fail_kick"))
-                await context.bot.ban_chat_member(chat_id=query.message.chat.id, user_id=user_id_for_captcha,
-                                                  until_date=None)
-                await context.bot.unban_chat_member(chat_id=query.message.chat.id, user_id=user_id_for_captcha)
+                if not shared:
+                    await dispatch(Priority.NOTIFICATION, query.edit_message_text, get_text(lang, "captcha_fail_kick"),
+                                   rate_chat_id=query.message.chat.id)
+                await dispatch(Priority.MODERATION, context.bot.ban_chat_member, chat_id=query.message.chat.id,
+                               user_id=user_id_for_captcha, until_date=None)
+                await dispatch(Priority.MODERATION, context.bot.unban_chat_member, chat_id=query.message.chat.id,
+                               user_id=user_id_for_captcha)
             except Exception as e:
                 logging.error(f"Помилка при кіку користувача: {e}")
-            finally:
-                if user_id_for_captcha in context.chat_data.get('captcha_attempts', {}):
-                    del context.chat_data['captcha_attempts'][user_id_for_captcha]
         else:
             attempts_left = MAX_ATTEMPTS - attempts
-            await query.answer(get_text(lang, "captcha_wrong_attempt", attempts_left=attempts_left), show_alert=True)
\ No newline at end of file
+            await query.answer(get_text(lang, "captcha_wrong_attempt", attempts_left=attempts_left), show_alert=True)
+            if shared:
+                raid_members[user_id_for_captcha] = attempts
+                return
+            # Нова клавіатура з новим nonce і розташуванням кнопок; старі кнопки стають недійсними
+            nonce = new_captcha_nonce()
+            captcha_state.record_failure(user_id_for_captcha, nonce, attempts, payload.expires_at)
+            try:
+                await dispatch(
+                    Priority.NOTIFICATION, query.edit_message_reply_markup,
+                    reply_markup=create_captcha_keyboard(payload.user_id, payload.chat_id, payload.expires_at, nonce),
+                    rate_chat_id=query.message.chat.id
+                )
+            except Exception as e:
+                logging.error(f"Не вдалося оновити клавіатуру капчі: {e}")
\ No newline at end of file
@@ -1,20 +1,184 @@
+import base64
+import hashlib
+import hmac
+import os
 import random
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+import secrets
+import struct
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+from telegram import ChatPermissions, InlineKeyboardButton, InlineKeyboardMarkup
+from bot.config import BOT_TOKEN, CAPTCHA_SECRET
+from bot.infrastructure.chat_persistence import EncodedState, register_chat_state
 
+CALLBACK_PREFIX = "captcha:"
+# Скільки секунд кнопки капчі лишаються дійсними (збігається з таймаутом капчі)
+CAPTCHA_TTL_SECONDS = 120
+OPTIONS_COUNT = 4
+# Права учасника після капчі (або якщо показати йому капчу не вдалося)
+MEMBER_PERMISSIONS = ChatPermissions(
+    can_send_messages=True,
+    can_send_polls=True,
+    can_send_other_messages=True,
+    can_add_web_page_previews=True,
+    can_invite_users=True
+)
 
-def create_captcha_keyboard(user_id: int) -> InlineKeyboardMarkup:
-    """Створює клавіатуру для капчі."""
-    human_emojis = ['👨', '👩', '👶', '👴', '👵', '🧑', '👱', '👨‍🦰', '👩‍🦰']
-    robot_emojis = ['🤖', '👾', '👽', '🛸', '🎮', '💾', '🖥️', '⚙️', '🔧']
+HUMAN_EMOJIS = ['👨', '👩', '👶', '👴', '👵', '🧑', '👱', '👨‍🦰', '👩‍🦰']
+ROBOT_EMOJIS = ['🤖', '👾', '👽', '🛸', '🎮', '💾', '🖥️', '⚙️', '🔧']
 
-    correct_emoji = random.choice(human_emojis)
-    wrong_emojis = random.sample(robot_emojis, 3)
+# user_id, chat_id, nonce, термін дії (unix), номер кнопки - 25 байтів
+_PAYLOAD = struct.Struct(">qqIIB")
+# Обрізаний HMAC-SHA256: разом з даними 35 байтів -> 47 символів base64 (ліміт callback_data - 64 байти)
+_SIGNATURE_SIZE = 10
 
-    options = [correct_emoji] + wrong_emojis
-    random.shuffle(options)
+
+def _derive_secret() -> bytes:
+    """Ключ підпису: з CAPTCHA_SECRET, інакше похідний від токена бота."""
+    if CAPTCHA_SECRET:
+        return CAPTCHA_SECRET.encode()
+    if BOT_TOKEN:
+        return hashlib.sha256(b"wartovyi-captcha:" + BOT_TOKEN.encode()).digest()
+    # Без токена (скрипти, тести) - випадковий ключ на час роботи процесу
+    return os.urandom(32)
+
+
+_SECRET = _derive_secret()
+
+
+class CaptchaPayload(NamedTuple):
+    user_id: int
+    chat_id: int
+    nonce: int
+    expires_at: int
+    choice: int
+
+
+def correct_option_index(user_id: int, chat_id: int, nonce: int) -> int:
+    """Номер правильної кнопки. Обчислюється з ключа, тому не міститься в жодному payload."""
+    digest = hmac.new(_SECRET, b"answer" + struct.pack(">qqI", user_id, chat_id, nonce), hashlib.sha256).digest()
+    return digest[0] % OPTIONS_COUNT
+
+
+def _sign(data: bytes) -> bytes:
+    return hmac.new(_SECRET, data, hashlib.sha256).digest()[:_SIGNATURE_SIZE]
+
+
+def encode_captcha_callback(payload: CaptchaPayload) -> str:
+    data = _PAYLOAD.pack(*payload)
+    token = base64.urlsafe_b64encode(data + _sign(data)).decode().rstrip("=")
+    return CALLBACK_PREFIX + token
+
+
+def decode_captcha_callback(callback_data: str) -> Optional[CaptchaPayload]:
+    """Розбирає та перевіряє підпис callback_data. Повертає None для підроблених чи пошкоджених даних."""
+    if not callback_data or not callback_data.startswith(CALLBACK_PREFIX):
+        return None
+    token = callback_data[len(CALLBACK_PREFIX):]
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except (ValueError, TypeError):
+        return None
+    if len(raw) != _PAYLOAD.size + _SIGNATURE_SIZE:
+        return None
+    data, signature = raw[:_PAYLOAD.size], raw[_PAYLOAD.size:]
+    if not hmac.compare_digest(signature, _sign(data)):
+        return None
+    return CaptchaPayload(*_PAYLOAD.unpack(data))
+
+
+def new_captcha_nonce() -> int:
+    return secrets.randbits(32)
+
+
+def create_captcha_keyboard(user_id: int, chat_id: int, expires_at: int = None,
+                            nonce: int = None) -> InlineKeyboardMarkup:
+    """
+    Створює клавіатуру для капчі. Кожна кнопка несе підписаний payload лише зі своїм номером;
+    правильний номер визначається HMAC від nonce, тож саму відповідь зберігати не треба.
+    """
+    if nonce is None:
+        nonce = new_captcha_nonce()
+    if expires_at is None:
+        expires_at = int(time.time()) + CAPTCHA_TTL_SECONDS
+    correct_index = correct_option_index(user_id, chat_id, nonce)
+
+    options = random.sample(ROBOT_EMOJIS, OPTIONS_COUNT - 1)
+    options.insert(correct_index, random.choice(HUMAN_EMOJIS))
 
     keyboard = [[
-        InlineKeyboardButton(emoji, callback_data=f"captcha:{user_id}:{emoji}:{correct_emoji}")
-        for emoji in options
+        InlineKeyboardButton(emoji, callback_data=encode_captcha_callback(
+            CaptchaPayload(user_id, chat_id, nonce, expires_at, index)))
+        for index, emoji in enumerate(options)
     ]]
-    return InlineKeyboardMarkup(keyboard)
\ No newline at end of file
+    return InlineKeyboardMarkup(keyboard)
+
+
+# Формат збереження: кількість капч і для кожної user_id, nonce, кількість помилок, термін дії
+_STATE_COUNT = struct.Struct(">I")
+_STATE_ENTRY = struct.Struct(">qIBI")
+
+
+class CaptchaState:
+    """
+    Спроби особистих капч чату (зберігається в chat_data['captcha_state']).
+
+    Після помилки кнопки отримують новий nonce, а тут запам'ятовується лише він:
+    кнопки з попереднім nonce більше не приймаються, тож повторне натискання
+    старої клавіатури не скидає лічильник спроб.
+    """
+
+    def __init__(self):
+        # {user_id: (поточний nonce, кількість помилок, термін дії)}
+        self.entries: Dict[int, Tuple[int, int, int]] = {}
+
+    def attempts_for(self, user_id: int, nonce: int) -> Optional[int]:
+        """Кількість помилок для цих кнопок або None, якщо їх уже замінено новими."""
+        entry = self.entries.get(user_id)
+        if entry is None:
+            return 0
+        current_nonce, attempts, _expires_at = entry
+        return attempts if nonce == current_nonce else None
+
+    def record_failure(self, user_id: int, nonce: int, attempts: int, expires_at: int):
+        """Запам'ятовує nonce нової клавіатури; заразом прибирає капчі, термін яких минув."""
+        now = time.time()
+        self.entries = {key: entry for key, entry in self.entries.items() if entry[2] >= now}
+        self.entries[user_id] = (nonce, attempts, expires_at)
+
+    def discard(self, user_id: int):
+        self.entries.pop(user_id, None)
+
+    def to_bytes(self) -> bytes:
+        now = time.time()
+        entries = [(user_id, *entry) for user_id, entry in self.entries.items() if entry[2] >= now]
+        if not entries:
+            return b""
+        return _STATE_COUNT.pack(len(entries)) + b"".join(
+            _STATE_ENTRY.pack(user_id, nonce, min(attempts, 0xFF), expires_at)
+            for user_id, nonce, attempts, expires_at in entries)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, chat_id: int = None) -> "CaptchaState":
+        state = cls()
+        count, = _STATE_COUNT.unpack_from(data)
+        offset = _STATE_COUNT.size
+        for _ in range(count):
+            user_id, nonce, attempts, expires_at = _STATE_ENTRY.unpack_from(data, offset)
+            offset += _STATE_ENTRY.size
+            state.entries[user_id] = (nonce, attempts, expires_at)
+        return state
+
+    def __deepcopy__(self, memo):
+        # PTB копіює chat_data перед збереженням; копія - одразу закодований стан
+        return EncodedState(self.to_bytes())
+
+
+register_chat_state('captcha_state', CaptchaState)
+
+
+def get_captcha_state(chat_data: dict) -> CaptchaState:
+    state = chat_data.get('captcha_state')
+    if not isinstance(state, CaptchaState):
+        state = chat_data['captcha_state'] = CaptchaState()
+    return state
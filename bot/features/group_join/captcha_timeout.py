@@ -1,36 +1,106 @@
+import asyncio
 import logging
-from telegram import Update
+import time
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 from bot.infrastructure.localization import get_text
-from bot.infrastructure.database import log_action, increment_daily_stat
+from bot.infrastructure.outbound_dispatcher import dispatch, Priority
+from bot.infrastructure.async_database import (
+    log_action, increment_daily_stat, add_captcha_timeout, add_captcha_timeouts, remove_captcha_timeouts,
+    get_captcha_timeouts, set_captcha_timeout_message
+)
+from bot.infrastructure.timing_wheel import TimingWheel
+from bot.infrastructure.sharding import owns_chat
 
+# Скільки секунд користувач має на проходження капчі
+CAPTCHA_TIMEOUT_SECONDS = 120
 
-async def captcha_timeout(context: ContextTypes.DEFAULT_TYPE):
-    """Обробляє таймаут капчі, видаляючи користувача."""
-    job_data = context.job.data
-    user_id = job_data['user_id']
-    chat_id = job_data['chat_id']
-    message_id = job_data['message_id']
-    lang = job_data.get('lang', 'en')
+# Таймаути всіх незавершених капч; ключ - (chat_id, user_id)
+captcha_wheel = TimingWheel()
 
-    try:
-        await context.bot.ban_chat_member(chat_id=chat_id, user_id=user_id, until_date=None)
-        await context.bot.unban_chat_member(chat_id=chat_id, user_id=user_id)
 
-        log_action(chat_id, user_id, "Unknown User", 'captcha_timeout', 'User removed due to timeout')
-        increment_daily_stat(chat_id, 'captcha_failed')
+async def schedule_captcha_timeout(chat_id: int, user_id: int, message_id: int, lang: str,
+                                   delay: float = CAPTCHA_TIMEOUT_SECONDS):
+    """Запускає таймаут капчі: в колесі таймерів і в БД (щоб пережив перезапуск)."""
+    expires_at = time.time() + delay
+    captcha_wheel.add((chat_id, user_id), expires_at, {'message_id': message_id, 'lang': lang})
+    await add_captcha_timeout(chat_id, user_id, message_id, lang, expires_at)
+
+
+async def attach_captcha_message(chat_id: int, user_id: int, message_id: int):
+    """
+    Додає повідомлення капчі до таймауту, запущеного ще до його надсилання,
+    щоб після таймауту повідомлення видалилось. Якщо капчу вже завершено - нічого не робить.
+    """
+    payload = captcha_wheel.get((chat_id, user_id))
+    if payload is None:
+        return
+    payload['message_id'] = message_id
+    await set_captcha_timeout_message(chat_id, user_id, message_id)
+
 
-        await context.bot.delete_message(chat_id=chat_id, message_id=message_id)
+async def schedule_captcha_timeouts(chat_id: int, user_ids: list, message_id: int, lang: str,
+                                    delay: float = CAPTCHA_TIMEOUT_SECONDS):
+    """
+    Запускає таймаути для групи користувачів зі спільною капчею (режим рейду) одним записом у БД.
+    message_id не зберігається: спільне повідомлення видаляється окремо, а видалення
+    відбувається без сповіщення в чат для кожного користувача.
+    """
+    expires_at = time.time() + delay
+    for user_id in user_ids:
+        captcha_wheel.add((chat_id, user_id), expires_at, {'message_id': None, 'lang': lang})
+    await add_captcha_timeouts([(chat_id, user_id, None, lang, expires_at) for user_id in user_ids])
 
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=get_text(lang, "captcha_timeout_kick"),
-            parse_mode=ParseMode.HTML
-        )
 
-        if 'captcha_answers' in context.chat_data and user_id in context.chat_data['captcha_answers']:
-            del context.chat_data['captcha_answers'][user_id]
+async def cancel_captcha_timeout(chat_id: int, user_id: int):
+    """Скасовує таймаут капчі (користувач пройшов її або вже видалений)."""
+    captcha_wheel.cancel((chat_id, user_id))
+    await remove_captcha_timeouts([(chat_id, user_id)])
+
+
+async def load_captcha_timeouts_job(context: ContextTypes.DEFAULT_TYPE):
+    """Відновлює таймаути незавершених капч з БД після запуску бота (лише для чатів цього процесу)."""
+    rows = [row for row in await get_captcha_timeouts() if owns_chat(row['chat_id'])]
+    for row in rows:
+        captcha_wheel.add((row['chat_id'], row['user_id']), row['expires_at'],
+                          {'message_id': row['message_id'], 'lang': row['lang']})
+    if rows:
+        logging.info(f"Відновлено {len(rows)} таймаутів капчі.")
+
+
+async def _expire_captcha(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int, message_id: int, lang: str):
+    """Видаляє користувача, який не пройшов капчу вчасно."""
+    lang = lang or 'en'
+    try:
+        await dispatch(Priority.MODERATION, context.bot.ban_chat_member, chat_id=chat_id, user_id=user_id, until_date=None)
+        await dispatch(Priority.MODERATION, context.bot.unban_chat_member, chat_id=chat_id, user_id=user_id)
+
+        await log_action(chat_id, user_id, "Unknown User", 'captcha_timeout', 'User removed due to timeout')
+        await increment_daily_stat(chat_id, 'captcha_failed')
+
+        # Без message_id - спільна капча рейду: повідомлення видаляється окремо, без сповіщень
+        if message_id:
+            await dispatch(Priority.MODERATION, context.bot.delete_message, chat_id=chat_id, message_id=message_id)
+
+            await dispatch(
+                Priority.NOTIFICATION, context.bot.send_message,
+                chat_id=chat_id,
+                text=get_text(lang, "captcha_timeout_kick"),
+                parse_mode=ParseMode.HTML
+            )
 
     except Exception as e:
-        logging.error(f"Помилка при обробці таймауту капчі: {e}")
\ No newline at end of file
+        logging.error(f"Помилка при обробці таймауту капчі: {e}")
+
+
+async def captcha_timeouts_tick_job(context: ContextTypes.DEFAULT_TYPE):
+    """Періодичне завдання: обробляє разом усі таймаути капчі, що настали з минулого тіку."""
+    expired = captcha_wheel.advance(time.time())
+    if not expired:
+        return
+
+    await asyncio.gather(*(
+        _expire_captcha(context, chat_id, user_id, payload['message_id'], payload['lang'])
+        for (chat_id, user_id), payload in expired
+    ))
+    await remove_captcha_timeouts([key for key, _payload in expired])
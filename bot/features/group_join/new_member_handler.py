@@ -1,12 +1,15 @@
 import logging
+import time
 from telegram import Update, ChatPermissions
 from telegram.ext import ContextTypes
 from telegram.constants import ChatMemberStatus, ParseMode
 
-from bot.infrastructure.database import get_group_settings, log_action, increment_daily_stat
+from bot.infrastructure.async_database import get_chat_config, log_action, increment_daily_stat
 from bot.infrastructure.localization import get_text
-from .captcha_service import create_captcha_keyboard
-from .captcha_timeout import captcha_timeout
+from bot.infrastructure.outbound_dispatcher import dispatch, Priority
+from .captcha_service import create_captcha_keyboard, MEMBER_PERMISSIONS
+from .captcha_timeout import schedule_captcha_timeout, cancel_captcha_timeout, attach_captcha_message
+from .raid_service import get_raid_state, start_raid_mode, add_raid_joiner
 
 async def new_member_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обробляє вхід нових користувачів, враховуючи налаштування групи."""
@@ -14,7 +17,7 @@ async def new_member_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return
 
     chat = update.chat_member.chat
-    settings = get_group_settings(chat.id)
+    settings = (await get_chat_config(chat.id)).settings
 
     if not settings['captcha_enabled']:
         return
@@ -38,32 +41,50 @@ async def new_member_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
     lang = user.language_code or 'en' # Залишаємо надійну логіку з запасним варіантом
     # --- КІНЕЦЬ ЗМІНИ ---
 
-    log_action(chat.id, user.id, user.full_name, 'user_joined')
-    increment_daily_stat(chat.id, 'users_joined')
+    raid_state = get_raid_state(context.chat_data)
+    if raid_state.register_join(time.time()):
+        await start_raid_mode(context, chat.id, chat.title)
+    if raid_state.active:
+        # Під час рейду учасники збираються у пакет зі спільною капчею
+        add_raid_joiner(context, raid_state, chat.id, user, lang)
+        return
+
+    await log_action(chat.id, user.id, user.full_name, 'user_joined')
+    await increment_daily_stat(chat.id, 'users_joined')
 
     try:
-        await context.bot.restrict_chat_member(
+        await dispatch(
+            Priority.MODERATION, context.bot.restrict_chat_member,
             chat_id=chat.id,
             user_id=user.id,
             permissions=ChatPermissions(can_send_messages=False)
         )
+    except Exception as e:
+        logging.error(f"Помилка при обмеженні нового користувача {user.id} в чаті {chat.id}: {e}")
+        return
 
-        reply_markup = create_captcha_keyboard(user.id)
-        welcome_text = get_text(lang, "captcha_welcome", user_mention=user.mention_html())
+    # Таймаут запускається одразу після обмеження: повідомлення з капчею може затриматись
+    # у черзі сповіщень, а користувач не має лишитися обмеженим без таймера
+    await schedule_captcha_timeout(chat.id, user.id, None, lang)
 
-        captcha_message = await context.bot.send_message(
+    try:
+        captcha_message = await dispatch(
+            Priority.NOTIFICATION, context.bot.send_message,
             chat_id=chat.id,
-            text=welcome_text,
-            reply_markup=reply_markup,
+            text=get_text(lang, "captcha_welcome", user_mention=user.mention_html()),
+            reply_markup=create_captcha_keyboard(user.id, chat.id),
             parse_mode=ParseMode.HTML,
             disable_notification=True
         )
-
-        context.job_queue.run_once(
-            captcha_timeout,
-            120,
-            data={'user_id': user.id, 'chat_id': chat.id, 'message_id': captcha_message.message_id, 'lang': lang},
-            name=f"captcha_timeout_{user.id}_{chat.id}"
-        )
     except Exception as e:
-        logging.error(f"Помилка при обробці нового користувача {user.id} в чаті {chat.id}: {e}")
\ No newline at end of file
+        # Капчу не показано (черга переповнена чи запит застарів) - знімаємо обмеження
+        logging.error(f"Не вдалося надіслати капчу користувачу {user.id} в чаті {chat.id}: {e}. Знімаю обмеження.")
+        await cancel_captcha_timeout(chat.id, user.id)
+        try:
+            await dispatch(Priority.MODERATION, context.bot.restrict_chat_member,
+                           chat_id=chat.id, user_id=user.id, permissions=MEMBER_PERMISSIONS)
+        except Exception as e:
+            logging.error(f"Не вдалося зняти обмеження з користувача {user.id} в чаті {chat.id}: {e}")
+        return
+
+    await attach_captcha_message(chat.id, user.id, captcha_message.message_id)
@@ -0,0 +1,219 @@
+import asyncio
+import html
+import logging
+import struct
+import time
+from collections import deque
+from telegram import ChatPermissions
+from telegram.constants import ParseMode
+from telegram.ext import ContextTypes
+
+from bot.config import ADMIN_ID
+from bot.infrastructure.async_database import get_chat_config, log_action, increment_daily_stat
+from bot.infrastructure.chat_persistence import EncodedState, register_chat_state
+from bot.infrastructure.localization import get_text
+from bot.infrastructure.outbound_dispatcher import dispatch, Priority
+from bot.features.message_filtering.delete_message_job import schedule_message_deletion
+from .captcha_service import create_captcha_keyboard, MEMBER_PERMISSIONS
+from .captcha_timeout import schedule_captcha_timeouts, captcha_wheel, CAPTCHA_TIMEOUT_SECONDS
+
+# Рейд: не менше RAID_JOIN_THRESHOLD входів за RAID_WINDOW_SECONDS секунд
+RAID_JOIN_THRESHOLD = 10
+RAID_WINDOW_SECONDS = 10
+# Рейд завершується, якщо протягом цього часу не було нових входів
+RAID_QUIET_SECONDS = 60
+# Учасники, що зайшли протягом цього часу, отримують одну спільну капчу
+RAID_BATCH_SECONDS = 5
+# Скільки згадок вміщувати в повідомлення спільної капчі
+MAX_MENTIONS_PER_MESSAGE = 30
+# Ідентифікатор "користувача" у підписі спільної капчі
+SHARED_CAPTCHA_USER_ID = 0
+
+# Формат збереження: час останніх входів і учасники спільних капч з кількістю помилок
+_STATE_JOINS = struct.Struct(">B")
+_STATE_JOIN = struct.Struct(">d")
+_STATE_MEMBERS = struct.Struct(">I")
+_STATE_MEMBER = struct.Struct(">qB")
+
+
+class RaidState:
+    """Стан виявлення рейду для одного чату (зберігається в chat_data['raid_state'])."""
+
+    def __init__(self):
+        # Ковзне вікно: достатньо пам'ятати останні RAID_JOIN_THRESHOLD входів
+        self.joins = deque(maxlen=RAID_JOIN_THRESHOLD)
+        self.active = False
+        self.started_at = None
+        self.last_join = None
+        self.total_joined = 0
+        # Учасники, які ще чекають на спільну капчу: [(user_id, ім'я, згадка, мова)]
+        self.pending = []
+        # Учасники спільних капч, які ще не пройшли перевірку: {user_id: кількість помилок}
+        self.captcha_members = {}
+
+    def register_join(self, now: float) -> bool:
+        """Реєструє вхід. Повертає True, якщо саме цей вхід увімкнув режим рейду."""
+        self.joins.append(now)
+        self.last_join = now
+        if self.active:
+            return False
+        if len(self.joins) == RAID_JOIN_THRESHOLD and now - self.joins[0] <= RAID_WINDOW_SECONDS:
+            self.active = True
+            self.started_at = now
+            self.total_joined = 0
+            return True
+        return False
+
+    def is_quiet(self, now: float) -> bool:
+        return not self.pending and now - self.last_join >= RAID_QUIET_SECONDS
+
+    def to_bytes(self) -> bytes:
+        """
+        Кодує те, що має пережити перезапуск: вікно входів і спроби спільних капч.
+        Сам режим рейду не зберігається - після запуску він за потреби увімкнеться знову.
+        """
+        if not self.joins and not self.captcha_members:
+            return b""
+        parts = [_STATE_JOINS.pack(len(self.joins))]
+        parts.extend(_STATE_JOIN.pack(timestamp) for timestamp in self.joins)
+        parts.append(_STATE_MEMBERS.pack(len(self.captcha_members)))
+        parts.extend(_STATE_MEMBER.pack(user_id, min(attempts, 0xFF))
+                     for user_id, attempts in self.captcha_members.items())
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, chat_id: int = None) -> "RaidState":
+        state = cls()
+        count, = _STATE_JOINS.unpack_from(data)
+        offset = _STATE_JOINS.size
+        for _ in range(count):
+            state.joins.append(_STATE_JOIN.unpack_from(data, offset)[0])
+            offset += _STATE_JOIN.size
+        state.last_join = state.joins[-1] if state.joins else None
+        count, = _STATE_MEMBERS.unpack_from(data, offset)
+        offset += _STATE_MEMBERS.size
+        for _ in range(count):
+            user_id, attempts = _STATE_MEMBER.unpack_from(data, offset)
+            offset += _STATE_MEMBER.size
+            state.captcha_members[user_id] = attempts
+        return state
+
+    def __deepcopy__(self, memo):
+        # PTB копіює chat_data перед збереженням; копія - одразу закодований стан
+        return EncodedState(self.to_bytes())
+
+
+register_chat_state('raid_state', RaidState)
+
+
+def get_raid_state(chat_data: dict) -> RaidState:
+    state = chat_data.get('raid_state')
+    if not isinstance(state, RaidState):
+        state = chat_data['raid_state'] = RaidState()
+    return state
+
+
+async def _notify_owner(context: ContextTypes.DEFAULT_TYPE, chat_id: int, text: str):
+    owner_id = (await get_chat_config(chat_id)).admin_id or ADMIN_ID
+    try:
+        await dispatch(Priority.LOG, context.bot.send_message, chat_id=owner_id, text=text, parse_mode=ParseMode.HTML)
+    except Exception as e:
+        logging.warning(f"Не вдалося надіслати звіт про рейд власнику чату {chat_id}: {e}")
+
+
+async def start_raid_mode(context: ContextTypes.DEFAULT_TYPE, chat_id: int, chat_title: str):
+    """Вмикає режим рейду: сповіщає власника і запускає стеження за його завершенням."""
+    logging.warning(f"Виявлено рейд у чаті {chat_title} ({chat_id}): вмикаю режим рейду.")
+    await log_action(chat_id, 0, "Raid", 'raid_started', f'{RAID_JOIN_THRESHOLD} joins in {RAID_WINDOW_SECONDS}s')
+    await _notify_owner(context, chat_id, get_text("uk", "raid_started_log", chat_title=html.escape(chat_title or str(chat_id))))
+    context.job_queue.run_repeating(raid_monitor_job, interval=RAID_WINDOW_SECONDS, first=RAID_WINDOW_SECONDS,
+                                    chat_id=chat_id, name=f"raid_monitor_{chat_id}", data={'chat_title': chat_title})
+
+
+def add_raid_joiner(context: ContextTypes.DEFAULT_TYPE, state: RaidState, chat_id: int, user, lang: str):
+    """Додає учасника до наступної спільної капчі замість окремої обробки."""
+    if not state.pending:
+        context.job_queue.run_once(raid_batch_job, RAID_BATCH_SECONDS, chat_id=chat_id, name=f"raid_batch_{chat_id}")
+    state.pending.append((user.id, user.full_name, user.mention_html(), lang))
+    state.total_joined += 1
+
+
+async def raid_batch_job(context: ContextTypes.DEFAULT_TYPE):
+    """Обробляє всіх учасників, що зайшли за вікно: обмеження, одна спільна капча, один запис статистики."""
+    chat_id = context.job.chat_id
+    state = get_raid_state(context.chat_data)
+    batch, state.pending = state.pending, []
+    if not batch:
+        return
+
+    for user_id, full_name, _mention, _lang in batch:
+        await log_action(chat_id, user_id, full_name, 'user_joined', 'raid')
+        state.captcha_members[user_id] = 0
+    await increment_daily_stat(chat_id, 'users_joined', len(batch))
+
+    # Обмеження ставимо в чергу одночасно - диспетчер сам розподілить їх у межах лімітів
+    results = await asyncio.gather(*(
+        dispatch(Priority.MODERATION, context.bot.restrict_chat_member, chat_id=chat_id, user_id=user_id,
+                 permissions=ChatPermissions(can_send_messages=False))
+        for user_id, _name, _mention, _lang in batch
+    ), return_exceptions=True)
+    for (user_id, _name, _mention, _lang), result in zip(batch, results):
+        if isinstance(result, Exception):
+            logging.error(f"Рейд: не вдалося обмежити {user_id} в чаті {chat_id}: {result}")
+
+    lang = batch[0][3]
+    mentions = ", ".join(mention for _id, _name, mention, _lang in batch[:MAX_MENTIONS_PER_MESSAGE])
+    if len(batch) > MAX_MENTIONS_PER_MESSAGE:
+        mentions += get_text(lang, "raid_more_users", count=len(batch) - MAX_MENTIONS_PER_MESSAGE)
+
+    try:
+        captcha_message = await dispatch(
+            Priority.NOTIFICATION, context.bot.send_message,
+            chat_id=chat_id,
+            text=get_text(lang, "raid_captcha_welcome", user_mentions=mentions),
+            reply_markup=create_captcha_keyboard(SHARED_CAPTCHA_USER_ID, chat_id),
+            parse_mode=ParseMode.HTML,
+            disable_notification=True
+        )
+    except Exception as e:
+        # Без капчі учасників не можна ні перевірити, ні видаляти за таймаутом - знімаємо обмеження
+        logging.error(f"Рейд: не вдалося надіслати спільну капчу в чат {chat_id}: {e}. Знімаю обмеження.")
+        for user_id, _name, _mention, _lang in batch:
+            state.captcha_members.pop(user_id, None)
+        results = await asyncio.gather(*(
+            dispatch(Priority.MODERATION, context.bot.restrict_chat_member, chat_id=chat_id, user_id=user_id,
+                     permissions=MEMBER_PERMISSIONS)
+            for user_id, _name, _mention, _lang in batch
+        ), return_exceptions=True)
+        for (user_id, _name, _mention, _lang), result in zip(batch, results):
+            if isinstance(result, Exception):
+                logging.error(f"Рейд: не вдалося зняти обмеження з {user_id} в чаті {chat_id}: {result}")
+        return
+
+    schedule_message_deletion(chat_id, captcha_message.message_id, CAPTCHA_TIMEOUT_SECONDS)
+    await schedule_captcha_timeouts(chat_id, [item[0] for item in batch], None, lang)
+
+
+async def raid_monitor_job(context: ContextTypes.DEFAULT_TYPE):
+    """Періодично перевіряє, чи рейд завершився, і надсилає власнику підсумок."""
+    chat_id = context.job.chat_id
+    state = get_raid_state(context.chat_data)
+    now = time.time()
+    if state.active and not state.is_quiet(now):
+        return
+
+    context.job.schedule_removal()
+    if not state.active:
+        return
+    state.active = False
+    # Хто вже пройшов капчу, провалив її чи не встиг - більше не має таймера
+    state.captcha_members = {user_id: attempts for user_id, attempts in state.captcha_members.items()
+                             if (chat_id, user_id) in captcha_wheel}
+    duration_minutes = max(1, round((state.last_join - state.started_at) / 60))
+    logging.info(f"Рейд у чаті {chat_id} завершено: {state.total_joined} учасників за {duration_minutes} хв.")
+    await log_action(chat_id, 0, "Raid", 'raid_ended', f'{state.total_joined} joins')
+    await _notify_owner(context, chat_id, get_text(
+        "uk", "raid_ended_log", chat_title=html.escape(context.job.data.get('chat_title') or str(chat_id)),
+        joined=state.total_joined, minutes=duration_minutes,
+        pending=len(state.captcha_members)
+    ))
@@ -1,41 +1,189 @@
 # Wartovyi/bot/features/message_filtering/antiflood_service.py
 
+import struct
 import time
+import weakref
+from collections import OrderedDict, deque
 from telegram.ext import ContextTypes
+from bot.infrastructure.chat_persistence import EncodedState, register_chat_state
 
 # Константи для налаштування
 FLOOD_TIME_WINDOW = 4  # Секунди, протягом яких рахуються повідомлення
+MAX_SENSITIVITY = 50  # Більше міток часу на користувача не зберігаємо
+MAX_TRACKED_USERS = 50_000  # Загальний ліміт користувачів у трекерах усіх чатів
 
+# Формат збереження: базовий час і кількість користувачів, далі для кожного -
+# user_id, розмір буфера, кількість міток і мітки як мілісекунди від базового часу
+_STATE_HEADER = struct.Struct(">dI")
+_STATE_USER = struct.Struct(">qBB")
+_STATE_OFFSET = struct.Struct(">H")
 
-def is_user_flooding(user_id: int, sensitivity: int, context: ContextTypes.DEFAULT_TYPE) -> bool:
+# Усі живі трекери (для періодичного прибирання та статистики)
+_trackers = weakref.WeakSet()
+_tracked_total = 0
+
+
+class FloodTracker:
+    """
+    Трекер флуду для одного чату.
+
+    Для кожного користувача зберігається кільцевий буфер останніх міток часу
+    (не більше sensitivity + 1). Користувачі впорядковані за останньою активністю,
+    тому неактивні прибираються з початку черги за амортизований O(1).
+    """
+
+    def __init__(self, chat_id: int = None):
+        self.chat_id = chat_id
+        self._users = OrderedDict()
+        _trackers.add(self)
+
+    def __len__(self):
+        return len(self._users)
+
+    def hit(self, user_id: int, sensitivity: int, now: float) -> bool:
+        """Реєструє повідомлення користувача. Повертає True, якщо це флуд."""
+        global _tracked_total
+        sensitivity = max(1, min(sensitivity, MAX_SENSITIVITY))
+        self._evict_idle(now)
+
+        timestamps = self._users.get(user_id)
+        if timestamps is None:
+            timestamps = deque(maxlen=sensitivity + 1)
+            self._users[user_id] = timestamps
+            _tracked_total += 1
+        else:
+            self._users.move_to_end(user_id)
+            if timestamps.maxlen != sensitivity + 1:
+                # Чутливість змінили в панелі - переносимо історію в буфер нового розміру
+                timestamps = deque(timestamps, maxlen=sensitivity + 1)
+                self._users[user_id] = timestamps
+
+        # Відкидаємо старі повідомлення, залишаючи тільки ті, що в межах FLOOD_TIME_WINDOW
+        while timestamps and now - timestamps[0] >= FLOOD_TIME_WINDOW:
+            timestamps.popleft()
+        timestamps.append(now)
+        if _tracked_total > MAX_TRACKED_USERS:
+            _enforce_global_limit(self, now)
+
+        # Перевіряємо, чи кількість недавніх повідомлень перевищує поріг
+        if len(timestamps) > sensitivity:
+            # Якщо виявлено флуд, очищуємо історію для цього користувача,
+            # щоб уникнути повторних спрацювань одразу після муту.
+            timestamps.clear()
+            return True
+        return False
+
+    def _evict_idle(self, now: float) -> int:
+        """Видаляє користувачів, чиє останнє повідомлення вийшло за вікно."""
+        global _tracked_total
+        removed = 0
+        while self._users:
+            user_id, timestamps = next(iter(self._users.items()))
+            if timestamps and now - timestamps[-1] < FLOOD_TIME_WINDOW:
+                break
+            self._users.popitem(last=False)
+            removed += 1
+        _tracked_total -= removed
+        return removed
+
+    def _evict_oldest(self) -> bool:
+        global _tracked_total
+        if len(self._users) <= 1:
+            return False
+        self._users.popitem(last=False)
+        _tracked_total -= 1
+        return True
+
+    def sweep(self, now: float = None) -> int:
+        """Прибирає неактивних користувачів (для чатів, де давно не було повідомлень)."""
+        return self._evict_idle(time.time() if now is None else now)
+
+    def to_bytes(self, now: float = None) -> bytes:
+        """Кодує історію активних користувачів (неактивні перед цим прибираються)."""
+        self._evict_idle(time.time() if now is None else now)
+        users = [(user_id, timestamps) for user_id, timestamps in self._users.items() if timestamps]
+        if not users:
+            return b""
+        base = min(timestamps[0] for _user_id, timestamps in users)
+        parts = [_STATE_HEADER.pack(base, len(users))]
+        for user_id, timestamps in users:
+            parts.append(_STATE_USER.pack(user_id, timestamps.maxlen, len(timestamps)))
+            parts.extend(_STATE_OFFSET.pack(min(0xFFFF, round((ts - base) * 1000))) for ts in timestamps)
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, chat_id: int = None) -> "FloodTracker":
+        global _tracked_total
+        tracker = cls(chat_id)
+        base, count = _STATE_HEADER.unpack_from(data)
+        offset = _STATE_HEADER.size
+        for _ in range(count):
+            user_id, maxlen, length = _STATE_USER.unpack_from(data, offset)
+            offset += _STATE_USER.size
+            timestamps = deque((base + _STATE_OFFSET.unpack_from(data, offset + i * _STATE_OFFSET.size)[0] / 1000
+                                for i in range(length)), maxlen=maxlen)
+            offset += length * _STATE_OFFSET.size
+            tracker._users[user_id] = timestamps
+        _tracked_total += len(tracker._users)
+        return tracker
+
+    def __deepcopy__(self, memo):
+        # PTB копіює chat_data перед збереженням; копія трекера - одразу його закодований стан
+        return EncodedState(self.to_bytes())
+
+    def __del__(self):
+        global _tracked_total
+        _tracked_total -= len(self._users)
+
+
+def _enforce_global_limit(current: FloodTracker, now: float):
+    """Тримає загальну кількість відстежуваних користувачів у межах MAX_TRACKED_USERS."""
+    for tracker in list(_trackers):
+        if _tracked_total <= MAX_TRACKED_USERS:
+            return
+        tracker.sweep(now)
+    # Неактивних не лишилось - жертвуємо найдавніше активними користувачами поточного чату
+    while _tracked_total > MAX_TRACKED_USERS and current._evict_oldest():
+        pass
+
+
+def sweep_flood_trackers(now: float = None) -> int:
+    """Прибирає неактивних користувачів в усіх чатах. Повертає кількість видалених."""
+    now = time.time() if now is None else now
+    return sum(tracker.sweep(now) for tracker in list(_trackers))
+
+
+def get_flood_stats() -> dict:
+    """Повертає кількість відстежуваних користувачів загалом і по чатах."""
+    per_chat = {}
+    for tracker in list(_trackers):
+        if len(tracker):
+            per_chat[str(tracker.chat_id)] = per_chat.get(str(tracker.chat_id), 0) + len(tracker)
+    return {'tracked_users': _tracked_total, 'max_tracked_users': MAX_TRACKED_USERS, 'per_chat': per_chat}
+
+
+def is_user_flooding(user_id: int, sensitivity: int, context: ContextTypes.DEFAULT_TYPE, chat_id: int = None) -> bool:
     """
     Перевіряє, чи користувач надсилає повідомлення занадто часто.
 
     :param user_id: ID користувача для перевірки.
     :param sensitivity: Кількість повідомлень, яка вважається флудом.
     :param context: Контекст бота для доступу до chat_data.
+    :param chat_id: ID чату (для статистики трекера).
     :return: True, якщо виявлено флуд, інакше False.
     """
-    current_time = time.time()
-
-    # Ініціалізуємо сховище, якщо його немає
-    if 'flood_tracker' not in context.chat_data:
-        context.chat_data['flood_tracker'] = {}
+    tracker = context.chat_data.get('flood_tracker')
+    # Ініціалізуємо трекер, якщо його немає (або лишився старий формат зі списками)
+    if not isinstance(tracker, FloodTracker):
+        tracker = FloodTracker(chat_id)
+        context.chat_data['flood_tracker'] = tracker
 
-    user_timestamps = context.chat_data['flood_tracker'].get(user_id, [])
+    return tracker.hit(user_id, sensitivity, time.time())
 
-    # Фільтруємо старі повідомлення, залишаючи тільки ті, що в межах FLOOD_TIME_WINDOW
-    recent_timestamps = [t for t in user_timestamps if current_time - t < FLOOD_TIME_WINDOW]
 
-    # Додаємо поточний час і оновлюємо дані
-    recent_timestamps.append(current_time)
-    context.chat_data['flood_tracker'][user_id] = recent_timestamps
+register_chat_state('flood_tracker', FloodTracker)
 
-    # Перевіряємо, чи кількість недавніх повідомлень перевищує поріг
-    if len(recent_timestamps) > sensitivity:
-        # Якщо виявлено флуд, очищуємо історію для цього користувача,
-        # щоб уникнути повторних спрацювань одразу після муту.
-        context.chat_data['flood_tracker'][user_id] = []
-        return True
 
-    return False
\ No newline at end of file
+async def sweep_flood_trackers_job(context: ContextTypes.DEFAULT_TYPE):
+    """Періодичне завдання: прибирає неактивних користувачів з трекерів флуду."""
+    sweep_flood_trackers()
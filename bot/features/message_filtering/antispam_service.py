@@ -1,59 +1,118 @@
+import codecs
 import re
-from bot.infrastructure.database import (
-    get_group_settings,
-    get_spam_triggers,
-    get_group_blocklist,
-    get_group_whitelist
+from typing import NamedTuple
+from bot.infrastructure.chat_config_cache import ChatConfig
+from .trigger_matcher import TriggerMatcher
+
+# Шаблони компілюються один раз при імпорті модуля
+URL_PATTERN = re.compile(r'(https?://|www\.|t\.me/)[^\s]+')
+MENTION_PATTERN = re.compile(r'@\w+')
+
+# Байти cp1251, що відповідають великим літерам (латиниця та кирилиця, включно з Є, І, Ї, Ґ)
+_CP1251_UPPERCASE = bytes(
+    code for code in range(256) if bytes([code]).decode('cp1251', errors='replace').isupper()
 )
 
 
-def calculate_spam_score(message_text: str, chat_id: int) -> (int, list):
+def _uppercase_marker_errors(error: UnicodeEncodeError):
+    """Замінює символи поза cp1251 (емодзі тощо) на 'A' для великих літер і '?' для решти."""
+    segment = error.object[error.start:error.end]
+    return ''.join('A' if char.isupper() else '?' for char in segment), error.end
+
+
+codecs.register_error('uppercase_marker', _uppercase_marker_errors)
+
+
+def _count_uppercase(text: str) -> int:
+    """Рахує великі літери так само, як str.isupper() для кожного символу."""
+    # cp1251 — однобайтове кодування, тому кожен символ стає рівно одним байтом
+    # і великі літери можна видалити з байтового рядка на рівні C
+    encoded = text.encode('cp1251', errors='uppercase_marker')
+    return len(encoded) - len(encoded.translate(None, _CP1251_UPPERCASE))
+
+
+class MessageFeatures(NamedTuple):
+    """Ознаки повідомлення, на яких базуються правила підрахунку спаму."""
+    length: int
+    url_count: int
+    mention_count: int
+    uppercase_count: int
+
+    @property
+    def uppercase_ratio(self) -> float:
+        return self.uppercase_count / self.length if self.length else 0.0
+
+
+def extract_message_features(message_text: str, text_lower: str = None) -> MessageFeatures:
+    """
+    Збирає ознаки повідомлення за один прохід кожного скомпільованого шаблону
+    (раніше URL та згадки шукались двічі) і швидкий підрахунок великих літер.
+    """
+    if text_lower is None:
+        text_lower = message_text.lower()
+    return MessageFeatures(
+        length=len(message_text),
+        url_count=len(URL_PATTERN.findall(text_lower)),
+        mention_count=len(MENTION_PATTERN.findall(text_lower)),
+        uppercase_count=_count_uppercase(message_text),
+    )
+
+
+def get_trigger_matcher(config: ChatConfig) -> TriggerMatcher:
+    """
+    Повертає автомат пошуку для чату: спочатку слова білого списку, потім тригери.
+    Будується один раз на знімок конфігурації, тобто заново лише після зміни списків.
+    """
+    matcher = config.compiled.get('trigger_matcher')
+    if matcher is None:
+        patterns = [word.lower() for word in config.whitelist]
+        patterns.extend(trigger.lower() for trigger in config.triggers)
+        matcher = TriggerMatcher(patterns)
+        config.compiled['trigger_items'] = tuple(config.triggers.items())
+        config.compiled['trigger_matcher'] = matcher
+    return matcher
+
+
+def calculate_spam_score(message_text: str, config: ChatConfig) -> (int, list):
     """
     Підраховує рейтинг спаму, використовуючи триярусну логіку
     (глобальний, локальний та білий списки) згідно з налаштуваннями групи.
+    Всі списки беруться зі знімка конфігурації чату, тому функція не звертається до БД.
     """
     text_lower = message_text.lower()
     spam_score = 0
     triggered_words = []
 
-    # 1. Отримуємо налаштування та всі необхідні списки для цього чату
-    settings = get_group_settings(chat_id)
-    whitelist = get_group_whitelist(chat_id)
+    # 1. Один прохід по тексту знаходить і слова білого списку, і тригери.
+    #    Номери шаблонів відповідають порядку у списках, тому сортування зберігає їхній порядок.
+    matched = sorted(get_trigger_matcher(config).find(text_lower))
+    whitelist_size = len(config.whitelist)
 
     # 2. Перевірка на білий список. Якщо слово у білому списку, аналіз по ньому припиняється.
-    for whitelisted_word in whitelist:
-        if whitelisted_word.lower() in text_lower:
-            # Повертаємо 0 балів, вказуючи, що спрацював білий список
-            return 0, [f"'{whitelisted_word}' (whitelist)"]
-
-    # 3. Формуємо фінальний список спам-слів згідно з налаштуваннями групи
-    final_triggers = {}
-    if settings.get('use_global_list', True):
-        final_triggers.update(get_spam_triggers())
-
-    if settings.get('use_custom_list', True):
-        # Локальні слова мають вищий пріоритет (перезапишуть глобальні, якщо є збіги)
-        final_triggers.update(get_group_blocklist(chat_id))
-
-    # 4. Проходимо по фінальному списку тригерів
-    for trigger, score in final_triggers.items():
-        if trigger.lower() in text_lower:
+    if matched and matched[0] < whitelist_size:
+        # Повертаємо 0 балів, вказуючи, що спрацював білий список
+        return 0, [f"'{config.whitelist[matched[0]]}' (whitelist)"]
+
+    # 3. Тригери з фінального списку (вже зібраного згідно з налаштуваннями групи)
+    if matched:
+        trigger_items = config.compiled['trigger_items']
+        for pattern_id in matched:
+            trigger, score = trigger_items[pattern_id - whitelist_size]
             spam_score += score
             triggered_words.append(f"'{trigger}' ({score})")
 
-    # 5. Аналіз за іншими критеріями (посилання, згадки, КАПС)
-    url_pattern = r'(https?://|www\.|t\.me/)[^\s]+'
-    if re.search(url_pattern, text_lower):
-        urls_count = len(re.findall(url_pattern, text_lower))
-        spam_score += urls_count * 3
-        triggered_words.append(f"посилання x{urls_count} (+{urls_count * 3})")
+    # 4. Аналіз за іншими критеріями (посилання, згадки, КАПС)
+    features = extract_message_features(message_text, text_lower)
+
+    if features.url_count:
+        spam_score += features.url_count * 3
+        triggered_words.append(f"посилання x{features.url_count} (+{features.url_count * 3})")
 
-    if len(re.findall(r'@\w+', text_lower)) > 2:
-        mentions_count = len(re.findall(r'@\w+', text_lower))
-        spam_score += mentions_count * 2
-        triggered_words.append(f"згадки x{mentions_count} (+{mentions_count * 2})")
+    if features.mention_count > 2:
+        spam_score += features.mention_count * 2
+        triggered_words.append(f"згадки x{features.mention_count} (+{features.mention_count * 2})")
 
-    if len(message_text) > 10 and (sum(1 for c in message_text if c.isupper()) / len(message_text)) > 0.7:
+    if features.length > 10 and features.uppercase_ratio > 0.7:
         spam_score += 5
         triggered_words.append("КАПС (+5)")
 
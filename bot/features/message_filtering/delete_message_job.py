@@ -1,11 +1,94 @@
+import asyncio
+import logging
+import math
+import time
+from collections import defaultdict
 from telegram.ext import ContextTypes
+from bot.infrastructure.outbound_dispatcher import dispatch, Priority
 
-async def delete_message_job(context: ContextTypes.DEFAULT_TYPE):
-    """Видаляє повідомлення через певний час."""
-    try:
-        await context.bot.delete_message(
-            chat_id=context.job.data['chat_id'],
-            message_id=context.job.data['message_id']
-        )
-    except Exception:
-        pass
\ No newline at end of file
+# Ширина часового кошика: повідомлення з близьким часом видалення йдуть одним запитом
+DELETION_BUCKET_SECONDS = 5
+# Ліміт Bot API на кількість ID в одному deleteMessages
+MAX_MESSAGES_PER_CALL = 100
+
+
+class DeletionScheduler:
+    """
+    Планувальник відкладеного видалення службових повідомлень.
+
+    Замість окремого завдання на кожне повідомлення ID групуються по чатах
+    у часові кошики, і одне періодичне завдання видаляє їх пакетами deleteMessages.
+    """
+
+    def __init__(self, bucket_seconds: float = DELETION_BUCKET_SECONDS):
+        self.bucket_seconds = bucket_seconds
+        # {час кошика: {chat_id: [message_id, ...]}}
+        self._buckets = defaultdict(lambda: defaultdict(list))
+        self._counters = {'scheduled': 0, 'deleted': 0, 'api_calls': 0, 'failed_calls': 0, 'failed_messages': 0}
+
+    def schedule(self, chat_id: int, message_id: int, delay: float, now: float = None):
+        now = time.time() if now is None else now
+        due = math.ceil((now + delay) / self.bucket_seconds) * self.bucket_seconds
+        self._buckets[due][chat_id].append(message_id)
+        self._counters['scheduled'] += 1
+
+    def pop_due(self, now: float = None) -> dict:
+        """Забирає всі кошики, час яких настав. Повертає {chat_id: [message_id, ...]}."""
+        now = time.time() if now is None else now
+        due = defaultdict(list)
+        for bucket_time in sorted(self._buckets):
+            if bucket_time > now:
+                break
+            for chat_id, message_ids in self._buckets.pop(bucket_time).items():
+                due[chat_id].extend(message_ids)
+        return due
+
+    def pending_count(self) -> int:
+        return sum(len(ids) for chats in self._buckets.values() for ids in chats.values())
+
+    async def _delete_chat(self, bot, chat_id: int, message_ids: list) -> int:
+        """Видаляє повідомлення одного чату пакетами по MAX_MESSAGES_PER_CALL. Повертає кількість видалених."""
+        deleted = 0
+        for start in range(0, len(message_ids), MAX_MESSAGES_PER_CALL):
+            chunk = message_ids[start:start + MAX_MESSAGES_PER_CALL]
+            self._counters['api_calls'] += 1
+            try:
+                await dispatch(Priority.MODERATION, bot.delete_messages, chat_id=chat_id, message_ids=chunk)
+            except Exception as e:
+                # Повідомлення могли вже видалити вручну - лише враховуємо невдачу
+                self._counters['failed_calls'] += 1
+                self._counters['failed_messages'] += len(chunk)
+                logging.warning(f"Не вдалося видалити {len(chunk)} повідомлень у чаті {chat_id}: {e}")
+            else:
+                deleted += len(chunk)
+        return deleted
+
+    async def flush_due(self, bot, now: float = None) -> int:
+        """
+        Видаляє повідомлення з кошиків, час яких настав. Повертає кількість видалених.
+        Різні чати обробляються одночасно (ліміти чатів стежить диспетчер запитів),
+        пакети одного чату - по черзі.
+        """
+        results = await asyncio.gather(*(
+            self._delete_chat(bot, chat_id, message_ids)
+            for chat_id, message_ids in self.pop_due(now).items()
+        ))
+        deleted = sum(results)
+        self._counters['deleted'] += deleted
+        return deleted
+
+    def get_metrics(self) -> dict:
+        return {**self._counters, 'pending': self.pending_count()}
+
+
+deletion_scheduler = DeletionScheduler()
+
+
+def schedule_message_deletion(chat_id: int, message_id: int, delay: float = 30):
+    """Планує видалення повідомлення через delay секунд (з точністю до DELETION_BUCKET_SECONDS)."""
+    deletion_scheduler.schedule(chat_id, message_id, delay)
+
+
+async def delete_messages_job(context: ContextTypes.DEFAULT_TYPE):
+    """Періодичне завдання: пакетно видаляє повідомлення, час яких настав."""
+    await deletion_scheduler.flush_due(context.bot)
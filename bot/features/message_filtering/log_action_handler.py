@@ -5,6 +5,7 @@ from telegram.constants import ParseMode
 
 from bot.config import ADMIN_ID
 from bot.infrastructure.localization import get_text
+from bot.infrastructure.outbound_dispatcher import dispatch, Priority
 
 async def log_action_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -26,10 +27,11 @@ async def log_action_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
     action_text = ""
     try:
         if action == "ban":
-            await context.bot.ban_chat_member(chat_id=chat_id, user_id=user_id)
+            await dispatch(Priority.MODERATION, context.bot.ban_chat_member, chat_id=chat_id, user_id=user_id)
             action_text = "забанено"
         elif action == "unrestrict":
-            await context.bot.restrict_chat_member(
+            await dispatch(
+                Priority.MODERATION, context.bot.restrict_chat_member,
                 chat_id=chat_id, user_id=user_id,
                 permissions=ChatPermissions(can_send_messages=True, can_send_polls=True, can_send_other_messages=True, can_add_web_page_previews=True)
             )
@@ -39,6 +41,7 @@ async def log_action_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
         original_text = query.message.text_html
         new_text = original_text + get_text(lang, "log_action_by", action_text=action_text)
-        await query.edit_message_text(new_text, reply_markup=None, parse_mode=ParseMode.HTML)
+        await dispatch(Priority.LOG, query.edit_message_text, new_text, reply_markup=None, parse_mode=ParseMode.HTML,
+                       rate_chat_id=admin.id)
     except Exception as e:
         logging.error(f"Error processing log action '{action}': {e}")
\ No newline at end of file
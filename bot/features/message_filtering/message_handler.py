@@ -8,12 +8,12 @@ from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 
 # Імпортуємо всі необхідні функції з ваших модулів
-from bot.infrastructure.database import increment_daily_stat, log_action, get_group_settings, add_warning, \
-    get_group_admin_id, get_punishment_settings
+from bot.infrastructure.async_database import increment_daily_stat, log_action, add_warning, get_chat_config
 from bot.config import ADMIN_ID
 from bot.infrastructure.localization import get_text
+from bot.infrastructure.outbound_dispatcher import dispatch, Priority
 from .antispam_service import calculate_spam_score
-from .delete_message_job import delete_message_job
+from .delete_message_job import schedule_message_deletion
 from .antiflood_service import is_user_flooding
 
 
@@ -27,38 +27,39 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     user = update.message.from_user
     chat = update.message.chat
-    settings = get_group_settings(chat.id)
+    # Знімок конфігурації чату (налаштування, списки, адмін, покарання) береться з кешу
+    config = await get_chat_config(chat.id)
+    settings = config.settings
 
     # --- ПЕРЕВІРКА НА ФЛУД ---
     if settings.get('antiflood_enabled', True):
-        if is_user_flooding(user.id, settings.get('antiflood_sensitivity', 5), context):
+        if is_user_flooding(user.id, settings.get('antiflood_sensitivity', 5), context, chat.id):
             try:
                 # Видаємо мут на 5 хвилин
                 mute_duration = datetime.utcnow() + timedelta(minutes=5)
-                await context.bot.restrict_chat_member(
+                await dispatch(
+                    Priority.MODERATION, context.bot.restrict_chat_member,
                     chat_id=chat.id, user_id=user.id,
                     permissions=ChatPermissions(can_send_messages=False),
                     until_date=mute_duration
                 )
 
                 # Надсилаємо попередження (поки що без перекладу, додамо пізніше)
-                warning_msg = await update.message.reply_text(
+                warning_msg = await dispatch(
+                    Priority.NOTIFICATION, update.message.reply_text,
                     f"⚠️ {user.mention_html()}, ви надсилаєте повідомлення занадто часто!\n"
                     f"📵 Мут на 5 хвилин.",
-                    parse_mode=ParseMode.HTML
+                    parse_mode=ParseMode.HTML, rate_chat_id=chat.id
                 )
 
                 # Видаляємо повідомлення, що спричинило флуд
-                await update.message.delete()
+                await dispatch(Priority.MODERATION, update.message.delete)
 
-                # Ставимо завдання на видалення попередження через 30 секунд
-                context.job_queue.run_once(
-                    delete_message_job, 30,
-                    data={'chat_id': chat.id, 'message_id': warning_msg.message_id}
-                )
+                # Плануємо видалення попередження через 30 секунд
+                schedule_message_deletion(chat.id, warning_msg.message_id, 30)
 
                 # Логуємо дію
-                log_action(chat.id, user.id, user.full_name, 'antiflood_triggered', 'Muted for 5 minutes')
+                await log_action(chat.id, user.id, user.full_name, 'antiflood_triggered', 'Muted for 5 minutes')
 
             except Exception as e:
                 logging.error(f"Помилка під час обробки флуду від {user.id} в чаті {chat.id}: {e}")
@@ -68,15 +69,15 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # --- КІНЕЦЬ ПЕРЕВІРКИ НА ФЛУД ---
 
     # Синхронна частина - виконується першою
-    increment_daily_stat(chat.id, 'messages_total')
+    await increment_daily_stat(chat.id, 'messages_total')
     if not settings['spam_filter_enabled']:
         return
 
-    group_admin_id = get_group_admin_id(chat.id)
+    group_admin_id = config.admin_id
     if user.id == ADMIN_ID or user.id == group_admin_id:
         return
 
-    spam_score, triggered_words = calculate_spam_score(update.message.text, chat.id)
+    spam_score, triggered_words = calculate_spam_score(update.message.text, config)
     if "whitelist" in (triggered_words[0] if triggered_words else ""):
         return
 
@@ -85,18 +86,18 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         # 1. Найвища пріоритетна дія - видалення повідомлення. Виконуємо її негайно.
         try:
-            await update.message.delete()
+            await dispatch(Priority.MODERATION, update.message.delete)
         except Exception as e:
             logging.warning(f"Не вдалося видалити повідомлення {update.message.id} в чаті {chat.id}: {e}")
 
-        # 2. Всі інші дії (покарання, сповіщення, лог) збираємо в список
-        #    і запускаємо паралельно за допомогою asyncio.gather.
+        # 2. Всі інші дії (покарання, сповіщення, лог) ставимо в чергу вихідних запитів
+        #    з відповідними пріоритетами і чекаємо на всі разом за допомогою asyncio.gather.
 
-        warnings_count = add_warning(user.id, chat.id)
+        warnings_count = await add_warning(user.id, chat.id)
         lang = user.language_code
 
         # --- НОВА ЛОГІКА ГНУЧКИХ ПОКАРАНЬ ---
-        punishment_rules = get_punishment_settings(chat.id)
+        punishment_rules = config.punishments
         # Визначаємо правило для поточного рівня попереджень,
         # якщо для цього рівня правила немає, беремо правило для максимального налаштованого рівня
         rule_key = warnings_count if warnings_count in punishment_rules else max(punishment_rules.keys())
@@ -110,7 +111,8 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             if rule and rule.get('action') == "mute":
                 mute_duration_minutes = rule['duration']
                 mute_until = datetime.utcnow() + timedelta(minutes=mute_duration_minutes)
-                tasks_to_run.append(context.bot.restrict_chat_member(
+                tasks_to_run.append(dispatch(
+                    Priority.MODERATION, context.bot.restrict_chat_member,
                     chat_id=chat.id, user_id=user.id,
                     permissions=ChatPermissions(can_send_messages=False),
                     until_date=mute_until
@@ -120,14 +122,15 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 action_taken_log = f"Мут на {mute_duration_minutes} хв."
 
             elif rule and rule.get('action') == "ban":
-                tasks_to_run.append(context.bot.ban_chat_member(chat_id=chat.id, user_id=user.id))
+                tasks_to_run.append(dispatch(Priority.MODERATION, context.bot.ban_chat_member, chat_id=chat.id, user_id=user.id))
                 warning_text = get_text(lang, "spam_warning_3",
                                         user_mention=user.mention_html())  # Використовуємо старий текст про бан
                 action_taken_log = "Бан"
 
             # Надсилаємо повідомлення про покарання в чат
             if warning_text:
-                warning_msg_task = context.bot.send_message(
+                warning_msg_task = dispatch(
+                    Priority.NOTIFICATION, context.bot.send_message,
                     chat_id=chat.id, text=warning_text, parse_mode=ParseMode.HTML, disable_notification=True
                 )
                 tasks_to_run.append(warning_msg_task)
@@ -154,7 +157,8 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             # Тут можна додати клавіатуру для логів, якщо вона потрібна
             log_keyboard = None
-            tasks_to_run.append(context.bot.send_message(
+            tasks_to_run.append(dispatch(
+                Priority.LOG, context.bot.send_message,
                 chat_id=log_recipient_id, text=log_message,
                 parse_mode=ParseMode.HTML, reply_markup=log_keyboard
             ))
@@ -170,10 +174,8 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 logging.error(f"Помилка при виконанні фонового завдання: {result}")
             # Шукаємо результат від `warning_msg_task`
             elif hasattr(result, 'message_id') and result.chat_id == chat.id:
-                context.job_queue.run_once(
-                    delete_message_job, 30, data={'chat_id': result.chat_id, 'message_id': result.message_id}
-                )
+                schedule_message_deletion(result.chat_id, result.message_id, 30)
 
         # Синхронні дії, що залишилися
-        log_action(chat.id, user.id, user.full_name, 'spam_detected', f'Score: {spam_score}')
-        increment_daily_stat(chat.id, 'messages_deleted')
\ No newline at end of file
+        await log_action(chat.id, user.id, user.full_name, 'spam_detected', f'Score: {spam_score}')
+        await increment_daily_stat(chat.id, 'messages_deleted')
\ No newline at end of file
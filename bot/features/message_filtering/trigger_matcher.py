@@ -0,0 +1,69 @@
+from collections import deque
+from typing import Iterable, Set
+
+
+class TriggerMatcher:
+    """
+    Автомат Ахо-Корасік для пошуку підрядків.
+
+    Знаходить усі шаблони, що входять у текст, за один прохід по тексту,
+    незалежно від кількості шаблонів. Результат збігається з перевіркою
+    `pattern in text` для кожного шаблону окремо.
+    """
+
+    __slots__ = ('_goto', '_fail', '_out', '_always', 'size')
+
+    def __init__(self, patterns: Iterable[str]):
+        goto = [{}]
+        out = [[]]
+        # Порожній шаблон входить у будь-який текст
+        always = []
+        size = 0
+
+        for pattern_id, pattern in enumerate(patterns):
+            size += 1
+            if not pattern:
+                always.append(pattern_id)
+                continue
+            node = 0
+            for char in pattern:
+                next_node = goto[node].get(char)
+                if next_node is None:
+                    next_node = len(goto)
+                    goto[node][char] = next_node
+                    goto.append({})
+                    out.append([])
+                node = next_node
+            out[node].append(pattern_id)
+
+        # Посилання невдачі будуємо обходом у ширину від кореня
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                queue.append(child)
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(char, 0)
+                out[child].extend(out[fail[child]])
+
+        self._goto = goto
+        self._fail = fail
+        self._out = [tuple(ids) for ids in out]
+        self._always = tuple(always)
+        self.size = size
+
+    def find(self, text: str) -> Set[int]:
+        """Повертає номери всіх шаблонів, що входять у текст."""
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set(self._always)
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
@@ -0,0 +1,194 @@
+# Асинхронний шар доступу до БД.
+# Синхронні функції з bot.infrastructure.database виконуються у виділених потоках
+# (кожен зі своїм довгоживучим з'єднанням), тому повільний запис не блокує
+# цикл подій, спільний для Telegram-бота та веб-сервера.
+import asyncio
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from bot.infrastructure import database
+from bot.infrastructure.chat_config_cache import ChatConfig, chat_config_cache
+
+# Кількість потоків БД (SQLite у режимі WAL дозволяє паралельне читання)
+DB_EXECUTOR_WORKERS = 4
+# Максимальна кількість запитів, що одночасно чекають або виконуються
+DB_MAX_PENDING = 1000
+# Скільки останніх вимірів часу очікування зберігати для метрик
+WAIT_SAMPLES = 1000
+
+
+class DatabaseBusyError(RuntimeError):
+    """Черга запитів до БД переповнена."""
+
+
+class DatabaseExecutor:
+    """Пул потоків для запитів до БД з обмеженою чергою та метриками очікування."""
+
+    def __init__(self, max_workers: int = DB_EXECUTOR_WORKERS, max_pending: int = DB_MAX_PENDING):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        # Завдання, які вже почали виконуватись (для них відомий час очікування)
+        self._started = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._recent_waits = deque(maxlen=WAIT_SAMPLES)
+
+    async def run(self, func, *args, **kwargs):
+        """Виконує синхронну функцію в потоці БД і повертає її результат."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise DatabaseBusyError(f"DB queue is full ({self.max_pending} pending requests)")
+            self._pending += 1
+
+        enqueued_at = time.perf_counter()
+
+        def job():
+            self._record_wait(time.perf_counter() - enqueued_at)
+            return func(*args, **kwargs)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, job)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._completed += 1
+
+    def _record_wait(self, wait: float):
+        with self._lock:
+            self._started += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            self._recent_waits.append(wait)
+
+    def get_metrics(self) -> dict:
+        """Повертає знімок метрик черги (час у мілісекундах)."""
+        with self._lock:
+            recent = sorted(self._recent_waits)
+            started = self._started
+            metrics = {
+                'workers': self.max_workers,
+                'pending': self._pending,
+                'max_pending': self.max_pending,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'wait_avg_ms': round(self._wait_total / started * 1000, 3) if started else 0.0,
+                'wait_max_ms': round(self._wait_max * 1000, 3),
+            }
+        metrics['wait_p95_ms'] = round(recent[int(len(recent) * 0.95) - 1] * 1000, 3) if recent else 0.0
+        return metrics
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_db_executor() -> DatabaseExecutor:
+    """Повертає спільний пул потоків БД, створюючи його за потреби."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = DatabaseExecutor()
+    return _executor
+
+
+def shutdown_db_executor():
+    """Дочікується завершення запитів і зупиняє потоки БД."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown()
+        logging.info("Пул потоків БД зупинено.")
+
+
+async def run_in_db_executor(func, *args, **kwargs):
+    """Виконує довільну синхронну функцію, що працює з БД, у потоці БД."""
+    return await get_db_executor().run(func, *args, **kwargs)
+
+
+def _offload(func):
+    """Створює асинхронний відповідник синхронної функції модуля database."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_in_db_executor(func, *args, **kwargs)
+    return wrapper
+
+
+# --- Налаштування ---
+get_global_settings = _offload(database.get_global_settings)
+set_global_setting = _offload(database.set_global_setting)
+get_group_settings = _offload(database.get_group_settings)
+set_group_setting = _offload(database.set_group_setting)
+
+# --- Мульти-власники ---
+add_group_if_not_exists = _offload(database.add_group_if_not_exists)
+set_group_admin = _offload(database.set_group_admin)
+is_group_admin = _offload(database.is_group_admin)
+get_user_chats = _offload(database.get_user_chats)
+get_group_admin_id = _offload(database.get_group_admin_id)
+
+# --- Списки спам-слів ---
+get_spam_triggers = _offload(database.get_spam_triggers)
+add_spam_trigger = _offload(database.add_spam_trigger)
+delete_spam_trigger = _offload(database.delete_spam_trigger)
+get_group_blocklist = _offload(database.get_group_blocklist)
+add_group_spam_trigger = _offload(database.add_group_spam_trigger)
+delete_group_spam_trigger = _offload(database.delete_group_spam_trigger)
+get_group_whitelist = _offload(database.get_group_whitelist)
+add_group_whitelist_word = _offload(database.add_group_whitelist_word)
+delete_group_whitelist_word = _offload(database.delete_group_whitelist_word)
+
+# --- Попередження, покарання та статистика ---
+add_warning = _offload(database.add_warning)
+reset_warnings = _offload(database.reset_warnings)
+get_group_stats = _offload(database.get_group_stats)
+get_group_current_stats = _offload(database.get_group_current_stats)
+get_chat_dashboard = _offload(database.get_chat_dashboard)
+schedule_group_deletion = _offload(database.schedule_group_deletion)
+get_pending_group_deletions = _offload(database.get_pending_group_deletions)
+delete_group_data_chunk = _offload(database.delete_group_data_chunk)
+get_punishment_settings = _offload(database.get_punishment_settings)
+set_punishment_settings = _offload(database.set_punishment_settings)
+
+# --- Таймаути капчі ---
+add_captcha_timeout = _offload(database.add_captcha_timeout)
+add_captcha_timeouts = _offload(database.add_captcha_timeouts)
+set_captcha_timeout_message = _offload(database.set_captcha_timeout_message)
+remove_captcha_timeouts = _offload(database.remove_captcha_timeouts)
+get_captcha_timeouts = _offload(database.get_captcha_timeouts)
+
+# --- Збережений стан чатів ---
+get_chat_state = _offload(database.get_chat_state)
+save_chat_states = _offload(database.save_chat_states)
+
+
+# Логи та лічильники лише додаються в буфер відкладеного запису,
+# тому їх не потрібно передавати в потік БД.
+async def log_action(group_id: int, user_id: int, user_name: str, action_type: str, details: str = None):
+    database.log_action(group_id, user_id, user_name, action_type, details)
+
+
+async def increment_daily_stat(group_id: int, stat_field: str, increment: int = 1):
+    database.increment_daily_stat(group_id, stat_field, increment)
+
+
+async def get_chat_config(group_id: int) -> ChatConfig:
+    """Повертає знімок конфігурації чату; до потоку БД звертається лише при промаху кешу."""
+    config = chat_config_cache.get(group_id)
+    if config is None:
+        config = await run_in_db_executor(database.get_chat_config, group_id)
+    return config
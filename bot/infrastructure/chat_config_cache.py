@@ -0,0 +1,131 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Mapping, Optional, Tuple
+
+# Максимальна кількість чатів, конфігурація яких тримається в пам'яті
+CHAT_CONFIG_CACHE_SIZE = 2000
+
+
+@dataclass(frozen=True)
+class ChatConfig:
+    """
+    Незмінний знімок конфігурації чату: налаштування, списки слів,
+    адмін групи та правила покарань. Оновлюється лише заміною цілого знімка.
+    """
+    group_id: int
+    settings: Mapping[str, Any]
+    whitelist: Tuple[str, ...]
+    # Фінальний список тригерів з урахуванням use_global_list / use_custom_list
+    triggers: Mapping[str, int]
+    admin_id: Optional[int]
+    punishments: Mapping[int, Mapping[str, Any]]
+    # Похідні структури (наприклад, скомпільований пошук тригерів), які будуються
+    # один раз на знімок і живуть, доки знімок не буде замінено
+    compiled: dict = field(default_factory=dict, compare=False, repr=False)
+
+    @classmethod
+    def create(cls, group_id: int, settings: dict, whitelist: list, global_triggers: dict,
+               blocklist: dict, admin_id: Optional[int], punishments: dict) -> "ChatConfig":
+        triggers = {}
+        if settings.get('use_global_list', True):
+            triggers.update(global_triggers)
+        if settings.get('use_custom_list', True):
+            # Локальні слова мають вищий пріоритет (перезапишуть глобальні, якщо є збіги)
+            triggers.update(blocklist)
+
+        return cls(
+            group_id=group_id,
+            settings=MappingProxyType(dict(settings)),
+            whitelist=tuple(whitelist),
+            triggers=MappingProxyType(triggers),
+            admin_id=admin_id,
+            punishments=MappingProxyType({level: MappingProxyType(dict(rule)) for level, rule in punishments.items()}),
+        )
+
+
+class ChatConfigCache:
+    """
+    LRU-кеш знімків ChatConfig з явною інвалідацією.
+
+    Кожна інвалідація збільшує лічильник поколінь: знімок, завантажений до
+    інвалідації, не потрапить у кеш, навіть якщо його запис завершився пізніше.
+    """
+
+    def __init__(self, max_size: int = CHAT_CONFIG_CACHE_SIZE):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._configs = OrderedDict()
+        self._global_triggers = None
+        self._generation = 0
+        self._listeners = []
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, group_id: int) -> Optional[ChatConfig]:
+        with self._lock:
+            config = self._configs.get(group_id)
+            if config is None:
+                self.misses += 1
+                return None
+            self._configs.move_to_end(group_id)
+            self.hits += 1
+            return config
+
+    def put(self, config: ChatConfig, generation: int):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._configs[config.group_id] = config
+            self._configs.move_to_end(config.group_id)
+            while len(self._configs) > self.max_size:
+                self._configs.popitem(last=False)
+
+    def get_global_triggers(self) -> Optional[Mapping[str, int]]:
+        return self._global_triggers
+
+    def put_global_triggers(self, triggers: dict, generation: int):
+        with self._lock:
+            if generation == self._generation:
+                self._global_triggers = MappingProxyType(dict(triggers))
+
+    def add_invalidation_listener(self, callback):
+        """
+        Реєструє callback(group_id), який викликається після кожної інвалідації
+        (group_id=None - скинуто все). Потрібно, щоб сповіщати інші процеси.
+        """
+        self._listeners.append(callback)
+
+    def remove_invalidation_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self, group_id: Optional[int]):
+        for callback in self._listeners:
+            callback(group_id)
+
+    def invalidate(self, group_id: int):
+        """Скидає знімок одного чату (після зміни його налаштувань чи списків)."""
+        with self._lock:
+            self._generation += 1
+            self._configs.pop(group_id, None)
+        self._notify(group_id)
+
+    def invalidate_all(self):
+        """Скидає всі знімки (після зміни глобальних налаштувань чи глобального списку)."""
+        with self._lock:
+            self._generation += 1
+            self._configs.clear()
+            self._global_triggers = None
+        self._notify(None)
+
+    def __len__(self):
+        return len(self._configs)
+
+
+chat_config_cache = ChatConfigCache()
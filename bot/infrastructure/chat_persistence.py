@@ -0,0 +1,200 @@
+import asyncio
+import logging
+import struct
+from typing import Dict, NamedTuple, Optional
+from telegram.ext import BasePersistence, PersistenceInput
+
+from bot.infrastructure.async_database import get_chat_state, save_chat_states
+
+# Як часто PTB передає змінені чати на збереження (секунди)
+PERSISTENCE_UPDATE_INTERVAL = 30
+# Версія формату: змінюється разом зі структурою закодованого стану
+STATE_FORMAT_VERSION = 1
+
+_VERSION = struct.Struct(">B")
+_KEY_HEADER = struct.Struct(">B")
+_PAYLOAD_HEADER = struct.Struct(">I")
+
+# Типи стану, які зберігаються: {ключ у chat_data: клас з to_bytes() та from_bytes(data, chat_id)}
+_state_types = {}
+
+
+class EncodedState(NamedTuple):
+    """Стан, уже закодований у байти (так об'єкти стану віддають себе при deepcopy)."""
+    data: bytes
+
+
+def register_chat_state(key: str, state_type):
+    """Реєструє тип стану, який зберігається в chat_data під ключем key."""
+    _state_types[key] = state_type
+
+
+def encode_chat_data(chat_data: dict) -> bytes:
+    """Кодує зареєстровані стани чату. Порожній стан - порожні байти."""
+    parts = []
+    for key, value in chat_data.items():
+        if key not in _state_types:
+            continue
+        payload = value.data if isinstance(value, EncodedState) else value.to_bytes()
+        if not payload:
+            continue
+        key_bytes = key.encode()
+        parts.append(_KEY_HEADER.pack(len(key_bytes)) + key_bytes + _PAYLOAD_HEADER.pack(len(payload)) + payload)
+    if not parts:
+        return b""
+    return _VERSION.pack(STATE_FORMAT_VERSION) + b"".join(parts)
+
+
+def decode_chat_data(data: bytes, chat_id: int) -> dict:
+    """Відновлює об'єкти стану з байтів. Невідомі ключі та інші версії формату пропускаються."""
+    if not data or _VERSION.unpack_from(data)[0] != STATE_FORMAT_VERSION:
+        return {}
+    result = {}
+    offset = _VERSION.size
+    while offset < len(data):
+        key_length, = _KEY_HEADER.unpack_from(data, offset)
+        offset += _KEY_HEADER.size
+        key = data[offset:offset + key_length].decode()
+        offset += key_length
+        payload_length, = _PAYLOAD_HEADER.unpack_from(data, offset)
+        offset += _PAYLOAD_HEADER.size
+        payload = data[offset:offset + payload_length]
+        offset += payload_length
+        state_type = _state_types.get(key)
+        if state_type is not None:
+            result[key] = state_type.from_bytes(payload, chat_id)
+    return result
+
+
+class ChatStatePersistence(BasePersistence):
+    """
+    Збереження chat_data в SQLite бота.
+
+    Зберігаються лише зареєстровані об'єкти стану у компактному двійковому вигляді.
+    Стан чату завантажується не при старті, а під час першого оновлення цього чату
+    (refresh_chat_data). PTB раз на PERSISTENCE_UPDATE_INTERVAL передає лише чати,
+    які змінювались, і всі вони записуються однією транзакцією; незмінений стан не пишеться.
+    """
+
+    def __init__(self, update_interval: float = PERSISTENCE_UPDATE_INTERVAL):
+        super().__init__(store_data=PersistenceInput(bot_data=False, chat_data=True, user_data=False,
+                                                     callback_data=False),
+                         update_interval=update_interval)
+        # Чати, стан яких уже завантажено; забуваються разом з chat_data (drop_chat_data)
+        self._loaded = set()
+        self._loading: Dict[int, asyncio.Future] = {}
+        # Останній записаний непорожній стан чату - щоб не переписувати однакові дані
+        self._stored: Dict[int, bytes] = {}
+        self._pending: Dict[int, bytes] = {}
+        self._write_task: Optional[asyncio.Task] = None
+
+    # --- Завантаження ---
+
+    async def get_chat_data(self) -> dict:
+        # Нічого не завантажуємо наперед - див. refresh_chat_data
+        return {}
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        """Викликається PTB перед обробкою оновлення чату: при першому зверненні підвантажує стан з БД."""
+        if chat_id in self._loaded:
+            return
+        loading = self._loading.get(chat_id)
+        if loading is not None:
+            # Стан уже завантажує інше оновлення цього чату
+            await asyncio.shield(loading)
+            return
+
+        loading = self._loading[chat_id] = asyncio.get_running_loop().create_future()
+        try:
+            data = await get_chat_state(chat_id)
+            if data:
+                self._stored[chat_id] = data
+            for key, state in decode_chat_data(data, chat_id).items():
+                # Стан, створений обробником до завантаження, не перезаписуємо
+                chat_data.setdefault(key, state)
+        except Exception as e:
+            logging.error(f"Не вдалося завантажити збережений стан чату {chat_id}: {e}")
+        finally:
+            self._loaded.add(chat_id)
+            del self._loading[chat_id]
+            loading.set_result(None)
+
+    # --- Збереження ---
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        encoded = encode_chat_data(data)
+        if encoded == self._stored.get(chat_id, b""):
+            self._pending.pop(chat_id, None)
+            return
+        self._pending[chat_id] = encoded
+        # PTB викликає update_chat_data для всіх змінених чатів одночасно -
+        # збираємо їх і записуємо одним пакетом
+        if self._write_task is None or self._write_task.done():
+            self._write_task = asyncio.get_running_loop().create_task(self._write_pending())
+
+    async def _write_pending(self):
+        await asyncio.sleep(0)
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        try:
+            await save_chat_states(pending)
+        except Exception as e:
+            logging.error(f"Не вдалося зберегти стан {len(pending)} чатів: {e}")
+            # Повернемо в чергу, якщо новіших даних ще не надійшло
+            for chat_id, data in pending.items():
+                self._pending.setdefault(chat_id, data)
+            return
+        for chat_id, data in pending.items():
+            if data:
+                self._stored[chat_id] = data
+            else:
+                self._stored.pop(chat_id, None)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        """Викликається PTB після Application.drop_chat_data (бота видалили з чату)."""
+        self._pending.pop(chat_id, None)
+        self._stored.pop(chat_id, None)
+        self._loaded.discard(chat_id)
+        await save_chat_states({chat_id: b""})
+
+    async def flush(self) -> None:
+        """Дописує все, що ще не збережено (під час зупинки бота)."""
+        if self._write_task is not None:
+            await self._write_task
+        await self._write_pending()
+
+    # --- Дані, які не зберігаються ---
+
+    async def get_user_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        return {}
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        pass
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data) -> None:
+        pass
@@ -1,12 +1,17 @@
-import datetime
 import logging
 import sqlite3
+import time
+from typing import Optional
 from bot.config import DB_NAME, ADMIN_ID
+from bot.infrastructure.db_connection import get_connection, read_cursor, read_transaction, transaction
+from bot.infrastructure.write_buffer import stats_buffer, flush_pending_writes, ACTIVITY_ACTION, VIOLATION_ACTIONS
+from bot.infrastructure.chat_config_cache import ChatConfig, chat_config_cache
+from bot.infrastructure.live_stats import live_stats
 
 
 def setup_database():
 
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
 
     # --- Основні таблиці ---
@@ -30,7 +35,8 @@ def setup_database():
             captcha_enabled INTEGER DEFAULT 1, spam_filter_enabled INTEGER DEFAULT 1,
             use_global_list INTEGER DEFAULT 1, use_custom_list INTEGER DEFAULT 1,
             antiflood_enabled INTEGER DEFAULT 1,
-            antiflood_sensitivity INTEGER DEFAULT 5
+            antiflood_sensitivity INTEGER DEFAULT 5,
+            log_retention_days INTEGER DEFAULT NULL
         )
     """)
     cursor.execute(
@@ -47,6 +53,39 @@ def setup_database():
             )
         """)
 
+    # --- Незавершені капчі (щоб таймаути пережили перезапуск бота) ---
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS captcha_timeouts (
+            chat_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            message_id INTEGER,
+            lang TEXT,
+            expires_at REAL NOT NULL,
+            PRIMARY KEY (chat_id, user_id)
+        )
+    """)
+
+    # --- Стан чатів у пам'яті (трекер флуду, спроби спільної капчі) у компактному двійковому вигляді ---
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS chat_state (
+            chat_id INTEGER PRIMARY KEY,
+            data BLOB NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """)
+
+    # --- Черга видалення даних груп (бота видалили з чату) ---
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS pending_group_deletions (
+            group_id INTEGER PRIMARY KEY,
+            requested_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            table_index INTEGER NOT NULL DEFAULT 0,
+            rows_deleted INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    # Ключ warnings починається з user_id, тому для вибірки по чату потрібен окремий індекс
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_warnings_chat ON warnings (chat_id)")
+
     # --- Безпечне додавання нових стовпців (Міграція) ---
     try:
         cursor.execute("ALTER TABLE group_settings ADD COLUMN use_global_list INTEGER DEFAULT 1")
@@ -62,6 +101,13 @@ def setup_database():
     except sqlite3.OperationalError:
         pass
 
+    try:
+        # NULL - використовується глобальний термін зберігання логів (LOG_RETENTION_DAYS)
+        cursor.execute("ALTER TABLE group_settings ADD COLUMN log_retention_days INTEGER DEFAULT NULL")
+        logging.info("Міграція БД: Додано стовпець 'log_retention_days'.")
+    except sqlite3.OperationalError:
+        pass
+
     # --- Заповнення початковими даними ---
     default_settings = {"spam_threshold": "10", "captcha_enabled": "1", "spam_filter_enabled": "1"}
     for key, value in default_settings.items():
@@ -78,7 +124,7 @@ def setup_database():
     setup_stats_tables(conn, cursor)
 
     conn.commit()
-    conn.close()
+    cursor.close()
     logging.info(f"База даних '{DB_NAME}' успішно налаштована та оновлена.")
 
 
@@ -86,12 +132,9 @@ def setup_database():
 
 def get_global_settings() -> dict:
     """Отримує глобальні налаштування бота з таблиці 'settings'."""
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("SELECT key, value FROM settings")
-    settings_db = {row['key']: row['value'] for row in cursor.fetchall()}
-    conn.close()
+    with read_cursor() as cursor:
+        cursor.execute("SELECT key, value FROM settings")
+        settings_db = {row['key']: row['value'] for row in cursor.fetchall()}
 
     return {
         'spam_threshold': int(settings_db.get('spam_threshold', 10)),
@@ -104,13 +147,11 @@ def get_global_settings() -> dict:
 
 def set_global_setting(key: str, value):
     """Встановлює глобальне налаштування в таблиці 'settings'."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
     if isinstance(value, bool):
         value = "1" if value else "0"
-    cursor.execute("REPLACE INTO settings (key, value) VALUES (?, ?)", (key, str(value)))
-    conn.commit()
-    conn.close()
+    with transaction() as cursor:
+        cursor.execute("REPLACE INTO settings (key, value) VALUES (?, ?)", (key, str(value)))
+    chat_config_cache.invalidate_all()
 
 
 def get_group_settings(group_id: int) -> dict:
@@ -123,14 +164,12 @@ def get_group_settings(group_id: int) -> dict:
     final_settings = get_global_settings()
     final_settings['antiflood_enabled'] = True
     final_settings['antiflood_sensitivity'] = 5
+    final_settings['log_retention_days'] = None
 
     # 2. Потім шукаємо індивідуальні налаштування для групи
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM group_settings WHERE group_id = ?", (group_id,))
-    group_specific_settings = cursor.fetchone()
-    conn.close()
+    with read_cursor() as cursor:
+        cursor.execute("SELECT * FROM group_settings WHERE group_id = ?", (group_id,))
+        group_specific_settings = cursor.fetchone()
 
     # 3. Якщо для групи є індивідуальні налаштування, оновлюємо ними базовий набір
     if group_specific_settings:
@@ -147,6 +186,7 @@ def get_group_settings(group_id: int) -> dict:
             'use_custom_list': bool(updates.get('use_custom_list', 1)),
             'antiflood_enabled': bool(updates.get('antiflood_enabled', 1)),
             'antiflood_sensitivity': int(updates.get('antiflood_sensitivity', 5)),
+            'log_retention_days': updates.get('log_retention_days'),
         })
 
     return final_settings
@@ -154,78 +194,65 @@ def get_group_settings(group_id: int) -> dict:
 
 def set_group_setting(group_id: int, key: str, value):
     """Встановлює налаштування для конкретної групи."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
     if isinstance(value, bool): value = 1 if value else 0
-    cursor.execute(f"UPDATE group_settings SET {key} = ? WHERE group_id = ?", (value, group_id))
-    conn.commit()
-    conn.close()
+    with transaction() as cursor:
+        cursor.execute(f"UPDATE group_settings SET {key} = ? WHERE group_id = ?", (value, group_id))
+    chat_config_cache.invalidate(group_id)
 
 
 # --- Функції для мульти-власників ---
 
 def add_group_if_not_exists(group_id: int, group_name: str):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("INSERT OR IGNORE INTO group_settings (group_id, group_name) VALUES (?, ?)", (group_id, group_name))
-    conn.commit()
-    conn.close()
+    with transaction() as cursor:
+        cursor.execute("INSERT OR IGNORE INTO group_settings (group_id, group_name) VALUES (?, ?)",
+                       (group_id, group_name))
+    chat_config_cache.invalidate(group_id)
 
 
 def set_group_admin(group_id: int, user_id: int):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM group_admins WHERE group_id = ?", (group_id,))
-    cursor.execute("INSERT INTO group_admins (group_id, user_id) VALUES (?, ?)", (group_id, user_id))
-    conn.commit()
-    conn.close()
+    with transaction() as cursor:
+        cursor.execute("DELETE FROM group_admins WHERE group_id = ?", (group_id,))
+        cursor.execute("INSERT INTO group_admins (group_id, user_id) VALUES (?, ?)", (group_id, user_id))
+    chat_config_cache.invalidate(group_id)
 
 
 def is_group_admin(user_id: int, group_id: int) -> bool:
     if user_id == ADMIN_ID:
         return True
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT 1 FROM group_admins WHERE group_id = ? AND user_id = ?", (group_id, user_id))
-    result = cursor.fetchone()
-    conn.close()
+    with read_cursor() as cursor:
+        cursor.execute("SELECT 1 FROM group_admins WHERE group_id = ? AND user_id = ?", (group_id, user_id))
+        result = cursor.fetchone()
     return result is not None
 
 
 def get_user_chats(user_id: int) -> list:
     """Отримує список чатів, якими керує користувач."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
-    if user_id == ADMIN_ID:
-        cursor.execute("SELECT group_id, group_name FROM group_settings ORDER BY group_name")
-    else:
-        cursor.execute("""
-            SELECT gs.group_id, gs.group_name 
-            FROM group_settings gs
-            JOIN group_admins ga ON gs.group_id = ga.group_id
-            WHERE ga.user_id = ?
-            ORDER BY gs.group_name
-        """, (user_id,))
-
-    # Правильний спосіб: спочатку отримуємо всі дані, потім працюємо з ними
-    rows = cursor.fetchall()
+    with read_cursor() as cursor:
+        if user_id == ADMIN_ID:
+            cursor.execute("SELECT group_id, group_name FROM group_settings ORDER BY group_name")
+        else:
+            cursor.execute("""
+                SELECT gs.group_id, gs.group_name 
+                FROM group_settings gs
+                JOIN group_admins ga ON gs.group_id = ga.group_id
+                WHERE ga.user_id = ?
+                ORDER BY gs.group_name
+            """, (user_id,))
+
+        # Правильний спосіб: спочатку отримуємо всі дані, потім працюємо з ними
+        rows = cursor.fetchall()
     logging.info(f"DB query for user {user_id} returned {len(rows)} rows.")
 
     # Використовуємо числові індекси для сумісності з тестами
     chats = [{"id": row[0], "name": row[1]} for row in rows]
-
-    conn.close()
     return chats
 
 
 def get_group_admin_id(group_id: int) -> int or None:
     """Знаходить ID адміна бота для конкретної групи."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT user_id FROM group_admins WHERE group_id = ?", (group_id,))
-    result = cursor.fetchone()
-    conn.close()
+    with read_cursor() as cursor:
+        cursor.execute("SELECT user_id FROM group_admins WHERE group_id = ?", (group_id,))
+        result = cursor.fetchone()
     return result[0] if result else None
 
 
@@ -233,130 +260,102 @@ def get_group_admin_id(group_id: int) -> int or None:
 
 def get_spam_triggers() -> dict:
     """Отримує ГЛОБАЛЬНИЙ список спам-слів."""
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("SELECT trigger, score FROM spam_triggers")
-    triggers = {row[0]: row[1] for row in cursor.fetchall()}
-    conn.close()
+    with read_cursor() as cursor:
+        cursor.execute("SELECT trigger, score FROM spam_triggers")
+        triggers = {row[0]: row[1] for row in cursor.fetchall()}
     return triggers
 
 
 def add_spam_trigger(trigger: str, score: int):
     """Додає слово в ГЛОБАЛЬНИЙ список."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("REPLACE INTO spam_triggers (trigger, score) VALUES (?, ?)", (trigger.lower(), score))
-    conn.commit()
-    conn.close()
+    with transaction() as cursor:
+        cursor.execute("REPLACE INTO spam_triggers (trigger, score) VALUES (?, ?)", (trigger.lower(), score))
+    chat_config_cache.invalidate_all()
 
 
 def delete_spam_trigger(trigger: str):
     """Видаляє слово з ГЛОБАЛЬНОГО списку."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM spam_triggers WHERE trigger = ?", (trigger.lower(),))
-    conn.commit()
-    conn.close()
+    with transaction() as cursor:
+        cursor.execute("DELETE FROM spam_triggers WHERE trigger = ?", (trigger.lower(),))
+    chat_config_cache.invalidate_all()
 
 
 # --- Функції для керування ЛОКАЛЬНИМИ списками груп ---
 
 def get_group_blocklist(group_id: int) -> dict:
     """Отримує ЛОКАЛЬНИЙ чорний список для групи."""
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("SELECT trigger, score FROM group_spam_triggers WHERE group_id = ?", (group_id,))
-    triggers = {row['trigger']: row['score'] for row in cursor.fetchall()}
-    conn.close()
+    with read_cursor() as cursor:
+        cursor.execute("SELECT trigger, score FROM group_spam_triggers WHERE group_id = ?", (group_id,))
+        triggers = {row['trigger']: row['score'] for row in cursor.fetchall()}
     return triggers
 
 
 def add_group_spam_trigger(group_id: int, trigger: str, score: int):
     """Додає слово в ЛОКАЛЬНИЙ чорний список групи."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("REPLACE INTO group_spam_triggers (group_id, trigger, score) VALUES (?, ?, ?)",
-                   (group_id, trigger.lower(), score))
-    conn.commit()
-    conn.close()
+    with transaction() as cursor:
+        cursor.execute("REPLACE INTO group_spam_triggers (group_id, trigger, score) VALUES (?, ?, ?)",
+                       (group_id, trigger.lower(), score))
+    chat_config_cache.invalidate(group_id)
 
 
 def delete_group_spam_trigger(group_id: int, trigger: str):
     """Видаляє слово з ЛОКАЛЬНОГО чорного списку групи."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM group_spam_triggers WHERE group_id = ? AND trigger = ?",
-                   (group_id, trigger.lower()))
-    conn.commit()
-    conn.close()
+    with transaction() as cursor:
+        cursor.execute("DELETE FROM group_spam_triggers WHERE group_id = ? AND trigger = ?",
+                       (group_id, trigger.lower()))
+    chat_config_cache.invalidate(group_id)
 
 
 def get_group_whitelist(group_id: int) -> list:
     """Отримує ЛОКАЛЬНИЙ білий список для групи."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT trigger FROM group_whitelists WHERE group_id = ?", (group_id,))
-    triggers = [row[0] for row in cursor.fetchall()]
-    conn.close()
+    with read_cursor() as cursor:
+        cursor.execute("SELECT trigger FROM group_whitelists WHERE group_id = ?", (group_id,))
+        triggers = [row[0] for row in cursor.fetchall()]
     return triggers
 
 
 def add_group_whitelist_word(group_id: int, word: str):
     """Додає слово в ЛОКАЛЬНИЙ білий список групи."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("INSERT OR IGNORE INTO group_whitelists (group_id, trigger) VALUES (?, ?)",
-                   (group_id, word.lower()))
-    conn.commit()
-    conn.close()
+    with transaction() as cursor:
+        cursor.execute("INSERT OR IGNORE INTO group_whitelists (group_id, trigger) VALUES (?, ?)",
+                       (group_id, word.lower()))
+    chat_config_cache.invalidate(group_id)
 
 
 def delete_group_whitelist_word(group_id: int, word: str):
     """Видаляє слово з ЛОКАЛЬНОГО білого списку групи."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM group_whitelists WHERE group_id = ? AND trigger = ?",
-                   (group_id, word.lower()))
-    conn.commit()
-    conn.close()
+    with transaction() as cursor:
+        cursor.execute("DELETE FROM group_whitelists WHERE group_id = ? AND trigger = ?",
+                       (group_id, word.lower()))
+    chat_config_cache.invalidate(group_id)
 
 
 # --- Інші функції ---
 
 def add_warning(user_id: int, chat_id: int) -> int:
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT warning_count FROM warnings WHERE user_id = ? AND chat_id = ?", (user_id, chat_id))
-    result = cursor.fetchone()
-    new_count = (result[0] + 1) if result else 1
-    cursor.execute("REPLACE INTO warnings (user_id, chat_id, warning_count) VALUES (?, ?, ?)",
-                   (user_id, chat_id, new_count))
-    conn.commit()
-    conn.close()
+    with transaction() as cursor:
+        cursor.execute("SELECT warning_count FROM warnings WHERE user_id = ? AND chat_id = ?", (user_id, chat_id))
+        result = cursor.fetchone()
+        new_count = (result[0] + 1) if result else 1
+        cursor.execute("REPLACE INTO warnings (user_id, chat_id, warning_count) VALUES (?, ?, ?)",
+                       (user_id, chat_id, new_count))
     return new_count
 
 
 def reset_warnings(user_id: int, chat_id: int):
     """Скидає попередження для користувача в конкретному чаті."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM warnings WHERE user_id = ? AND chat_id = ?", (user_id, chat_id))
-    conn.commit()
-    conn.close()
+    with transaction() as cursor:
+        cursor.execute("DELETE FROM warnings WHERE user_id = ? AND chat_id = ?", (user_id, chat_id))
 
 
-# Замініть функцію setup_stats_tables() в bot/infrastructure/database.py на цю:
-
 def setup_stats_tables(conn=None, cursor=None):
     """Створює таблиці для збору статистики."""
-    # Якщо conn і cursor не передані, створюємо власні
-    close_connection = False
+    # Якщо conn і cursor не передані, використовуємо з'єднання поточного потоку
+    own_transaction = False
     if conn is None:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_connection()
         cursor = conn.cursor()
-        close_connection = True
+        own_transaction = True
 
     # Таблиця для логування всіх дій
     cursor.execute("""
@@ -388,105 +387,142 @@ def setup_stats_tables(conn=None, cursor=None):
         )
     """)
 
-    if close_connection:
+    # Статистика читається зі зведених таблиць, тож індекс за типом дії лише сповільнював запис логів
+    cursor.execute("DROP INDEX IF EXISTS idx_action_logs_group_type_time")
+    # Індекс для очищення старих логів (див. log_retention)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_action_logs_timestamp ON action_logs (timestamp)")
+    # Індекс для посторінкового експорту логів групи за період (див. stats_export)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_action_logs_group_time ON action_logs (group_id, timestamp)")
+
+    # Зведені таблиці для графіка активності та топу порушників.
+    # Оновлюються буфером запису разом з action_logs (див. write_buffer).
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('hourly_activity', 'user_violations')")
+    existing_rollups = {row[0] for row in cursor.fetchall()}
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS hourly_activity (
+            group_id INTEGER,
+            hour_bucket TEXT,
+            message_count INTEGER DEFAULT 0,
+            PRIMARY KEY (group_id, hour_bucket)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_violations (
+            group_id INTEGER,
+            date DATE,
+            user_id INTEGER,
+            user_name TEXT,
+            violation_count INTEGER DEFAULT 0,
+            PRIMARY KEY (group_id, date, user_id, user_name)
+        )
+    """)
+
+    # Міграція: заповнюємо щойно створені зведені таблиці з наявних логів
+    if 'hourly_activity' not in existing_rollups:
+        cursor.execute("""
+            INSERT INTO hourly_activity (group_id, hour_bucket, message_count)
+            SELECT group_id, strftime('%Y-%m-%d %H', timestamp), COUNT(*)
+            FROM action_logs WHERE action_type = ?
+            GROUP BY group_id, strftime('%Y-%m-%d %H', timestamp)
+        """, (ACTIVITY_ACTION,))
+        if cursor.rowcount > 0:
+            logging.info("Міграція БД: Заповнено таблицю 'hourly_activity' з action_logs.")
+    if 'user_violations' not in existing_rollups:
+        placeholders = ", ".join("?" for _ in VIOLATION_ACTIONS)
+        cursor.execute(f"""
+            INSERT INTO user_violations (group_id, date, user_id, user_name, violation_count)
+            SELECT group_id, date(timestamp), user_id, user_name, COUNT(*)
+            FROM action_logs WHERE action_type IN ({placeholders})
+            GROUP BY group_id, date(timestamp), user_id, user_name
+        """, VIOLATION_ACTIONS)
+        if cursor.rowcount > 0:
+            logging.info("Міграція БД: Заповнено таблицю 'user_violations' з action_logs.")
+
+    if own_transaction:
         conn.commit()
-        conn.close()
+        cursor.close()
 
 
 def log_action(group_id: int, user_id: int, user_name: str, action_type: str, details: str = None):
-    """Логує дію для статистики, зберігаючи ім'я користувача."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO action_logs (group_id, user_id, user_name, action_type, details) VALUES (?, ?, ?, ?, ?)",
-        (group_id, user_id, user_name, action_type, details)
-    )
-    conn.commit()
-    conn.close()
+    """Логує дію для статистики, зберігаючи ім'я користувача (запис відкладений, див. write_buffer)."""
+    stats_buffer.add_log(group_id, user_id, user_name, action_type, details)
 
 
 def increment_daily_stat(group_id: int, stat_field: str, increment: int = 1):
-    """Збільшує лічильник денної статистики."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    today = datetime.date.today()
-
-    # Створюємо запис для сьогодні, якщо його немає
-    cursor.execute(
-        "INSERT OR IGNORE INTO daily_stats (group_id, date) VALUES (?, ?)",
-        (group_id, today)
-    )
-
-    # Збільшуємо лічильник
-    cursor.execute(
-        f"UPDATE daily_stats SET {stat_field} = {stat_field} + ? WHERE group_id = ? AND date = ?",
-        (increment, group_id, today)
-    )
-    conn.commit()
-    conn.close()
+    """Збільшує лічильник денної статистики (запис відкладений, див. write_buffer)."""
+    stats_buffer.add_increment(group_id, stat_field, increment)
+    # Відкриті панелі цього чату отримають приріст без запиту до БД
+    live_stats.publish(group_id, stat_field, increment)
+
+
+# Запити статистики. Умови за часом порівнюють сам стовпець із константою
+# (без обгортки datetime(timestamp)), тому SQLite може шукати по індексу.
+# Формат timestamp ('YYYY-MM-DD HH:MM:SS', UTC) збігається з datetime('now'), тож порівняння рядків коректне.
+# Топ порушників і активність по годинах читаються зі зведених таблиць, а не з сирих логів.
+STATS_TOTALS_SQL = """
+    SELECT 
+        SUM(messages_total) as total_messages,
+        SUM(messages_deleted) as total_deleted,
+        SUM(users_joined) as total_joined,
+        SUM(users_left) as total_left,
+        SUM(captcha_passed) as total_captcha_passed,
+        SUM(captcha_failed) as total_captcha_failed,
+        SUM(warnings_given) as total_warnings,
+        SUM(bans_given) as total_bans
+    FROM daily_stats 
+    WHERE group_id = ? AND date >= date('now', '-' || ? || ' days')
+"""
+
+STATS_DAILY_SQL = """
+    SELECT date, messages_total, messages_deleted, users_joined, users_left
+    FROM daily_stats 
+    WHERE group_id = ? AND date >= date('now', '-' || ? || ' days')
+    ORDER BY date
+"""
+
+STATS_TOP_VIOLATORS_SQL = """
+    SELECT user_id, user_name, SUM(violation_count) as violation_count
+    FROM user_violations
+    WHERE group_id = ? AND date >= date('now', '-' || ? || ' days')
+    GROUP BY user_id, user_name
+    ORDER BY violation_count DESC
+    LIMIT 5
+"""
+
+STATS_HOURLY_SQL = """
+    SELECT substr(hour_bucket, 12, 2) as hour, SUM(message_count) as count
+    FROM hourly_activity
+    WHERE group_id = ? AND hour_bucket >= strftime('%Y-%m-%d %H', 'now', '-7 days')
+    GROUP BY hour
+    ORDER BY hour
+"""
 
 
 def get_group_stats(group_id: int, days: int = 30) -> dict:
     """Отримує статистику для групи за останні N днів."""
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+    # Спочатку дописуємо накопичене, щоб лічильники були актуальними
+    flush_pending_writes()
+    return _read_group_stats(group_id, days)
 
-    # Загальна статистика
-    cursor.execute("""
-        SELECT 
-            SUM(messages_total) as total_messages,
-            SUM(messages_deleted) as total_deleted,
-            SUM(users_joined) as total_joined,
-            SUM(users_left) as total_left,
-            SUM(captcha_passed) as total_captcha_passed,
-            SUM(captcha_failed) as total_captcha_failed,
-            SUM(warnings_given) as total_warnings,
-            SUM(bans_given) as total_bans
-        FROM daily_stats 
-        WHERE group_id = ? AND date >= date('now', '-' || ? || ' days')
-    """, (group_id, days))
-
-    totals = cursor.fetchone()
-
-    # Щоденна статистика для графіків
-    cursor.execute("""
-        SELECT date, messages_total, messages_deleted, users_joined, users_left
-        FROM daily_stats 
-        WHERE group_id = ? AND date >= date('now', '-' || ? || ' days')
-        ORDER BY date
-    """, (group_id, days))
 
-    daily_data = cursor.fetchall()
+def _read_group_stats(group_id: int, days: int) -> dict:
+    with read_cursor() as cursor:
+        # Загальна статистика
+        cursor.execute(STATS_TOTALS_SQL, (group_id, days))
+        totals = cursor.fetchone()
 
-    # Топ порушників
-    cursor.execute("""
-        SELECT user_id, user_name, COUNT(*) as violation_count
-        FROM action_logs
-        WHERE group_id = ? 
-            AND action_type IN ('spam_detected', 'warning_given', 'user_banned')
-            AND datetime(timestamp) >= datetime('now', '-' || ? || ' days')
-        GROUP BY user_id, user_name
-        ORDER BY violation_count DESC
-        LIMIT 5
-    """, (group_id, days))
-
-    top_violators = cursor.fetchall()
-
-    # Активність по годинах
-    cursor.execute("""
-        SELECT strftime('%H', timestamp) as hour, COUNT(*) as count
-        FROM action_logs
-        WHERE group_id = ? 
-            AND action_type = 'message_sent'
-            AND datetime(timestamp) >= datetime('now', '-7 days')
-        GROUP BY hour
-        ORDER BY hour
-    """, (group_id,))
+        # Щоденна статистика для графіків
+        cursor.execute(STATS_DAILY_SQL, (group_id, days))
+        daily_data = cursor.fetchall()
 
-    hourly_activity = cursor.fetchall()
+        # Топ порушників
+        cursor.execute(STATS_TOP_VIOLATORS_SQL, (group_id, days))
+        top_violators = cursor.fetchall()
 
-    conn.close()
+        # Активність по годинах
+        cursor.execute(STATS_HOURLY_SQL, (group_id,))
+        hourly_activity = cursor.fetchall()
 
     return {
         'totals': dict(totals) if totals else {},
@@ -498,38 +534,33 @@ def get_group_stats(group_id: int, days: int = 30) -> dict:
 
 def get_group_current_stats(group_id: int) -> dict:
     """Отримує поточну статистику групи (користувачі з попередженнями тощо)."""
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-
-    # Кількість користувачів з попередженнями
-    cursor.execute("""
-        SELECT COUNT(DISTINCT user_id) as users_with_warnings,
-               SUM(warning_count) as total_warnings
-        FROM warnings
-        WHERE chat_id = ? AND warning_count > 0
-    """, (group_id,))
-
-    warnings_data = cursor.fetchone()
+    with read_cursor() as cursor:
+        # Кількість користувачів з попередженнями
+        cursor.execute("""
+            SELECT COUNT(DISTINCT user_id) as users_with_warnings,
+                   SUM(warning_count) as total_warnings
+            FROM warnings
+            WHERE chat_id = ? AND warning_count > 0
+        """, (group_id,))
 
-    # Налаштування групи
-    cursor.execute("""
-        SELECT captcha_enabled, spam_filter_enabled, spam_threshold, 
-               use_global_list, use_custom_list
-        FROM group_settings
-        WHERE group_id = ?
-    """, (group_id,))
+        warnings_data = cursor.fetchone()
 
-    settings = cursor.fetchone()
+        # Налаштування групи
+        cursor.execute("""
+            SELECT captcha_enabled, spam_filter_enabled, spam_threshold, 
+                   use_global_list, use_custom_list
+            FROM group_settings
+            WHERE group_id = ?
+        """, (group_id,))
 
-    # Кількість слів у локальних списках
-    cursor.execute("SELECT COUNT(*) as count FROM group_spam_triggers WHERE group_id = ?", (group_id,))
-    blocklist_count = cursor.fetchone()['count']
+        settings = cursor.fetchone()
 
-    cursor.execute("SELECT COUNT(*) as count FROM group_whitelists WHERE group_id = ?", (group_id,))
-    whitelist_count = cursor.fetchone()['count']
+        # Кількість слів у локальних списках
+        cursor.execute("SELECT COUNT(*) as count FROM group_spam_triggers WHERE group_id = ?", (group_id,))
+        blocklist_count = cursor.fetchone()['count']
 
-    conn.close()
+        cursor.execute("SELECT COUNT(*) as count FROM group_whitelists WHERE group_id = ?", (group_id,))
+        whitelist_count = cursor.fetchone()['count']
 
     return {
         'warnings': dict(warnings_data) if warnings_data else {},
@@ -539,48 +570,142 @@ def get_group_current_stats(group_id: int) -> dict:
     }
 
 
-def delete_all_group_data(group_id: int):
-    """Видаляє всі дані, пов'язані з конкретною групою."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+# Розділи панелі керування чатом, які можна запитати разом
+DASHBOARD_SECTIONS = ('settings', 'blocklist', 'whitelist', 'punishments', 'stats')
 
-    # Список таблиць, де є дані, специфічні для групи
-    tables_to_clean = [
-        "group_settings",
-        "group_admins",
-        "warnings",
-        "group_spam_triggers",
-        "group_whitelists",
-        "action_logs",
-        "daily_stats"
-    ]
-
-    logging.info(f"Видалення всіх даних для групи {group_id}...")
-    for table in tables_to_clean:
-        # Для таблиці warnings та action_logs використовуємо chat_id/group_id
-        id_column = "chat_id" if table == "warnings" else "group_id"
-        cursor.execute(f"DELETE FROM {table} WHERE {id_column} = ?", (group_id,))
 
-    conn.commit()
-    conn.close()
-    logging.info(f"Дані для групи {group_id} успішно видалено.")
+def get_chat_dashboard(group_id: int, sections=DASHBOARD_SECTIONS, days: int = 30) -> dict:
+    """
+    Дані панелі керування чатом одним запитом: лише вказані розділи,
+    прочитані в одній транзакції (тобто з одного знімка БД).
+    """
+    if 'stats' in sections:
+        # Запис - до початку транзакції читання, інакше commit її завершить
+        flush_pending_writes()
+
+    dashboard = {}
+    with read_transaction():
+        if 'settings' in sections:
+            dashboard['settings'] = get_group_settings(group_id)
+        if 'blocklist' in sections:
+            dashboard['blocklist'] = get_group_blocklist(group_id)
+        if 'whitelist' in sections:
+            dashboard['whitelist'] = get_group_whitelist(group_id)
+        if 'punishments' in sections:
+            dashboard['punishments'] = get_punishment_settings(group_id)
+        if 'stats' in sections:
+            dashboard['stats'] = {
+                'historical': _read_group_stats(group_id, days),
+                'current': get_group_current_stats(group_id),
+            }
+    return dashboard
+
+
+# Усі таблиці з даними конкретної групи та стовпець з її ID.
+# Спочатку налаштування (бот одразу "забуває" групу), потім великі таблиці статистики.
+GROUP_SCOPED_TABLES = (
+    ("group_settings", "group_id"),
+    ("group_admins", "group_id"),
+    ("group_spam_triggers", "group_id"),
+    ("group_whitelists", "group_id"),
+    ("punishment_settings", "group_id"),
+    ("warnings", "chat_id"),
+    ("captcha_timeouts", "chat_id"),
+    ("chat_state", "chat_id"),
+    ("daily_stats", "group_id"),
+    ("hourly_activity", "group_id"),
+    ("user_violations", "group_id"),
+    ("action_logs", "group_id"),
+)
+
+# Скільки рядків видаляється однією транзакцією під час очищення групи
+GROUP_DELETE_CHUNK_SIZE = 500
+
+
+def schedule_group_deletion(group_id: int):
+    """
+    Ставить групу в чергу на видалення всіх її даних.
+    Саме видалення виконується частинами (див. delete_group_data_chunk),
+    а запис у pending_group_deletions дозволяє продовжити його після перезапуску.
+    """
+    # Інакше відкладені записи повернуть частину даних після видалення
+    flush_pending_writes()
+    with transaction() as cursor:
+        cursor.execute(
+            "INSERT OR IGNORE INTO pending_group_deletions (group_id, table_index, rows_deleted) VALUES (?, 0, 0)",
+            (group_id,))
+    chat_config_cache.invalidate(group_id)
+    logging.info(f"Групу {group_id} поставлено в чергу на видалення даних.")
+
+
+def get_pending_group_deletions() -> list:
+    """Повертає ID груп, дані яких ще видаляються (у порядку постановки в чергу)."""
+    with read_cursor() as cursor:
+        cursor.execute("SELECT group_id FROM pending_group_deletions ORDER BY requested_at, group_id")
+        return [row['group_id'] for row in cursor.fetchall()]
+
+
+def delete_group_data_chunk(group_id: int, chunk_size: int = GROUP_DELETE_CHUNK_SIZE) -> bool:
+    """
+    Видаляє одну порцію даних групи в окремій короткій транзакції.
+    Прогрес зберігається в тій самій транзакції. Повертає True, коли видалено все.
+    Порції однієї групи можуть виконуватися паралельно (фонове завдання та повторне
+    додавання бота), тому прогрес читається вже під блокуванням запису.
+    """
+    with transaction(immediate=True) as cursor:
+        cursor.execute("SELECT table_index, rows_deleted FROM pending_group_deletions WHERE group_id = ?", (group_id,))
+        progress = cursor.fetchone()
+        if progress is None:
+            return True
+
+        table_index, rows_deleted = progress['table_index'], progress['rows_deleted']
+        table, id_column = GROUP_SCOPED_TABLES[table_index]
+        cursor.execute(
+            f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE {id_column} = ? LIMIT ?)",
+            (group_id, chunk_size))
+        rows_deleted += cursor.rowcount
+
+        table_done = cursor.rowcount < chunk_size
+        if table_done:
+            # Таблицю очищено - переходимо до наступної
+            logging.info(f"Видалення даних групи {group_id}: таблицю {table} очищено "
+                         f"({table_index + 1}/{len(GROUP_SCOPED_TABLES)}, всього рядків: {rows_deleted}).")
+            table_index += 1
+
+        if table_index >= len(GROUP_SCOPED_TABLES):
+            cursor.execute("DELETE FROM pending_group_deletions WHERE group_id = ?", (group_id,))
+            logging.info(f"Дані для групи {group_id} успішно видалено ({rows_deleted} рядків).")
+            finished = True
+        else:
+            cursor.execute(
+                "UPDATE pending_group_deletions SET table_index = ?, rows_deleted = ? WHERE group_id = ?",
+                (table_index, rows_deleted, group_id))
+            finished = False
+
+    if table_done:
+        chat_config_cache.invalidate(group_id)
+    return finished
+
+
+def delete_all_group_data(group_id: int):
+    """Видаляє всі дані, пов'язані з конкретною групою (тими ж порціями, але без пауз)."""
+    schedule_group_deletion(group_id)
+    while not delete_group_data_chunk(group_id):
+        pass
 
 
 def get_punishment_settings(group_id: int) -> dict:
     """Отримує налаштування покарань для групи."""
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("SELECT warning_level, action, duration_minutes FROM punishment_settings WHERE group_id = ?",
-                   (group_id,))
-
-    settings = {}
-    for row in cursor.fetchall():
-        settings[row['warning_level']] = {
-            "action": row['action'],
-            "duration": row['duration_minutes']
-        }
-    conn.close()
+    with read_cursor() as cursor:
+        cursor.execute("SELECT warning_level, action, duration_minutes FROM punishment_settings WHERE group_id = ?",
+                       (group_id,))
+
+        settings = {}
+        for row in cursor.fetchall():
+            settings[row['warning_level']] = {
+                "action": row['action'],
+                "duration": row['duration_minutes']
+            }
 
     # Якщо налаштувань немає, повертаємо стандартні
     if not settings:
@@ -594,11 +719,104 @@ def get_punishment_settings(group_id: int) -> dict:
 
 def set_punishment_settings(group_id: int, level: int, action: str, duration: int):
     """Встановлює налаштування покарання для групи."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute(
-        "REPLACE INTO punishment_settings (group_id, warning_level, action, duration_minutes) VALUES (?, ?, ?, ?)",
-        (group_id, level, action, duration)
+    with transaction() as cursor:
+        cursor.execute(
+            "REPLACE INTO punishment_settings (group_id, warning_level, action, duration_minutes) VALUES (?, ?, ?, ?)",
+            (group_id, level, action, duration)
+        )
+    chat_config_cache.invalidate(group_id)
+
+
+# --- Таймаути капчі ---
+
+def add_captcha_timeout(chat_id: int, user_id: int, message_id: int, lang: str, expires_at: float):
+    with transaction() as cursor:
+        cursor.execute(
+            "REPLACE INTO captcha_timeouts (chat_id, user_id, message_id, lang, expires_at) VALUES (?, ?, ?, ?, ?)",
+            (chat_id, user_id, message_id, lang, expires_at))
+
+
+def add_captcha_timeouts(rows: list):
+    """Додає таймаути пакетом: рядки (chat_id, user_id, message_id, lang, expires_at)."""
+    if not rows:
+        return
+    with transaction() as cursor:
+        cursor.executemany(
+            "REPLACE INTO captcha_timeouts (chat_id, user_id, message_id, lang, expires_at) VALUES (?, ?, ?, ?, ?)", rows)
+
+
+def set_captcha_timeout_message(chat_id: int, user_id: int, message_id: int):
+    """Запам'ятовує повідомлення капчі для вже запущеного таймауту (якщо його ще не скасовано)."""
+    with transaction() as cursor:
+        cursor.execute("UPDATE captcha_timeouts SET message_id = ? WHERE chat_id = ? AND user_id = ?",
+                       (message_id, chat_id, user_id))
+
+
+def remove_captcha_timeouts(keys: list):
+    """Видаляє таймаути за списком пар (chat_id, user_id) однією транзакцією."""
+    if not keys:
+        return
+    with transaction() as cursor:
+        cursor.executemany("DELETE FROM captcha_timeouts WHERE chat_id = ? AND user_id = ?", keys)
+
+
+def get_captcha_timeouts() -> list:
+    """Повертає всі незавершені капчі (для відновлення таймаутів після перезапуску)."""
+    with read_cursor() as cursor:
+        cursor.execute("SELECT chat_id, user_id, message_id, lang, expires_at FROM captcha_timeouts")
+        return [dict(row) for row in cursor.fetchall()]
+
+
+# --- Збережений стан чатів ---
+
+def get_chat_state(chat_id: int) -> Optional[bytes]:
+    """Повертає закодований стан чату або None."""
+    with read_cursor() as cursor:
+        cursor.execute("SELECT data FROM chat_state WHERE chat_id = ?", (chat_id,))
+        row = cursor.fetchone()
+        return bytes(row['data']) if row else None
+
+
+def save_chat_states(states: dict):
+    """
+    Зберігає стани кількох чатів однією транзакцією: {chat_id: bytes}.
+    Порожній стан (b"") видаляє рядок чату.
+    """
+    if not states:
+        return
+    now = time.time()
+    with transaction() as cursor:
+        cursor.executemany("REPLACE INTO chat_state (chat_id, data, updated_at) VALUES (?, ?, ?)",
+                           [(chat_id, data, now) for chat_id, data in states.items() if data])
+        cursor.executemany("DELETE FROM chat_state WHERE chat_id = ?",
+                           [(chat_id,) for chat_id, data in states.items() if not data])
+
+
+# --- Кешована конфігурація чату ---
+
+def get_chat_config(group_id: int) -> ChatConfig:
+    """
+    Повертає незмінний знімок конфігурації чату (налаштування, списки, адмін, покарання).
+    Знімок береться з кешу; з БД він читається лише після інвалідації.
+    """
+    config = chat_config_cache.get(group_id)
+    if config is not None:
+        return config
+
+    generation = chat_config_cache.generation
+    global_triggers = chat_config_cache.get_global_triggers()
+    if global_triggers is None:
+        global_triggers = get_spam_triggers()
+        chat_config_cache.put_global_triggers(global_triggers, generation)
+
+    config = ChatConfig.create(
+        group_id=group_id,
+        settings=get_group_settings(group_id),
+        whitelist=get_group_whitelist(group_id),
+        global_triggers=global_triggers,
+        blocklist=get_group_blocklist(group_id),
+        admin_id=get_group_admin_id(group_id),
+        punishments=get_punishment_settings(group_id),
     )
-    conn.commit()
-    conn.close()
\ No newline at end of file
+    chat_config_cache.put(config, generation)
+    return config
@@ -0,0 +1,119 @@
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from bot.config import DB_NAME
+
+# Кількість підготовлених запитів, які sqlite3 кешує на одне з'єднання
+CACHED_STATEMENTS = 256
+# Скільки мілісекунд чекати на звільнення блокування запису
+BUSY_TIMEOUT_MS = 5000
+
+_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Кожен потік отримує власне довгоживуче з'єднання.
+# Реєстр потрібен, щоб закрити всі з'єднання під час зупинки бота.
+_local = threading.local()
+_registry_lock = threading.Lock()
+_connections: list = []
+_generation = 0
+
+
+def _open_connection() -> sqlite3.Connection:
+    """Відкриває нове з'єднання з БД і застосовує налаштування продуктивності."""
+    conn = sqlite3.connect(DB_NAME, cached_statements=CACHED_STATEMENTS, check_same_thread=False)
+    for pragma in _PRAGMAS:
+        try:
+            conn.execute(pragma)
+        except sqlite3.Error as e:
+            logging.warning(f"Не вдалося застосувати '{pragma}': {e}")
+    return conn
+
+
+def get_connection() -> sqlite3.Connection:
+    """Повертає довгоживуче з'єднання поточного потоку, створюючи його за потреби."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and getattr(_local, "generation", None) == _generation:
+        return conn
+
+    conn = _open_connection()
+    with _registry_lock:
+        _connections.append(conn)
+        _local.generation = _generation
+    _local.conn = conn
+    return conn
+
+
+@contextmanager
+def read_cursor():
+    """Курсор для читання; рядки повертаються як sqlite3.Row."""
+    cursor = get_connection().cursor()
+    cursor.row_factory = sqlite3.Row
+    try:
+        yield cursor
+    finally:
+        cursor.close()
+
+
+@contextmanager
+def read_transaction():
+    """
+    Одна транзакція читання для кількох запитів: усі read_cursor() у цьому блоці
+    (у тому ж потоці) бачать один і той самий знімок БД.
+    """
+    conn = get_connection()
+    if conn.in_transaction:
+        # Уже всередині транзакції - вона і так дає узгоджений знімок
+        yield
+        return
+    conn.execute("BEGIN")
+    try:
+        yield
+    finally:
+        conn.rollback()
+
+
+@contextmanager
+def transaction(immediate: bool = False):
+    """
+    Курсор для запису: commit при успіху, rollback при помилці.
+    immediate=True бере блокування запису одразу (BEGIN IMMEDIATE), тож дані,
+    прочитані на початку транзакції, не зміняться до її завершення.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    try:
+        if immediate and not conn.in_transaction:
+            cursor.execute("BEGIN IMMEDIATE")
+        yield cursor
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def close_all_connections():
+    """Закриває всі відкриті з'єднання (викликається під час зупинки бота)."""
+    global _generation
+    with _registry_lock:
+        connections = list(_connections)
+        _connections.clear()
+        # Потоки, що ще тримають старі з'єднання, відкриють нові при наступному зверненні
+        _generation += 1
+
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.Error as e:
+            logging.warning(f"Помилка при закритті з'єднання з БД: {e}")
+    if connections:
+        logging.info(f"Закрито {len(connections)} з'єднань з БД.")
@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import threading
+from typing import Callable, Dict, FrozenSet, Optional
+
+# Як часто прирости лічильників розсилаються підписникам (не частіше одного оновлення на чат)
+LIVE_STATS_INTERVAL_SECONDS = 1.0
+# Як часто надсилати порожній коментар, щоб проксі не закривали тихе з'єднання
+LIVE_STATS_KEEPALIVE_SECONDS = 15
+
+
+class LiveStatsSubscription:
+    """Одна сесія панелі, що стежить за чатом. Прирости між читаннями складаються разом."""
+
+    def __init__(self, chat_id: int):
+        self.chat_id = chat_id
+        self._deltas: Dict[str, int] = {}
+        self._ready = asyncio.Event()
+
+    def push(self, deltas: Dict[str, int]):
+        for field, delta in deltas.items():
+            self._deltas[field] = self._deltas.get(field, 0) + delta
+        self._ready.set()
+
+    async def next_update(self, timeout: float = None) -> Optional[Dict[str, int]]:
+        """Накопичені прирости або None, якщо за timeout секунд нічого не змінилось."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self._ready.clear()
+        deltas, self._deltas = self._deltas, {}
+        return deltas
+
+
+class LiveStatsHub:
+    """
+    Живі оновлення статистики для веб-панелі.
+
+    increment_daily_stat повідомляє сюди кожен приріст лічильника (повідомлення,
+    видалення, входи, результати капчі...). Прирости накопичуються по чатах і раз на
+    LIVE_STATS_INTERVAL_SECONDS розсилаються підписаним сесіям одним оновленням на чат,
+    тож панель бачить зміни без повторних агрегатних запитів до БД.
+    Поки чат ніхто не дивиться, приріст нічого не коштує.
+
+    У процесі-обробнику (WORKER_PROCESSES > 1) підписників немає: головний процес
+    повідомляє, за якими чатами стежать панелі (set_watched), і лише їхні прирости
+    передаються туди через forwarder (див. WorkerPool).
+    """
+
+    def __init__(self, interval: float = LIVE_STATS_INTERVAL_SECONDS):
+        self.interval = interval
+        # Прирости надходять і з потоків БД, розсилка - з циклу подій
+        self._lock = threading.Lock()
+        self._pending: Dict[int, Dict[str, int]] = {}
+        self._subscriptions: Dict[int, set] = {}
+        # Чати, за якими стежать панелі головного процесу (лише в процесі-обробнику)
+        self._watched: FrozenSet[int] = frozenset()
+        self._watch_listeners = []
+        self._forwarder: Optional[Callable[[dict], None]] = None
+        self._task: Optional[asyncio.Task] = None
+        self.updates_sent = 0
+
+    def set_forwarder(self, forwarder: Optional[Callable[[dict], None]]):
+        """Замість розсилки передавати накопичене {chat_id: {поле: приріст}} у forwarder."""
+        self._forwarder = forwarder
+
+    def set_watched(self, chat_ids: FrozenSet[int]):
+        """Чати, прирости яких потрібні головному процесу."""
+        self._watched = frozenset(chat_ids)
+
+    def watched_chats(self) -> FrozenSet[int]:
+        """Чати, які зараз має відкритими хоча б одна панель."""
+        return frozenset(self._subscriptions)
+
+    def add_watch_listener(self, callback):
+        """
+        Реєструє callback(chat_ids), який викликається, коли з'являється перша
+        підписка на чат чи зникає остання. Потрібно, щоб сповіщати процеси-обробники.
+        """
+        self._watch_listeners.append(callback)
+
+    def remove_watch_listener(self, callback):
+        if callback in self._watch_listeners:
+            self._watch_listeners.remove(callback)
+
+    def _notify_watchers(self):
+        watched = self.watched_chats()
+        for callback in self._watch_listeners:
+            callback(watched)
+
+    # --- Публікація ---
+
+    def publish(self, chat_id: int, field: str, delta: int = 1):
+        if chat_id not in self._subscriptions and chat_id not in self._watched:
+            return
+        with self._lock:
+            counters = self._pending.setdefault(chat_id, {})
+            counters[field] = counters.get(field, 0) + delta
+
+    def publish_many(self, deltas: Dict[int, Dict[str, int]]):
+        """Прирости, отримані від процесу-обробника."""
+        for chat_id, counters in deltas.items():
+            for field, delta in counters.items():
+                self.publish(chat_id, field, delta)
+
+    # --- Підписки ---
+
+    def subscribe(self, chat_id: int) -> LiveStatsSubscription:
+        """Викликається з циклу подій; розсилка запускається з першою підпискою."""
+        subscription = LiveStatsSubscription(chat_id)
+        first = chat_id not in self._subscriptions
+        self._subscriptions.setdefault(chat_id, set()).add(subscription)
+        self.start()
+        if first:
+            self._notify_watchers()
+        return subscription
+
+    def unsubscribe(self, subscription: LiveStatsSubscription):
+        subscriptions = self._subscriptions.get(subscription.chat_id)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscriptions[subscription.chat_id]
+            self._notify_watchers()
+
+    # --- Розсилка ---
+
+    def flush(self) -> int:
+        """Розсилає накопичене. Повертає кількість чатів, для яких були зміни."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        if self._forwarder is not None:
+            self._forwarder(pending)
+            return len(pending)
+        for chat_id, counters in pending.items():
+            for subscription in self._subscriptions.get(chat_id, ()):
+                subscription.push(counters)
+                self.updates_sent += 1
+        return len(pending)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"Помилка розсилки живої статистики: {e}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        # Процес-обробник передає залишок перед зупинкою
+        if self._forwarder is not None:
+            self.flush()
+
+    def get_metrics(self) -> dict:
+        return {
+            'chats': len(self._subscriptions),
+            'subscriptions': sum(len(subscriptions) for subscriptions in self._subscriptions.values()),
+            'updates_sent': self.updates_sent,
+        }
+
+
+live_stats = LiveStatsHub()
@@ -1,9 +1,13 @@
 import json
+import logging
 import os
-from typing import Dict
+import string
+from functools import lru_cache
+from typing import Dict, Optional
 
-# Кеш для завантажених мов, щоб не читати файли з диска кожен раз
-_loaded_languages: Dict[str, Dict[str, str]] = {}
+# Папка з JSON-файлами перекладів
+LOCALIZATION_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_LANGUAGE = 'en'
 
 LANGUAGE_FALLBACKS = {
     'uk': ['uk', 'ru', 'en'],
@@ -13,66 +17,138 @@ LANGUAGE_FALLBACKS = {
     'de': ['en'], 'fr': ['en'], 'es': ['en'], 'pl': ['en'],
 }
 
+_formatter = string.Formatter()
+
+
+class TextTemplate:
+    """
+    Рядок перекладу, розібраний один раз під час завантаження.
+    Рядки без підстановок повертаються як є, а решта збирається з готових частин.
+    """
+    __slots__ = ('text', '_parts')
+
+    def __init__(self, text: str):
+        self.text = text
+        parts = []
+        for literal, field_name, format_spec, conversion in _formatter.parse(text):
+            if field_name is not None and (conversion or not field_name.isidentifier()):
+                # Складні підстановки ({0}, {user.name}, {x!r}) - звичайним str.format
+                parts = None
+                break
+            parts.append((literal, field_name, format_spec))
+        self._parts = parts
+
+    def render(self, values: dict) -> str:
+        if self._parts is None:
+            return self.text.format(**values)
+        result = []
+        for literal, field_name, format_spec in self._parts:
+            result.append(literal)
+            if field_name is not None:
+                value = values[field_name]
+                result.append(format(value, format_spec) if format_spec else str(value))
+        return "".join(result)
+
+
+# Файли перекладів як є (для /api/translations) та злиті каталоги з шаблонами:
+# для кожної мови одразу враховано весь ланцюжок запасних мов
+_translations: Dict[str, dict] = {}
+_catalogs: Dict[str, Dict[str, TextTemplate]] = {}
+
 
 def load_translation_file(lang_code: str) -> dict:
     """Завантажує JSON-файл перекладу для вказаної мови."""
-    # Визначаємо шлях до папки з перекладами
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    filepath = os.path.join(current_dir, f"{lang_code}.json")
+    filepath = os.path.join(LOCALIZATION_DIR, f"{lang_code}.json")
 
     if not os.path.exists(filepath):
         # Якщо файл для мови не знайдено, повертаємо англійський
-        filepath = os.path.join(current_dir, "en.json")
+        filepath = os.path.join(LOCALIZATION_DIR, f"{DEFAULT_LANGUAGE}.json")
 
     with open(filepath, 'r', encoding='utf-8') as f:
         return json.load(f)
 
 
-def get_user_language(language_code: str | None) -> str:
+def load_translations():
+    """
+    Читає всі файли перекладів і будує каталоги. Викликається при старті
+    (або при першому зверненні) та командою перезавантаження перекладів.
+    """
+    translations = {}
+    for filename in sorted(os.listdir(LOCALIZATION_DIR)):
+        if not filename.endswith(".json"):
+            continue
+        lang = filename[:-len(".json")]
+        try:
+            translations[lang] = load_translation_file(lang)
+        except Exception as e:
+            logging.error(f"Не вдалося завантажити переклад {filename}: {e}")
+
+    catalogs = {}
+    for lang in translations:
+        merged = {}
+        # Від найменш до найбільш пріоритетної мови ланцюжка
+        for fallback_lang in reversed(LANGUAGE_FALLBACKS.get(lang, [lang, DEFAULT_LANGUAGE])):
+            merged.update(translations.get(fallback_lang, {}))
+        catalogs[lang] = {key: TextTemplate(text) for key, text in merged.items() if isinstance(text, str)}
+
+    # Заміна цілими словниками - обробники, що виконуються паралельно, не побачать напівготовий стан
+    global _translations, _catalogs
+    _translations, _catalogs = translations, catalogs
+    get_user_language.cache_clear()
+    logging.info(f"Завантажено переклади: {', '.join(translations) or 'жодного'}.")
+
+
+def reload_translations() -> list:
+    """Перечитує файли перекладів. Повертає список завантажених мов."""
+    load_translations()
+    return list(_translations)
+
+
+def _ensure_loaded():
+    if not _catalogs:
+        load_translations()
+
+
+@lru_cache(maxsize=512)
+def get_user_language(language_code: Optional[str]) -> str:
     """Визначає найкращу доступну мову для користувача, безпечно обробляючи None."""
     # Якщо language_code не існує (None) або це порожній рядок, одразу повертаємо 'en'
     if not language_code:
-        return 'en'
+        return DEFAULT_LANGUAGE
 
-    # Решта коду залишається без змін
+    _ensure_loaded()
     lang = language_code.split('-')[0].lower()
-
-    # Перевіряємо, чи існує JSON-файл для такої мови
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    if os.path.exists(os.path.join(current_dir, f"{lang}.json")):
+    if lang in _catalogs:
         return lang
 
     # Шукаємо запасний варіант
-    for fallback_lang in LANGUAGE_FALLBACKS.get(lang, ['en']):
-        if os.path.exists(os.path.join(current_dir, f"{fallback_lang}.json")):
+    for fallback_lang in LANGUAGE_FALLBACKS.get(lang, [DEFAULT_LANGUAGE]):
+        if fallback_lang in _catalogs:
             return fallback_lang
-    return 'en'
+    return DEFAULT_LANGUAGE
+
+
+def get_translations(lang_code: str) -> dict:
+    """Вміст файлу перекладу мови (або англійського, якщо такого файлу немає) без звернення до диска."""
+    _ensure_loaded()
+    translations = _translations.get(lang_code)
+    if translations is None:
+        translations = _translations.get(DEFAULT_LANGUAGE, {})
+    return translations
 
 
 def get_text(lang_code: str, key: str, **kwargs) -> str:
     """Отримує локалізований текст з підтримкою fallback."""
-    target_lang = get_user_language(lang_code)
-
-    fallback_chain = LANGUAGE_FALLBACKS.get(target_lang, [target_lang, 'en'])
-
-    for lang in fallback_chain:
-        # Завантажуємо мову в кеш, якщо її там ще немає
-        if lang not in _loaded_languages:
-            try:
-                _loaded_languages[lang] = load_translation_file(lang)
-            except Exception:
-                continue
-
-        # Шукаємо ключ у завантаженій мові
-        if key in _loaded_languages.get(lang, {}):
-            text = _loaded_languages[lang][key]
-            # Форматуємо, якщо є параметри
-            if kwargs:
-                try:
-                    return text.format(**kwargs)
-                except KeyError:
-                    return text
-            return text
-
-    # Якщо ключ не знайдено ніде
-    return f"KEY_NOT_FOUND: {key}"
+    _ensure_loaded()
+    template = _catalogs.get(get_user_language(lang_code), {}).get(key)
+    if template is None:
+        # Якщо ключ не знайдено ніде
+        return f"KEY_NOT_FOUND: {key}"
+
+    # Форматуємо, якщо є параметри
+    if kwargs:
+        try:
+            return template.render(kwargs)
+        except KeyError:
+            return template.text
+    return template.text
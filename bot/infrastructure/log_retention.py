@@ -0,0 +1,209 @@
+import argparse
+import asyncio
+import datetime
+import gzip
+import json
+import logging
+import os
+import time
+from typing import NamedTuple
+
+from telegram.ext import ContextTypes
+
+from bot.config import LOG_RETENTION_DAYS, LOG_ARCHIVE_DIR
+from bot.infrastructure.async_database import run_in_db_executor
+from bot.infrastructure.db_connection import close_all_connections, read_cursor, transaction
+
+# Скільки рядків видаляється однією транзакцією (коротке блокування запису)
+PRUNE_BATCH_SIZE = 1000
+# Пауза між пакетами, щоб інші записи встигали отримати блокування
+PRUNE_PAUSE_SECONDS = 0.05
+# Як часто запускається завдання очищення
+PRUNE_INTERVAL_SECONDS = 3600
+
+_LOG_COLUMNS = ('id', 'group_id', 'user_id', 'user_name', 'action_type', 'details', 'timestamp')
+
+# Умови очищення: для групи з власним терміном - за індексом (group_id, timestamp),
+# для решти груп - глобальна межа за індексом (timestamp). Кожна вибірка містить лише
+# рядки, які справді треба видалити, тож наступний пакет просто бере наступні найстаріші
+_SELECT_GROUP_EXPIRED_SQL = f"""
+    SELECT {', '.join(_LOG_COLUMNS)} FROM action_logs
+    WHERE group_id = ? AND timestamp < ?
+    ORDER BY timestamp, id
+    LIMIT ?
+"""
+_SELECT_DEFAULT_EXPIRED_SQL = f"""
+    SELECT {', '.join(_LOG_COLUMNS)} FROM action_logs
+    WHERE timestamp < ?
+      AND group_id NOT IN (SELECT group_id FROM group_settings WHERE log_retention_days IS NOT NULL)
+    ORDER BY timestamp, id
+    LIMIT ?
+"""
+
+
+def _cutoff(days: int, now: datetime.datetime) -> str:
+    return (now - datetime.timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def get_retention_overrides() -> dict:
+    """Повертає {group_id: днів} для груп з власним терміном зберігання логів."""
+    with read_cursor() as cursor:
+        cursor.execute("SELECT group_id, log_retention_days FROM group_settings WHERE log_retention_days IS NOT NULL")
+        return {row['group_id']: row['log_retention_days'] for row in cursor.fetchall()}
+
+
+def _archive_rows(archive_dir: str, rows: list):
+    """Дописує рядки в gzip-архіви JSON Lines, по одному файлу на місяць."""
+    by_month = {}
+    for row in rows:
+        by_month.setdefault(row['timestamp'][:7], []).append(row)
+
+    os.makedirs(archive_dir, exist_ok=True)
+    for month, month_rows in by_month.items():
+        path = os.path.join(archive_dir, f"action_logs-{month}.jsonl.gz")
+        # Дописування ('at') додає новий gzip-член; gzip.open читає такі файли як один потік
+        with gzip.open(path, 'at', encoding='utf-8') as archive:
+            for row in month_rows:
+                archive.write(json.dumps(dict(row), ensure_ascii=False) + "\n")
+
+
+class _PruneTarget(NamedTuple):
+    """Одна умова очищення: запит вибірки та його параметри (без LIMIT)."""
+    sql: str
+    params: tuple
+
+
+def _plan_prune(retention_days: int, now: datetime.datetime) -> list:
+    """Умови очищення для груп з власним терміном і для решти; порожній список - очищати нічого."""
+    targets = [
+        _PruneTarget(_SELECT_GROUP_EXPIRED_SQL, (group_id, _cutoff(days, now)))
+        for group_id, days in get_retention_overrides().items() if days > 0
+    ]
+    if retention_days > 0:
+        targets.append(_PruneTarget(_SELECT_DEFAULT_EXPIRED_SQL, (_cutoff(retention_days, now),)))
+    return targets
+
+
+def _prune_batch(target: _PruneTarget, archive_dir: str, batch_size: int) -> tuple:
+    """
+    Одна коротка транзакція: видаляє до batch_size найстаріших рядків, що підпадають під умову.
+    Повертає (видалено, чи можуть лишатися ще рядки).
+    """
+    with transaction() as cursor:
+        cursor.execute(target.sql, (*target.params, batch_size))
+        rows = cursor.fetchall()
+        if rows:
+            if archive_dir:
+                _archive_rows(archive_dir, rows)
+            cursor.executemany("DELETE FROM action_logs WHERE id = ?", [(row['id'],) for row in rows])
+    return len(rows), len(rows) == batch_size
+
+
+def _prune_settings(retention_days, archive_dir, now):
+    retention_days = LOG_RETENTION_DAYS if retention_days is None else retention_days
+    archive_dir = LOG_ARCHIVE_DIR if archive_dir is None else archive_dir
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    return retention_days, archive_dir, now
+
+
+def _log_pruned(deleted: int):
+    if deleted:
+        logging.info(f"Очищення логів: видалено {deleted} записів action_logs.")
+
+
+def prune_action_logs(retention_days: int = None, archive_dir: str = None, batch_size: int = PRUNE_BATCH_SIZE,
+                      pause: float = PRUNE_PAUSE_SECONDS, now: datetime.datetime = None) -> int:
+    """
+    Видаляє з action_logs рядки, старші за термін зберігання, невеликими пакетами.
+
+    Термін береться з group_settings.log_retention_days, а для решти груп - глобальний
+    (LOG_RETENTION_DAYS). 0 означає "зберігати завжди". Якщо задано archive_dir,
+    рядки перед видаленням записуються в архів тією ж транзакцією, що й видалення.
+    Повертає кількість видалених рядків.
+
+    Синхронний варіант для скриптів; бот використовує prune_action_logs_async,
+    щоб не тримати потік БД під час пауз.
+    """
+    retention_days, archive_dir, now = _prune_settings(retention_days, archive_dir, now)
+    deleted = 0
+    for target in _plan_prune(retention_days, now):
+        has_more = True
+        while has_more:
+            batch_deleted, has_more = _prune_batch(target, archive_dir, batch_size)
+            deleted += batch_deleted
+            if has_more and pause:
+                time.sleep(pause)
+
+    _log_pruned(deleted)
+    return deleted
+
+
+async def prune_action_logs_async(retention_days: int = None, archive_dir: str = None,
+                                  batch_size: int = PRUNE_BATCH_SIZE, pause: float = PRUNE_PAUSE_SECONDS,
+                                  now: datetime.datetime = None) -> int:
+    """
+    Те саме, що prune_action_logs, але кожен пакет - окреме звернення до потоку БД,
+    а пауза між пакетами чекається в циклі подій. Потік БД звільняється між пакетами.
+    """
+    retention_days, archive_dir, now = _prune_settings(retention_days, archive_dir, now)
+    deleted = 0
+    for target in await run_in_db_executor(_plan_prune, retention_days, now):
+        has_more = True
+        while has_more:
+            batch_deleted, has_more = await run_in_db_executor(_prune_batch, target, archive_dir, batch_size)
+            deleted += batch_deleted
+            if has_more and pause:
+                await asyncio.sleep(pause)
+
+    _log_pruned(deleted)
+    return deleted
+
+
+def import_archived_logs(path: str) -> int:
+    """
+    Повертає в action_logs рядки з архіву (наприклад, для аудиту).
+    Рядки зберігають свої id, тому повторний імпорт того самого архіву нічого не дублює.
+    Зведені таблиці статистики при цьому не змінюються.
+    """
+    imported = 0
+    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+        rows = [tuple(json.loads(line)[column] for column in _LOG_COLUMNS) for line in archive if line.strip()]
+    with transaction() as cursor:
+        for start in range(0, len(rows), PRUNE_BATCH_SIZE):
+            cursor.executemany(
+                f"INSERT OR IGNORE INTO action_logs ({', '.join(_LOG_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows[start:start + PRUNE_BATCH_SIZE])
+            imported += cursor.rowcount
+    logging.info(f"Імпортовано {imported} записів з архіву {path}.")
+    return imported
+
+
+async def prune_action_logs_job(context: ContextTypes.DEFAULT_TYPE):
+    """Періодичне завдання: очищення старих логів у потоці БД."""
+    try:
+        await prune_action_logs_async()
+    except Exception as e:
+        logging.error(f"Помилка очищення старих логів: {e}")
+
+
+def main(argv: list = None):
+    """
+    Командний рядок для роботи з архівами логів:
+        python -m bot.infrastructure.log_retention import <архів.jsonl.gz> [...]
+    """
+    parser = argparse.ArgumentParser(prog="python -m bot.infrastructure.log_retention",
+                                     description="Робота з архівами action_logs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="Повернути в action_logs рядки з gzip-архівів")
+    import_parser.add_argument("paths", nargs="+", help="Файли action_logs-YYYY-MM.jsonl.gz")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO)
+    if args.command == "import":
+        total = sum(import_archived_logs(path) for path in args.paths)
+        print(f"Імпортовано записів: {total}")
+    close_all_connections()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+import asyncio
+import itertools
+import logging
+import time
+from enum import IntEnum
+
+from telegram.error import RetryAfter
+from bot.infrastructure.sharding import current_shard
+
+# Загальний ліміт Bot API - близько 30 запитів на секунду
+GLOBAL_RATE_PER_SECOND = 30
+GLOBAL_BURST = 30
+# Ліміт повідомлень в один чат (у групах - близько 20 на хвилину)
+CHAT_RATE_PER_SECOND = 20 / 60
+CHAT_BURST = 5
+# Скільки разів повторювати запит після 429 (RetryAfter)
+MAX_RETRIES = 3
+# Максимальна кількість сповіщень і логів у черзі (модерація не обмежується)
+MAX_QUEUED_NOTIFICATIONS = 2000
+# Сповіщення, що чекали довше, вже неактуальні й відкидаються
+NOTIFICATION_MAX_AGE_SECONDS = 60
+
+
+class Priority(IntEnum):
+    """Пріоритет вихідного запиту: менше значення - раніше виконується."""
+    MODERATION = 0     # видалення, бан, обмеження
+    NOTIFICATION = 1   # повідомлення в чат
+    LOG = 2            # логи власнику в особисті
+
+
+class OutboundDroppedError(Exception):
+    """Запит відкинуто: черга сповіщень переповнена або запит застарів."""
+
+
+class TokenBucket:
+    """
+    Відро токенів, яке резервує слоти наперед: reserve() завжди забирає токен
+    і повертає, скільки секунд треба зачекати, доки цей токен стане доступним.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now: float = None) -> float:
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def penalize(self, seconds: float, now: float = None):
+        """Відкладає наступні токени (після 429 від Telegram)."""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+    def is_idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _OutboundCall:
+    __slots__ = ('priority', 'method', 'args', 'kwargs', 'chat_id', 'future', 'created', 'attempts', 'chat_reserved',
+                 'timer')
+
+    def __init__(self, priority, method, args, kwargs, chat_id, future):
+        self.priority = priority
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.chat_id = chat_id
+        self.future = future
+        self.created = time.monotonic()
+        self.attempts = 0
+        self.chat_reserved = False
+        # Таймер відкладеного повернення в чергу (див. _enqueue_later)
+        self.timer = None
+
+
+class OutboundDispatcher:
+    """
+    Централізована черга викликів Bot API.
+
+    Запити виконуються в порядку пріоритету з дотриманням загального ліміту,
+    а сповіщення та логи - ще й ліміту на чат (модерація його оминає, щоб
+    під час рейду видалення та бани не чекали на повідомлення).
+    Після 429 запит повторюється через retry_after секунд.
+    """
+
+    def __init__(self, global_rate: float = GLOBAL_RATE_PER_SECOND, global_burst: float = GLOBAL_BURST,
+                 chat_rate: float = CHAT_RATE_PER_SECOND, chat_burst: float = CHAT_BURST,
+                 max_queued: int = MAX_QUEUED_NOTIFICATIONS):
+        self.loop = asyncio.get_running_loop()
+        self._queue = asyncio.PriorityQueue()
+        self._sequence = itertools.count()
+        self._global_bucket = TokenBucket(global_rate, global_burst)
+        self._chat_rate = chat_rate
+        self._chat_burst = chat_burst
+        self._chat_buckets = {}
+        self._max_queued = max_queued
+        self._queued_notifications = 0
+        self._in_flight = set()
+        self._counters = {'submitted': 0, 'sent': 0, 'failed': 0, 'retried': 0, 'dropped': 0, 'rate_limited': 0}
+        self._worker = self.loop.create_task(self._run())
+
+    # --- Постановка в чергу ---
+
+    def submit(self, priority: Priority, method, *args, rate_chat_id: int = None, **kwargs) -> asyncio.Future:
+        """
+        Ставить виклик method(*args, **kwargs) у чергу. Повертає Future з результатом виклику.
+        Чат для ліміту береться з rate_chat_id або з аргументу chat_id.
+        """
+        future = self.loop.create_future()
+        self._counters['submitted'] += 1
+
+        if priority != Priority.MODERATION and self._queued_notifications >= self._max_queued:
+            self._counters['dropped'] += 1
+            future.set_exception(OutboundDroppedError("Outbound queue is full"))
+            return future
+
+        chat_id = rate_chat_id if rate_chat_id is not None else kwargs.get('chat_id')
+        call = _OutboundCall(priority, method, args, kwargs, chat_id, future)
+        self._enqueue(call)
+        return future
+
+    def _enqueue(self, call: _OutboundCall):
+        if call.priority != Priority.MODERATION:
+            self._queued_notifications += 1
+        self._queue.put_nowait((call.priority, next(self._sequence), call))
+
+    def _enqueue_later(self, call: _OutboundCall, delay: float):
+        if call.priority != Priority.MODERATION:
+            self._queued_notifications += 1
+        call.timer = self.loop.call_later(delay, self._requeue, call)
+        self._in_flight.add(call.timer)
+        call.future.add_done_callback(lambda _: self._cancel_timer(call))
+
+    def _take_timer(self, call: _OutboundCall) -> bool:
+        """Знімає відкладений запит з обліку. False - таймер уже спрацював чи скасований."""
+        timer, call.timer = call.timer, None
+        if timer is None:
+            return False
+        self._in_flight.discard(timer)
+        if call.priority != Priority.MODERATION:
+            self._queued_notifications -= 1
+        return True
+
+    def _cancel_timer(self, call: _OutboundCall):
+        # Запит завершився (скасовано чи зупинка), поки чекав на таймер
+        timer = call.timer
+        if self._take_timer(call):
+            timer.cancel()
+
+    def _requeue(self, call: _OutboundCall):
+        self._take_timer(call)
+        if not call.future.done():
+            self._enqueue(call)
+
+    # --- Виконання ---
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > 10_000:
+                # Прибираємо повністю відновлені відра, щоб словник не ріс безмежно
+                now = time.monotonic()
+                self._chat_buckets = {key: value for key, value in self._chat_buckets.items() if not value.is_idle(now)}
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self._chat_rate, self._chat_burst)
+        return bucket
+
+    async def _run(self):
+        while True:
+            _priority, _sequence, call = await self._queue.get()
+            if call.priority != Priority.MODERATION:
+                self._queued_notifications -= 1
+            if call.future.done():
+                continue
+
+            if call.priority != Priority.MODERATION:
+                if time.monotonic() - call.created > NOTIFICATION_MAX_AGE_SECONDS:
+                    self._counters['dropped'] += 1
+                    call.future.set_exception(OutboundDroppedError("Outbound call is stale"))
+                    continue
+                if call.chat_id is not None and not call.chat_reserved:
+                    call.chat_reserved = True
+                    delay = self._chat_bucket(call.chat_id).reserve()
+                    if delay > 0:
+                        # Чат вичерпав ліміт - повертаємо запит у чергу пізніше, не блокуючи інші чати
+                        self._enqueue_later(call, delay)
+                        continue
+
+            delay = self._global_bucket.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = self.loop.create_task(self._execute(call))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _execute(self, call: _OutboundCall):
+        call.attempts += 1
+        try:
+            result = await call.method(*call.args, **call.kwargs)
+        except RetryAfter as e:
+            self._counters['rate_limited'] += 1
+            # Залежно від версії PTB retry_after - число секунд або timedelta
+            retry_after = e.retry_after
+            retry_after = retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else float(retry_after)
+            # Блокуємо відповідне відро на вказаний Telegram час
+            if call.chat_id is not None:
+                self._chat_bucket(call.chat_id).penalize(retry_after)
+            else:
+                self._global_bucket.penalize(retry_after)
+
+            if call.attempts > MAX_RETRIES:
+                self._counters['failed'] += 1
+                if not call.future.done():
+                    call.future.set_exception(e)
+                return
+            logging.warning(f"Ліміт Telegram для чату {call.chat_id}: повтор через {retry_after} с "
+                            f"(спроба {call.attempts}/{MAX_RETRIES}).")
+            self._counters['retried'] += 1
+            call.chat_reserved = True
+            self._enqueue_later(call, retry_after)
+        except Exception as e:
+            self._counters['failed'] += 1
+            if not call.future.done():
+                call.future.set_exception(e)
+        else:
+            self._counters['sent'] += 1
+            if not call.future.done():
+                call.future.set_result(result)
+
+    # --- Метрики та зупинка ---
+
+    def get_metrics(self) -> dict:
+        queued = self._queue.qsize()
+        return {
+            **self._counters,
+            'queued': queued,
+            'queued_notifications': self._queued_notifications,
+            'tracked_chats': len(self._chat_buckets),
+        }
+
+    async def shutdown(self):
+        """Зупиняє обробку черги; запити, що ще чекають, скасовуються."""
+        self._worker.cancel()
+        for item in list(self._in_flight):
+            item.cancel()
+        while not self._queue.empty():
+            _priority, _sequence, call = self._queue.get_nowait()
+            call.future.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+
+
+_dispatcher = None
+
+
+def get_outbound_dispatcher() -> OutboundDispatcher:
+    """Повертає диспетчер поточного циклу подій (створює його за потреби)."""
+    global _dispatcher
+    loop = asyncio.get_running_loop()
+    if _dispatcher is None or _dispatcher.loop is not loop:
+        # Загальний ліміт Bot API діляться порівну між процесами-обробниками
+        _dispatcher = OutboundDispatcher(global_rate=GLOBAL_RATE_PER_SECOND / current_shard.count,
+                                         global_burst=max(1, GLOBAL_BURST // current_shard.count))
+    return _dispatcher
+
+
+def dispatch(priority: Priority, method, *args, **kwargs) -> asyncio.Future:
+    """Ставить виклик Bot API у загальну чергу. Результат (або помилку) дає await повернутого Future."""
+    return get_outbound_dispatcher().submit(priority, method, *args, **kwargs)
+
+
+async def shutdown_outbound_dispatcher():
+    global _dispatcher
+    if _dispatcher is not None:
+        await _dispatcher.shutdown()
+        _dispatcher = None
@@ -0,0 +1,52 @@
+from typing import Optional
+
+# Поля оновлення, в яких Telegram передає об'єкт із чатом
+_CHAT_FIELDS = ('message', 'edited_message', 'channel_post', 'edited_channel_post',
+                'chat_member', 'my_chat_member', 'chat_join_request')
+
+
+class ShardInfo:
+    """Номер поточного процесу-обробника та загальна кількість процесів."""
+
+    def __init__(self, index: int = 0, count: int = 1):
+        self.index = index
+        self.count = count
+
+
+# У звичайному режимі (один процес) усі чати належать шарду 0
+current_shard = ShardInfo()
+
+
+def configure_shard(index: int, count: int):
+    """Викликається в процесі-обробнику до створення додатку."""
+    current_shard.index = index
+    current_shard.count = count
+
+
+def shard_for_chat(chat_id: int, count: int) -> int:
+    """Шард, якому належить чат. Залежить лише від chat_id, тому стабільний між перезапусками."""
+    return chat_id % count
+
+
+def owns_chat(chat_id: int) -> bool:
+    """Чи обробляє поточний процес цей чат."""
+    return current_shard.count <= 1 or shard_for_chat(chat_id, current_shard.count) == current_shard.index
+
+
+def is_primary_shard() -> bool:
+    """Загальні (не прив'язані до чату) періодичні завдання виконує лише шард 0."""
+    return current_shard.index == 0
+
+
+def update_chat_id(update: dict) -> Optional[int]:
+    """Витягує chat_id із сирого оновлення Telegram (dict). None - оновлення без чату."""
+    for field in _CHAT_FIELDS:
+        if field in update:
+            return update[field]['chat']['id']
+    callback_query = update.get('callback_query')
+    if callback_query:
+        message = callback_query.get('message')
+        if message:
+            return message['chat']['id']
+        return callback_query['from']['id']
+    return None
@@ -0,0 +1,128 @@
+import csv
+import datetime
+import io
+import json
+import zlib
+from typing import AsyncIterator, Optional
+
+from bot.infrastructure.async_database import run_in_db_executor
+from bot.infrastructure.db_connection import read_cursor
+from bot.infrastructure.write_buffer import flush_pending_writes
+
+# Скільки рядків читається з БД за раз: потік БД зайнятий недовго, а пам'ять не росте з розміром експорту
+EXPORT_PAGE_SIZE = 1000
+# Період за замовчуванням, якщо дати не вказано
+DEFAULT_EXPORT_DAYS = 90
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+}
+
+# Джерело -> (стовпці, заголовки CSV)
+EXPORT_SOURCES = {
+    'daily': (
+        ('date', 'messages_total', 'messages_deleted', 'users_joined', 'users_left',
+         'captcha_passed', 'captcha_failed', 'warnings_given', 'bans_given'),
+        ('Date', 'Messages', 'Deleted', 'Users Joined', 'Users Left',
+         'Captcha Passed', 'Captcha Failed', 'Warnings', 'Bans'),
+    ),
+    'logs': (
+        ('id', 'timestamp', 'user_id', 'user_name', 'action_type', 'details'),
+        ('ID', 'Time', 'User ID', 'User Name', 'Action', 'Details'),
+    ),
+}
+
+# Пагінація за ключем (а не OFFSET): кожна сторінка починається одразу після попередньої
+_DAILY_PAGE_SQL = f"""
+    SELECT {', '.join(EXPORT_SOURCES['daily'][0])} FROM daily_stats
+    WHERE group_id = ? AND date >= ? AND date <= ? AND date > ?
+    ORDER BY date
+    LIMIT ?
+"""
+_LOGS_PAGE_SQL = f"""
+    SELECT {', '.join(EXPORT_SOURCES['logs'][0])} FROM action_logs
+    WHERE group_id = ? AND timestamp >= ? AND timestamp < ? AND (timestamp, id) > (?, ?)
+    ORDER BY timestamp, id
+    LIMIT ?
+"""
+
+
+def parse_export_range(date_from: Optional[str], date_to: Optional[str],
+                       today: datetime.date = None) -> tuple:
+    """
+    Перетворює дати з запиту (YYYY-MM-DD, обидві включно) на (date_from, date_to).
+    Без дат - останні DEFAULT_EXPORT_DAYS днів. ValueError - некоректний діапазон.
+    """
+    today = today or datetime.datetime.now(datetime.timezone.utc).date()
+    end = datetime.date.fromisoformat(date_to) if date_to else today
+    start = datetime.date.fromisoformat(date_from) if date_from else end - datetime.timedelta(days=DEFAULT_EXPORT_DAYS - 1)
+    if start > end:
+        raise ValueError("date_from is after date_to")
+    return start, end
+
+
+def fetch_export_page(source: str, group_id: int, start: datetime.date, end: datetime.date,
+                      after: tuple, limit: int = EXPORT_PAGE_SIZE) -> list:
+    """Одна сторінка рядків експорту після ключа after (кортеж значень стовпців)."""
+    with read_cursor() as cursor:
+        if source == 'daily':
+            cursor.execute(_DAILY_PAGE_SQL, (group_id, start.isoformat(), end.isoformat(), *after, limit))
+        else:
+            cursor.execute(_LOGS_PAGE_SQL, (group_id, f"{start.isoformat()} 00:00:00",
+                                            f"{(end + datetime.timedelta(days=1)).isoformat()} 00:00:00",
+                                            *after, limit))
+        return [tuple(row) for row in cursor.fetchall()]
+
+
+async def iter_export_pages(source: str, group_id: int, start: datetime.date, end: datetime.date,
+                            page_size: int = EXPORT_PAGE_SIZE) -> AsyncIterator[list]:
+    """Сторінки рядків експорту. Кожна читається окремим коротким зверненням до потоку БД."""
+    # Лічильники, що ще в буфері, мають потрапити в експорт
+    await run_in_db_executor(flush_pending_writes)
+    # Ключ сторінки: дата для daily_stats, (час, id) для action_logs
+    after = ('',) if source == 'daily' else ('', 0)
+    while True:
+        rows = await run_in_db_executor(fetch_export_page, source, group_id, start, end, after, page_size)
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        last = rows[-1]
+        after = (last[0],) if source == 'daily' else (last[1], last[0])
+
+
+def _csv_text(rows: list, header: Optional[tuple] = None) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(header)
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+async def stream_export(source: str, export_format: str, group_id: int, start: datetime.date,
+                        end: datetime.date, compress: bool = False,
+                        page_size: int = EXPORT_PAGE_SIZE) -> AsyncIterator[bytes]:
+    """Байти файлу експорту (CSV чи JSON Lines, за потреби gzip) посторінково."""
+    columns, header = EXPORT_SOURCES[source]
+    # wbits=31 - формат gzip; стискач тримає лише своє вікно, а не весь файл
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    def encode(text: str) -> bytes:
+        data = text.encode('utf-8')
+        return compressor.compress(data) if compressor else data
+
+    if export_format == 'csv':
+        chunk = encode(_csv_text([], header))
+        if chunk:
+            yield chunk
+    async for rows in iter_export_pages(source, group_id, start, end, page_size):
+        if export_format == 'csv':
+            chunk = encode(_csv_text(rows))
+        else:
+            chunk = encode("".join(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n" for row in rows))
+        if chunk:
+            yield chunk
+    if compressor:
+        yield compressor.flush()
@@ -0,0 +1,78 @@
+import math
+import time
+from typing import Any, Dict, Hashable, List, Tuple
+
+# Крок колеса (секунди) і кількість слотів: один оберт покриває 512 секунд
+WHEEL_TICK_SECONDS = 1
+WHEEL_SLOTS = 512
+
+
+class TimingWheel:
+    """
+    Хешоване колесо таймерів.
+
+    Таймер потрапляє в слот за номером свого тіку, тому додавання та скасування - O(1),
+    а на кожному тіку переглядаються лише слоти, що минули з попереднього виклику.
+    Таймери, довші за один оберт, лишаються у своєму слоті до потрібного оберту.
+    """
+
+    def __init__(self, tick_seconds: float = WHEEL_TICK_SECONDS, slots: int = WHEEL_SLOTS, now: float = None):
+        self.tick_seconds = tick_seconds
+        self._slots: List[Dict[Hashable, Tuple[float, Any]]] = [{} for _ in range(slots)]
+        self._index: Dict[Hashable, int] = {}
+        # Останній оброблений тік; таймери з минулим часом ставляться на наступний
+        self._last_tick = self._tick_of(time.time() if now is None else now) - 1
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._index
+
+    def _tick_of(self, timestamp: float) -> int:
+        return math.floor(timestamp / self.tick_seconds)
+
+    def add(self, key: Hashable, expires_at: float, payload: Any = None):
+        """Додає (або переносить) таймер з ключем key."""
+        self.cancel(key)
+        tick = self._tick_of(expires_at)
+        if tick <= self._last_tick:
+            # Час уже минув - спрацює на найближчому тіку
+            tick = self._last_tick + 1
+        slot = tick % len(self._slots)
+        self._slots[slot][key] = (expires_at, payload)
+        self._index[key] = slot
+
+    def get(self, key: Hashable) -> Any:
+        """Payload таймера або None, якщо такого таймера немає."""
+        slot = self._index.get(key)
+        return None if slot is None else self._slots[slot][key][1]
+
+    def cancel(self, key: Hashable) -> bool:
+        """Скасовує таймер. Повертає True, якщо він був."""
+        slot = self._index.pop(key, None)
+        if slot is None:
+            return False
+        del self._slots[slot][key]
+        return True
+
+    def advance(self, now: float) -> List[Tuple[Hashable, Any]]:
+        """Повертає всі таймери, що спрацювали до моменту now, і видаляє їх з колеса."""
+        current = self._tick_of(now)
+        if current <= self._last_tick:
+            return []
+
+        # Якщо минуло більше за оберт, достатньо один раз переглянути кожен слот
+        first = max(self._last_tick + 1, current - len(self._slots) + 1)
+        expired = []
+        for tick in range(first, current + 1):
+            slot = self._slots[tick % len(self._slots)]
+            if not slot:
+                continue
+            for key, (expires_at, payload) in list(slot.items()):
+                if self._tick_of(expires_at) <= current:
+                    del slot[key]
+                    del self._index[key]
+                    expired.append((key, payload))
+        self._last_tick = current
+        return expired
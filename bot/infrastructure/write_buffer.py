@@ -0,0 +1,205 @@
+import datetime
+import logging
+import sqlite3
+import threading
+from collections import defaultdict
+
+from bot.infrastructure.db_connection import transaction
+
+# Як часто фоновий потік скидає буфер у БД (мілісекунди)
+FLUSH_INTERVAL_MS = 500
+# Після скількох накопичених записів буфер скидається позачергово
+FLUSH_MAX_ROWS = 500
+
+# Лічильники таблиці daily_stats, які можна збільшувати
+STAT_FIELDS = frozenset({
+    'messages_total', 'messages_deleted', 'users_joined', 'users_left',
+    'captcha_passed', 'captcha_failed', 'warnings_given', 'bans_given',
+})
+
+# Дії, з яких складаються зведені таблиці (див. setup_stats_tables)
+ACTIVITY_ACTION = 'message_sent'
+VIOLATION_ACTIONS = ('spam_detected', 'warning_given', 'user_banned')
+
+_INSERT_LOG_SQL = (
+    "INSERT INTO action_logs (group_id, user_id, user_name, action_type, details, timestamp) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+
+_UPSERT_HOURLY_ACTIVITY_SQL = (
+    "INSERT INTO hourly_activity (group_id, hour_bucket, message_count) VALUES (?, ?, ?) "
+    "ON CONFLICT (group_id, hour_bucket) DO UPDATE SET message_count = message_count + excluded.message_count"
+)
+_UPSERT_USER_VIOLATIONS_SQL = (
+    "INSERT INTO user_violations (group_id, date, user_id, user_name, violation_count) VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT (group_id, date, user_id, user_name) "
+    "DO UPDATE SET violation_count = violation_count + excluded.violation_count"
+)
+
+
+def _upsert_stats_sql(fields) -> str:
+    columns = ", ".join(fields)
+    placeholders = ", ".join("?" for _ in fields)
+    updates = ", ".join(f"{field} = {field} + excluded.{field}" for field in fields)
+    return (f"INSERT INTO daily_stats (group_id, date, {columns}) VALUES (?, ?, {placeholders}) "
+            f"ON CONFLICT (group_id, date) DO UPDATE SET {updates}")
+
+
+class StatsWriteBuffer:
+    """
+    Буфер відкладеного запису для action_logs та daily_stats.
+
+    Рядки логів накопичуються в пам'яті, а інкременти статистики агрегуються
+    за ключем (група, дата, поле). Все накопичене записується однією транзакцією
+    кожні FLUSH_INTERVAL_MS мілісекунд або після FLUSH_MAX_ROWS записів.
+    У тій самій транзакції оновлюються зведені таблиці hourly_activity та
+    user_violations, тож вони завжди узгоджені з action_logs.
+    """
+
+    def __init__(self, flush_interval_ms: int = FLUSH_INTERVAL_MS, max_rows: int = FLUSH_MAX_ROWS):
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._logs = []
+        self._increments = defaultdict(int)
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    # --- Накопичення ---
+
+    def add_log(self, group_id: int, user_id: int, user_name: str, action_type: str, details: str = None):
+        # Час фіксуємо в момент події, а не в момент запису в БД (UTC, як CURRENT_TIMESTAMP)
+        timestamp = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock:
+            self._logs.append((group_id, user_id, user_name, action_type, details, timestamp))
+            pending = len(self._logs) + len(self._increments)
+        self._on_added(pending)
+
+    def add_increment(self, group_id: int, stat_field: str, increment: int = 1):
+        if stat_field not in STAT_FIELDS:
+            raise ValueError(f"Unknown daily stat field: {stat_field}")
+        today = datetime.date.today().isoformat()
+        with self._lock:
+            self._increments[(group_id, today, stat_field)] += increment
+            pending = len(self._logs) + len(self._increments)
+        self._on_added(pending)
+
+    def _on_added(self, pending: int):
+        if pending < self.max_rows:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            self._wakeup.set()
+        else:
+            # Без фонового потоку (скрипти, тести) скидаємо буфер одразу
+            self.flush()
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._logs) + len(self._increments)
+
+    def clear(self):
+        """Відкидає все накопичене без запису в БД."""
+        with self._lock:
+            self._logs = []
+            self._increments = defaultdict(int)
+
+    # --- Запис ---
+
+    def flush(self) -> int:
+        """Записує все накопичене однією транзакцією. Повертає кількість записів."""
+        with self._flush_lock:
+            with self._lock:
+                logs, self._logs = self._logs, []
+                increments, self._increments = self._increments, defaultdict(int)
+            if not logs and not increments:
+                return 0
+
+            stats = defaultdict(dict)
+            for (group_id, date, field), value in increments.items():
+                stats[(group_id, date)][field] = value
+
+            try:
+                with transaction() as cursor:
+                    self._write(cursor, logs, stats)
+            except (sqlite3.Error, ValueError, TypeError) as e:
+                logging.error(f"Не вдалося записати пакет статистики ({len(logs)} логів): {e}. "
+                              f"Повторюю по одному запису.")
+                self._write_one_by_one(logs, stats)
+            return len(logs) + len(increments)
+
+    @staticmethod
+    def _write(cursor, logs, stats):
+        if logs:
+            cursor.executemany(_INSERT_LOG_SQL, logs)
+            hourly, violations = _rollup_logs(logs)
+            if hourly:
+                cursor.executemany(_UPSERT_HOURLY_ACTIVITY_SQL, [(*key, count) for key, count in hourly.items()])
+            if violations:
+                cursor.executemany(_UPSERT_USER_VIOLATIONS_SQL, [(*key, count) for key, count in violations.items()])
+        for (group_id, date), fields in stats.items():
+            names = sorted(fields)
+            cursor.execute(_upsert_stats_sql(names), (group_id, date, *(fields[name] for name in names)))
+
+    def _write_one_by_one(self, logs, stats):
+        for row in logs:
+            self._write_isolated(lambda cursor: self._write(cursor, [row], {}), f"лог {row[3]} для групи {row[0]}")
+        for key, fields in stats.items():
+            self._write_isolated(lambda cursor: self._write(cursor, [], {key: fields}), f"статистику {key}")
+
+    @staticmethod
+    def _write_isolated(write, description: str):
+        try:
+            with transaction() as cursor:
+                write(cursor)
+        except (sqlite3.Error, ValueError, TypeError) as e:
+            logging.error(f"Пропущено {description}: {e}")
+
+    # --- Фоновий потік ---
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="stats-write-buffer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Зупиняє фоновий потік і примусово скидає залишок буфера."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"Помилка фонового запису статистики: {e}")
+
+
+def _rollup_logs(logs):
+    """Агрегує рядки логів у лічильники зведених таблиць (по годинах та по порушниках за день)."""
+    hourly = defaultdict(int)
+    violations = defaultdict(int)
+    for group_id, user_id, user_name, action_type, _details, timestamp in logs:
+        if action_type == ACTIVITY_ACTION:
+            # 'YYYY-MM-DD HH' - година в UTC, як і сам timestamp
+            hourly[(group_id, timestamp[:13])] += 1
+        elif action_type in VIOLATION_ACTIONS:
+            violations[(group_id, timestamp[:10], user_id, user_name)] += 1
+    return hourly, violations
+
+
+stats_buffer = StatsWriteBuffer()
+
+
+def flush_pending_writes() -> int:
+    """Примусово записує накопичені логи та статистику в БД."""
+    return stats_buffer.flush()
@@ -1,11 +1,32 @@
 import asyncio
 import logging
-from telegram import Update
-from bot.core.application import create_application
-from bot.core.dispatcher import register_handlers
+from bot.core.application import create_application, shutdown_resources
+from bot.core.dispatcher import register_handlers, get_allowed_updates
+from bot.core.worker_pool import start_worker_pool, stop_worker_pool
 from bot.infrastructure.database import setup_database
+from bot.infrastructure.localization import load_translations
+from bot.infrastructure.write_buffer import stats_buffer
 from bot.web_backend.main import run_server
-from bot.config import ADMIN_ID
+from bot.web_backend.webhook import get_webhook_secret
+from bot.config import ADMIN_ID, BOT_MODE, WEBHOOK_URL, WEBHOOK_PATH, WORKER_PROCESSES
+
+
+async def start_webhook(app) -> bool:
+    """Реєструє вебхук у Telegram. Повертає False, якщо це неможливо (тоді працюємо полінгом)."""
+    if not WEBHOOK_URL:
+        logging.error("BOT_MODE=webhook, але WEBHOOK_URL (або WEB_APP_URL) не задано. Переходжу на полінг.")
+        return False
+    try:
+        await app.bot.set_webhook(
+            url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=get_webhook_secret(),
+            allowed_updates=get_allowed_updates(app)
+        )
+    except Exception as e:
+        logging.error(f"Не вдалося зареєструвати вебхук: {e}. Переходжу на полінг.")
+        return False
+    logging.info(f"🔗 Вебхук зареєстровано: {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}")
+    return True
 
 
 async def main():
@@ -16,8 +37,11 @@ async def main():
     )
 
     setup_database()
+    load_translations()
+    stats_buffer.start()
 
     app = create_application()
+    # У режимі кількох процесів обробники тут не запускаються, але визначають allowed_updates
     register_handlers(app)
 
     logging.info("🚀 Запуск бота та веб-сервера...")
@@ -28,19 +52,34 @@ async def main():
     # app.initialize() на початку та app.shutdown() в кінці.
     try:
         async with app:
-            # Запускаємо полінг у фоні
-            await app.start()
-            await app.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+            if WORKER_PROCESSES > 1:
+                # Цей процес лише приймає оновлення і передає їх процесам-обробникам
+                start_worker_pool(WORKER_PROCESSES, app.update_queue)
+            else:
+                await app.start()
+
+            if BOT_MODE == "webhook" and await start_webhook(app):
+                # Оновлення надходять на ендпоінт веб-сервера і потрапляють у чергу app
+                await run_server(app)
+            else:
+                # Запускаємо полінг у фоні (він сам видаляє вебхук, якщо той був)
+                await app.updater.start_polling(allowed_updates=get_allowed_updates(app))
+
+                # Запускаємо веб-сервер
+                # Він буде працювати, доки ми не зупинимо програму
+                await run_server()
 
-            # Запускаємо веб-сервер
-            # Він буде працювати, доки ми не зупинимо програму
-            await run_server()
+                await app.updater.stop()
 
             # Коректно зупиняємо бота при завершенні run_server (малоймовірно)
-            await app.updater.stop()
-            await app.stop()
+            if WORKER_PROCESSES <= 1:
+                await app.stop()
     except Exception as e:
         logging.critical(f"Критична помилка під час роботи програми: {e}")
+    finally:
+        # Процеси-обробники скидають свої буфери та з'єднання самі
+        stop_worker_pool()
+        await shutdown_resources()
 
 
 if __name__ == "__main__":
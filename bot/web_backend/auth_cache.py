@@ -0,0 +1,111 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from bot.infrastructure.chat_config_cache import chat_config_cache
+
+# Скільки секунд довіряти результату перевірки. Зміни адмінів у процесах-обробниках
+# (див. WORKER_PROCESSES) доходять сюди через WorkerPool; термін - запасна межа.
+AUTH_CACHE_TTL_SECONDS = 60
+AUTH_CACHE_MAX_HEADERS = 10_000
+AUTH_CACHE_MAX_CHATS = 10_000
+
+
+class AuthorizationCache:
+    """
+    Короткочасний кеш перевірок доступу до веб-панелі.
+
+    Зберігає user_id для хешу заголовка X-User-Data (щоб не розкодовувати його
+    на кожному запиті) та відомих адмінів і не-адмінів кожного чату.
+    Записи чату скидаються разом із кешем конфігурації чату - тобто після
+    set_group_admin чи видалення даних групи.
+    """
+
+    def __init__(self, ttl: float = AUTH_CACHE_TTL_SECONDS, max_headers: int = AUTH_CACHE_MAX_HEADERS,
+                 max_chats: int = AUTH_CACHE_MAX_CHATS):
+        self.ttl = ttl
+        self.max_headers = max_headers
+        self.max_chats = max_chats
+        # Інвалідація надходить з потоків БД, читання - з циклу подій
+        self._lock = threading.Lock()
+        self._headers = OrderedDict()  # sha256(заголовка) -> (user_id, час закінчення)
+        self._chats = OrderedDict()    # chat_id -> {user_id: (є адміном, час закінчення)}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    @staticmethod
+    def _digest(user_data_raw: str) -> bytes:
+        return hashlib.sha256(user_data_raw.encode()).digest()
+
+    def get_user_id(self, user_data_raw: str, now: float = None) -> Optional[int]:
+        now = time.time() if now is None else now
+        key = self._digest(user_data_raw)
+        with self._lock:
+            entry = self._headers.get(key)
+            if entry is None or entry[1] <= now:
+                self.misses += 1
+                return None
+            self._headers.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put_user_id(self, user_data_raw: str, user_id: int, now: float = None):
+        now = time.time() if now is None else now
+        key = self._digest(user_data_raw)
+        with self._lock:
+            self._headers[key] = (user_id, now + self.ttl)
+            self._headers.move_to_end(key)
+            while len(self._headers) > self.max_headers:
+                self._headers.popitem(last=False)
+
+    def is_admin(self, chat_id: int, user_id: int, now: float = None) -> Optional[bool]:
+        """Збережений результат перевірки або None, якщо його немає чи він застарів."""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._chats.get(chat_id, {}).get(user_id)
+            if entry is None or entry[1] <= now:
+                self.misses += 1
+                return None
+            self._chats.move_to_end(chat_id)
+            self.hits += 1
+            return entry[0]
+
+    def put_admin(self, chat_id: int, user_id: int, is_admin: bool, generation: int, now: float = None):
+        """Зберігає результат, якщо з початку перевірки не було інвалідації."""
+        now = time.time() if now is None else now
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._chats.setdefault(chat_id, {})[user_id] = (is_admin, now + self.ttl)
+            self._chats.move_to_end(chat_id)
+            while len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+
+    def invalidate(self, chat_id: Optional[int]):
+        """Скидає записи чату (chat_id=None - усіх чатів)."""
+        with self._lock:
+            self._generation += 1
+            if chat_id is None:
+                self._chats.clear()
+            else:
+                self._chats.pop(chat_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._headers.clear()
+            self._chats.clear()
+
+    def get_metrics(self) -> dict:
+        return {'headers': len(self._headers), 'chats': len(self._chats), 'hits': self.hits, 'misses': self.misses}
+
+
+auth_cache = AuthorizationCache()
+chat_config_cache.add_invalidation_listener(auth_cache.invalidate)
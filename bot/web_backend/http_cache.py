@@ -0,0 +1,107 @@
+import hashlib
+import json
+import threading
+import time
+from typing import Optional
+from fastapi import Request
+from fastapi.responses import Response
+
+from bot.infrastructure.chat_config_cache import chat_config_cache
+
+# Відповіді, які кешуються до явної інвалідації, все одно перечитуються
+# не рідше за цей термін (запасна межа, якщо інвалідація не дійде)
+RESPONSE_CACHE_TTL_SECONDS = 60
+
+
+def make_etag(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Чи збігається заголовок If-None-Match з ETag (враховуються слабкі ETag та '*')."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class CachedBody:
+    """Серіалізована JSON-відповідь та її ETag."""
+    __slots__ = ('body', 'etag', 'source', 'expires_at')
+
+    def __init__(self, body: bytes, source, expires_at: float):
+        self.body = body
+        self.etag = make_etag(body)
+        self.source = source
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """
+    Кеш готових JSON-відповідей для даних, що змінюються рідко
+    (переклади, глобальний список спам-слів, глобальні налаштування).
+
+    Запис дійсний, доки не мине TTL і не зміниться джерело: для перекладів це
+    сам словник каталогу (перезавантаження замінює його новим), для даних з БД -
+    інвалідація кешу конфігурації чатів.
+    """
+
+    def __init__(self, ttl: float = RESPONSE_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, source=None, now: float = None) -> Optional[CachedBody]:
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= now or entry.source is not source:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def put(self, key, content, source=None, generation: int = None, now: float = None) -> CachedBody:
+        """
+        Серіалізує відповідь. Вона не потрапить у кеш, якщо з моменту читання
+        даних (generation) була інвалідація.
+        """
+        now = time.time() if now is None else now
+        body = json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        entry = CachedBody(body, source, now + self.ttl)
+        with self._lock:
+            if generation is None or generation == self._generation:
+                self._entries[key] = entry
+        return entry
+
+    def invalidate(self, group_id: Optional[int] = None):
+        """Глобальні дані змінюються лише разом з invalidate_all (group_id=None)."""
+        if group_id is None:
+            with self._lock:
+                self._generation += 1
+                self._entries.clear()
+
+    def get_metrics(self) -> dict:
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+response_cache = ResponseCache()
+chat_config_cache.add_invalidation_listener(response_cache.invalidate)
+
+
+def cached_json_response(request: Request, entry: CachedBody, private: bool = False) -> Response:
+    """Відповідь з ETag; якщо клієнт уже має цю версію - порожня 304."""
+    headers = {"ETag": entry.etag, "Cache-Control": "private, no-cache" if private else "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type="application/json", headers=headers)
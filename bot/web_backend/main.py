@@ -1,11 +1,24 @@
 import uvicorn
 import os # <-- Додали імпорт
-from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from telegram.ext import Application
+from bot.infrastructure.async_database import DatabaseBusyError
 from .routes import router
+from .webhook import create_webhook_router
+from .static_assets import StaticAssets
 
-def create_web_app() -> FastAPI:
-    """Створює та конфігурує екземпляр FastAPI."""
+
+async def database_busy_handler(request: Request, exc: DatabaseBusyError):
+    """Повертає 503, коли черга запитів до БД переповнена."""
+    return JSONResponse(status_code=503, content={"detail": "Database is busy, try again later"})
+
+
+def create_web_app(telegram_app: Application = None) -> FastAPI:
+    """
+    Створює та конфігурує екземпляр FastAPI.
+    Якщо передано telegram_app, додається ендпоінт вебхука для прийому оновлень.
+    """
     app = FastAPI(
         title="Telegram Bot Web Backend",
         description="API for the bot's Web App admin panel.",
@@ -13,6 +26,10 @@ def create_web_app() -> FastAPI:
     )
 
     app.include_router(router)
+    if telegram_app is not None:
+        # Має бути зареєстрований до статики, яка займає весь "/"
+        app.include_router(create_webhook_router(telegram_app))
+    app.add_exception_handler(DatabaseBusyError, database_busy_handler)
 
     # --- ОНОВЛЕНА ЧАСТИНА ---
     # Будуємо абсолютний шлях до папки webapp
@@ -28,7 +45,8 @@ def create_web_app() -> FastAPI:
         # Створюємо шлях до папки webapp
         webapp_path = os.path.join(project_root, "webapp")
 
-        app.mount("/", StaticFiles(directory=webapp_path, html=True), name="webapp")
+        # Файли читаються й стискаються один раз, тут же, під час старту
+        app.mount("/", StaticAssets(webapp_path), name="webapp")
     except Exception as e:
         print(f"ПОМИЛКА: Не вдалося знайти папку 'webapp'. Переконайтеся, що структура проєкту правильна. {e}")
         print(f"Очікуваний шлях: {webapp_path}")
@@ -36,9 +54,9 @@ def create_web_app() -> FastAPI:
 
     return app
 
-async def run_server():
+async def run_server(telegram_app: Application = None):
     """Асинхронна функція для запуску веб-сервера."""
-    app = create_web_app()
+    app = create_web_app(telegram_app)
     config = uvicorn.Config(app, host="0.0.0.0", port=8000, log_level="info")
     server = uvicorn.Server(config)
     await server.serve()
\ No newline at end of file
@@ -1,21 +1,28 @@
 import json
 import logging
 import base64
-from fastapi import APIRouter, HTTPException, Body, Header
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Body, Header, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Dict, Any, List
 
 # Імпортуємо всі необхідні функції з інших модулів
-from bot.infrastructure.localization import load_translation_file
-from bot.infrastructure.database import (
+from bot.infrastructure.localization import get_translations as get_translation_catalog
+from bot.infrastructure.async_database import (
     get_global_settings, set_global_setting,
     get_group_settings, set_group_setting,
     get_spam_triggers, add_spam_trigger, delete_spam_trigger,
     is_group_admin, get_user_chats,
     get_group_blocklist, add_group_spam_trigger, delete_group_spam_trigger,
-    get_group_whitelist, add_group_whitelist_word, delete_group_whitelist_word
+    get_group_whitelist, add_group_whitelist_word, delete_group_whitelist_word,
+    get_db_executor
 )
+from bot.infrastructure.outbound_dispatcher import get_outbound_dispatcher
+from bot.core.worker_pool import get_worker_pool
+from .auth_cache import auth_cache
+from .http_cache import response_cache, cached_json_response
+from bot.features.message_filtering.antiflood_service import get_flood_stats
+from bot.features.message_filtering.delete_message_job import deletion_scheduler
 from bot.config import ADMIN_ID
 
 router = APIRouter()
@@ -41,6 +48,10 @@ def get_user_id_from_header(user_data_raw: str) -> int:
     """Витягує user_id з хедеру X-User-Data, розкодовуючи його з Base64."""
     if not user_data_raw:
         raise HTTPException(status_code=401, detail="Not authorized: Missing user data header")
+    # Панель надсилає той самий заголовок у кожному запиті - розкодовуємо його лише раз
+    user_id = auth_cache.get_user_id(user_data_raw)
+    if user_id is not None:
+        return user_id
     try:
         # 1. Розкодовуємо рядок з Base64
         decoded_bytes = base64.b64decode(user_data_raw)
@@ -48,15 +59,22 @@ def get_user_id_from_header(user_data_raw: str) -> int:
         user_info_json = decoded_bytes.decode('utf-8')
         # 3. Парсимо JSON
         user_info = json.loads(user_info_json)
-        return user_info['id']
+        user_id = user_info['id']
     except (json.JSONDecodeError, KeyError, Exception) as e:
          logging.error(f"Could not decode user data: {e}")
          raise HTTPException(status_code=400, detail="Invalid user data format")
+    auth_cache.put_user_id(user_data_raw, user_id)
+    return user_id
 
 async def verify_user_access(user_data_raw: str, chat_id: int) -> int:
     """Перевіряє, чи має користувач право керувати конкретним чатом."""
     user_id = get_user_id_from_header(user_data_raw)
-    if not is_group_admin(user_id, chat_id):
+    is_admin = auth_cache.is_admin(chat_id, user_id)
+    if is_admin is None:
+        generation = auth_cache.generation
+        is_admin = await is_group_admin(user_id, chat_id)
+        auth_cache.put_admin(chat_id, user_id, is_admin, generation)
+    if not is_admin:
         raise HTTPException(status_code=403, detail="Forbidden: You are not an admin of this chat")
     return user_id
 
@@ -70,14 +88,53 @@ async def verify_global_admin(user_data_raw: str) -> int:
 # --- API Роути ---
 
 @router.get("/api/translations/{lang_code}")
-async def get_translations(lang_code: str):
-    """Віддає файл перекладу у форматі JSON."""
+async def get_translations(lang_code: str, request: Request):
+    """Віддає файл перекладу у форматі JSON (з каталогів у пам'яті, серіалізований один раз)."""
     try:
-        return JSONResponse(content=load_translation_file(lang_code))
+        translations = get_translation_catalog(lang_code)
+        key = ('translations', lang_code)
+        entry = response_cache.get(key, source=translations) or response_cache.put(key, translations, source=translations)
+        return cached_json_response(request, entry)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Could not load translations: {e}")
 
 
+@router.get("/api/metrics/database")
+async def get_database_metrics(x_user_data: str = Header(None)):
+    """Повертає метрики черги запитів до БД (тільки для адміна)."""
+    await verify_global_admin(x_user_data)
+    return get_db_executor().get_metrics()
+
+
+@router.get("/api/metrics/antiflood")
+async def get_antiflood_metrics(x_user_data: str = Header(None)):
+    """Повертає кількість користувачів у трекерах флуду (тільки для адміна)."""
+    await verify_global_admin(x_user_data)
+    return get_flood_stats()
+
+
+@router.get("/api/metrics/outbound")
+async def get_outbound_metrics(x_user_data: str = Header(None)):
+    """Повертає лічильники черги вихідних запитів до Telegram (тільки для адміна)."""
+    await verify_global_admin(x_user_data)
+    return get_outbound_dispatcher().get_metrics()
+
+
+@router.get("/api/metrics/deletions")
+async def get_deletion_metrics(x_user_data: str = Header(None)):
+    """Повертає лічильники пакетного видалення повідомлень (тільки для адміна)."""
+    await verify_global_admin(x_user_data)
+    return deletion_scheduler.get_metrics()
+
+
+@router.get("/api/metrics/workers")
+async def get_worker_metrics(x_user_data: str = Header(None)):
+    """Повертає стан процесів-обробників (тільки для адміна). Порожньо в режимі одного процесу."""
+    await verify_global_admin(x_user_data)
+    pool = get_worker_pool()
+    return pool.get_metrics() if pool is not None else {'workers': []}
+
+
 @router.get("/api/my-chats", response_model=List[Chat])
 async def get_my_chats(x_user_data: str = Header(None)):
     """Повертає список чатів, якими керує користувач."""
@@ -85,7 +142,7 @@ async def get_my_chats(x_user_data: str = Header(None)):
     user_id = get_user_id_from_header(x_user_data)
 
     # Викликаємо виправлену функцію з бази даних для отримання чатів
-    chats = get_user_chats(user_id)
+    chats = await get_user_chats(user_id)
 
     # Повертаємо результат
     return chats
@@ -94,10 +151,14 @@ async def get_my_chats(x_user_data: str = Header(None)):
 # --- Роути для Налаштувань ---
 
 @router.get("/api/settings/global")
-async def get_default_settings(x_user_data: str = Header(None)):
+async def get_default_settings(request: Request, x_user_data: str = Header(None)):
     """Отримує глобальні налаштування за замовчуванням."""
     await verify_global_admin(x_user_data)
-    return get_global_settings()
+    entry = response_cache.get('global_settings')
+    if entry is None:
+        generation = response_cache.generation
+        entry = response_cache.put('global_settings', await get_global_settings(), generation=generation)
+    return cached_json_response(request, entry, private=True)
 
 @router.post("/api/settings/global")
 async def update_default_setting(update: SettingUpdate, x_user_data: str = Header(None)):
@@ -106,44 +167,52 @@ async def update_default_setting(update: SettingUpdate, x_user_data: str = Heade
     allowed_keys = ["captcha_enabled", "spam_filter_enabled", "spam_threshold"]
     if update.key not in allowed_keys:
         raise HTTPException(status_code=400, detail="Invalid global setting key")
-    set_global_setting(update.key, update.value)
+    await set_global_setting(update.key, update.value)
     return {"status": "success"}
 
 @router.get("/api/settings/{chat_id}")
 async def get_chat_settings(chat_id: int, x_user_data: str = Header(None)):
     """Отримує налаштування для конкретної групи."""
     await verify_user_access(x_user_data, chat_id)
-    return get_group_settings(chat_id)
+    return await get_group_settings(chat_id)
 
 @router.post("/api/settings/{chat_id}")
 async def update_chat_setting(chat_id: int, update: SettingUpdate, x_user_data: str = Header(None)):
     """Оновлює налаштування для конкретної групи."""
     await verify_user_access(x_user_data, chat_id)
-    allowed_keys = ["captcha_enabled", "spam_filter_enabled", "spam_threshold", "use_global_list", "use_custom_list", "antiflood_enabled", "antiflood_sensitivity"]
+    allowed_keys = ["captcha_enabled", "spam_filter_enabled", "spam_threshold", "use_global_list", "use_custom_list", "antiflood_enabled", "antiflood_sensitivity", "log_retention_days"]
     if update.key not in allowed_keys:
         raise HTTPException(status_code=400, detail="Invalid group setting key")
-    set_group_setting(chat_id, update.key, update.value)
+    if update.key == "log_retention_days" and update.value is not None:
+        # null - глобальний термін, інакше кількість днів (0 - зберігати завжди)
+        if isinstance(update.value, bool) or not isinstance(update.value, int) or not 0 <= update.value <= 3650:
+            raise HTTPException(status_code=400, detail="Invalid log retention period")
+    await set_group_setting(chat_id, update.key, update.value)
     return {"status": "success"}
 
 # --- Роути для Спам-слів (глобальні) ---
 
 @router.get("/api/spam-words")
-async def get_all_spam_words():
+async def get_all_spam_words(request: Request):
     """Повертає глобальний список спам-слів."""
-    return get_spam_triggers()
+    entry = response_cache.get('spam_words')
+    if entry is None:
+        generation = response_cache.generation
+        entry = response_cache.put('spam_words', await get_spam_triggers(), generation=generation)
+    return cached_json_response(request, entry)
 
 @router.post("/api/spam-words")
 async def add_new_spam_word(item: SpamTrigger, x_user_data: str = Header(None)):
     """Додає нове слово до глобального списку (тільки для адміна)."""
     await verify_global_admin(x_user_data)
-    add_spam_trigger(item.trigger, item.score)
+    await add_spam_trigger(item.trigger, item.score)
     return {"status": "success"}
 
 @router.delete("/api/spam-words")
 async def delete_existing_spam_word(item: SpamTriggerDelete = Body(...), x_user_data: str = Header(None)):
     """Видаляє слово з глобального списку (тільки для адміна)."""
     await verify_global_admin(x_user_data)
-    delete_spam_trigger(item.trigger)
+    await delete_spam_trigger(item.trigger)
     return {"status": "success"}
 
 
@@ -151,49 +220,70 @@ async def delete_existing_spam_word(item: SpamTriggerDelete = Body(...), x_user_
 async def get_group_spam_words(chat_id: int, x_user_data: str = Header(None)):
     """Повертає локальний список спам-слів для групи."""
     await verify_user_access(x_user_data, chat_id)
-    from bot.infrastructure.database import get_group_blocklist
-    return get_group_blocklist(chat_id)
+    from bot.infrastructure.async_database import get_group_blocklist
+    return await get_group_blocklist(chat_id)
 
 @router.post("/api/spam-words/{chat_id}")
 async def add_group_spam_word(chat_id: int, item: SpamTrigger, x_user_data: str = Header(None)):
     """Додає слово до локального списку групи."""
     await verify_user_access(x_user_data, chat_id)
-    from bot.infrastructure.database import add_group_spam_trigger
-    add_group_spam_trigger(chat_id, item.trigger, item.score)
+    from bot.infrastructure.async_database import add_group_spam_trigger
+    await add_group_spam_trigger(chat_id, item.trigger, item.score)
     return {"status": "success"}
 
 @router.delete("/api/spam-words/{chat_id}")
 async def delete_group_spam_word(chat_id: int, item: SpamTriggerDelete = Body(...), x_user_data: str = Header(None)):
     """Видаляє слово з локального списку групи."""
     await verify_user_access(x_user_data, chat_id)
-    from bot.infrastructure.database import delete_group_spam_trigger
-    delete_group_spam_trigger(chat_id, item.trigger)
+    from bot.infrastructure.async_database import delete_group_spam_trigger
+    await delete_group_spam_trigger(chat_id, item.trigger)
     return {"status": "success"}
 
 @router.get("/api/whitelist/{chat_id}")
 async def get_group_whitelist(chat_id: int, x_user_data: str = Header(None)):
     """Повертає білий список для групи."""
     await verify_user_access(x_user_data, chat_id)
-    from bot.infrastructure.database import get_group_whitelist
-    return get_group_whitelist(chat_id)
+    from bot.infrastructure.async_database import get_group_whitelist
+    return await get_group_whitelist(chat_id)
 
 @router.post("/api/whitelist/{chat_id}")
 async def add_whitelist_word(chat_id: int, word: str = Body(..., embed=True), x_user_data: str = Header(None)):
     """Додає слово до білого списку групи."""
     await verify_user_access(x_user_data, chat_id)
-    from bot.infrastructure.database import add_group_whitelist_word
-    add_group_whitelist_word(chat_id, word)
+    from bot.infrastructure.async_database import add_group_whitelist_word
+    await add_group_whitelist_word(chat_id, word)
     return {"status": "success"}
 
 
+@router.get("/api/chat/{chat_id}/dashboard")
+async def get_chat_dashboard_data(chat_id: int, fields: str = None, days: int = 30, x_user_data: str = Header(None)):
+    """
+    Усе для сторінки групи одним запитом: налаштування, списки, покарання, статистика.
+    fields - розділи через кому (за замовчуванням усі).
+    """
+    await verify_user_access(x_user_data, chat_id)
+    from bot.infrastructure.async_database import get_chat_dashboard
+    from bot.infrastructure.database import DASHBOARD_SECTIONS
+
+    if fields:
+        sections = tuple(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+        unknown = [section for section in sections if section not in DASHBOARD_SECTIONS]
+        if unknown or not sections:
+            raise HTTPException(status_code=400, detail=f"Unknown dashboard fields: {', '.join(unknown)}")
+    else:
+        sections = DASHBOARD_SECTIONS
+
+    return await get_chat_dashboard(chat_id, sections, days)
+
+
 @router.get("/api/stats/{chat_id}")
 async def get_chat_statistics(chat_id: int, days: int = 30, x_user_data: str = Header(None)):
     """Отримує статистику для конкретної групи."""
     await verify_user_access(x_user_data, chat_id)
-    from bot.infrastructure.database import get_group_stats, get_group_current_stats
+    from bot.infrastructure.async_database import get_group_stats, get_group_current_stats
 
-    historical_stats = get_group_stats(chat_id, days)
-    current_stats = get_group_current_stats(chat_id)
+    historical_stats = await get_group_stats(chat_id, days)
+    current_stats = await get_group_current_stats(chat_id)
 
     return {
         'historical': historical_stats,
@@ -201,39 +291,66 @@ async def get_chat_statistics(chat_id: int, days: int = 30, x_user_data: str = H
     }
 
 
-@router.get("/api/stats/{chat_id}/export")
-async def export_chat_statistics(chat_id: int, format: str = "json", x_user_data: str = Header(None)):
-    """Експортує статистику групи в різних форматах."""
+@router.get("/api/stats/{chat_id}/live")
+async def stream_live_statistics(chat_id: int, request: Request, x_user_data: str = Header(None)):
+    """
+    Живі прирости лічильників групи (Server-Sent Events): подія 'stats' з
+    {"chat_id", "deltas": {поле daily_stats: приріст}} не частіше разу на секунду.
+    """
     await verify_user_access(x_user_data, chat_id)
-    from bot.infrastructure.database import get_group_stats
-    import csv
-    import io
+    from bot.infrastructure.live_stats import live_stats, LIVE_STATS_KEEPALIVE_SECONDS
+
+    async def events():
+        subscription = live_stats.subscribe(chat_id)
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                deltas = await subscription.next_update(LIVE_STATS_KEEPALIVE_SECONDS)
+                if deltas is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: stats\ndata: {json.dumps({'chat_id': chat_id, 'deltas': deltas})}\n\n"
+        finally:
+            live_stats.unsubscribe(subscription)
 
-    stats = get_group_stats(chat_id, 90)  # 3 місяці даних
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
-    if format == "csv":
-        output = io.StringIO()
-        writer = csv.writer(output)
 
-        # Записуємо заголовки
-        writer.writerow(['Date', 'Messages', 'Deleted', 'Users Joined', 'Users Left'])
+@router.get("/api/stats/{chat_id}/export")
+async def export_chat_statistics(chat_id: int, format: str = "json", source: str = "daily",
+                                 date_from: str = None, date_to: str = None, days: int = 90,
+                                 compress: bool = False, x_user_data: str = Header(None)):
+    """
+    Експортує статистику групи.
+    format=json - зведення за days днів; csv / jsonl - файл з рядками daily_stats (source=daily)
+    або action_logs (source=logs) за період date_from..date_to, за потреби стиснутий gzip (compress=true).
+    """
+    await verify_user_access(x_user_data, chat_id)
+    from bot.infrastructure.stats_export import EXPORT_FORMATS, EXPORT_SOURCES, parse_export_range, stream_export
 
-        # Записуємо дані
-        for day in stats['daily']:
-            writer.writerow([
-                day['date'],
-                day['messages_total'],
-                day['messages_deleted'],
-                day['users_joined'],
-                day['users_left']
-            ])
+    if format == "json":
+        from bot.infrastructure.async_database import get_group_stats
+        return await get_group_stats(chat_id, days)
 
-        return JSONResponse(
-            content={'csv': output.getvalue()},
-            headers={'Content-Type': 'text/csv'}
-        )
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Invalid export format")
+    if source not in EXPORT_SOURCES:
+        raise HTTPException(status_code=400, detail="Invalid export source")
+    try:
+        start, end = parse_export_range(date_from, date_to)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date range")
 
-    return stats
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"stats_{chat_id}_{source}_{start.isoformat()}_{end.isoformat()}.{extension}"
+    if compress:
+        media_type, filename = "application/gzip", filename + ".gz"
+    return StreamingResponse(
+        stream_export(source, format, chat_id, start, end, compress=compress),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 
 class PunishmentRule(BaseModel):
@@ -246,8 +363,8 @@ class PunishmentRule(BaseModel):
 async def get_punishment_rules(chat_id: int, x_user_data: str = Header(None)):
     """Отримує налаштування гнучких покарань для групи."""
     await verify_user_access(x_user_data, chat_id)
-    from bot.infrastructure.database import get_punishment_settings
-    return get_punishment_settings(chat_id)
+    from bot.infrastructure.async_database import get_punishment_settings
+    return await get_punishment_settings(chat_id)
 
 
 @router.post("/api/punishments/{chat_id}")
@@ -260,6 +377,6 @@ async def set_punishment_rule(chat_id: int, rule: PunishmentRule, x_user_data: s
     if rule.action not in ["mute", "ban"]:
         raise HTTPException(status_code=400, detail="Invalid action type")
 
-    from bot.infrastructure.database import set_punishment_settings
-    set_punishment_settings(chat_id, rule.level, rule.action, rule.duration)
+    from bot.infrastructure.async_database import set_punishment_settings
+    await set_punishment_settings(chat_id, rule.level, rule.action, rule.duration)
     return {"status": "success"}
@@ -0,0 +1,192 @@
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import posixpath
+import re
+from typing import Dict, Optional, Tuple
+from starlette.responses import PlainTextResponse, Response
+from starlette.types import Receive, Scope, Send
+
+from .http_cache import etag_matches
+
+try:
+    import brotli
+except ImportError:  # brotli необов'язковий: без нього віддається лише gzip
+    brotli = None
+
+INDEX_FILE = "index.html"
+# Файли з хешем вмісту в імені ніколи не змінюються - браузер може кешувати їх назавжди
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# HTML та звернення за старими іменами щоразу перевіряються за ETag
+REVALIDATE_CACHE_CONTROL = "no-cache"
+# Менші файли не стискаються - заголовки важать більше за виграш
+MIN_COMPRESS_SIZE = 512
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+HASH_LENGTH = 10
+
+# Локальні посилання в HTML: src="js/app.js", href="css/style.css"
+_REFERENCE_RE = re.compile(r'(?P<attr>\b(?:src|href)=")(?P<path>[^"#?:]+)(?P<end>")')
+
+
+class StaticAsset:
+    """Один файл веб-додатку: вміст у всіх кодуваннях, тип та ETag."""
+    __slots__ = ('media_type', 'digest', 'variants')
+
+    def __init__(self, content: bytes, media_type: str):
+        self.media_type = media_type
+        self.digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+        self.variants: Dict[str, bytes] = {"identity": content}
+        if len(content) >= MIN_COMPRESS_SIZE and media_type.startswith(COMPRESSIBLE_TYPES):
+            compressed = gzip.compress(content, compresslevel=9, mtime=0)
+            if len(compressed) < len(content):
+                self.variants["gzip"] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(content)
+                if len(compressed) < len(content):
+                    self.variants["br"] = compressed
+
+    def etag(self, encoding: str) -> str:
+        return f'"{self.digest}"' if encoding == "identity" else f'"{self.digest}-{encoding}"'
+
+
+def _hashed_name(path: str, digest: str) -> str:
+    """js/app.js -> js/app.<хеш>.js"""
+    root, ext = posixpath.splitext(path)
+    return f"{root}.{digest}{ext}"
+
+
+def _choose_encoding(accept_encoding: str, available) -> str:
+    accepted = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip().lower())
+    for encoding in ("br", "gzip"):
+        if encoding in available and (encoding in accepted or "*" in accepted):
+            return encoding
+    return "identity"
+
+
+class StaticAssets:
+    """
+    ASGI-додаток для статики веб-панелі (замість StaticFiles).
+
+    Усі файли читаються один раз під час створення: для кожного заздалегідь
+    готуються стиснуті версії (gzip, brotli - якщо встановлено) та ім'я з хешем
+    вмісту. Посилання в HTML переписуються на ці імена, тож CSS, JS і картинки
+    кешуються назавжди, а оновлення одразу підхоплюється через новий index.html.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        # URL-шлях -> (файл, Cache-Control)
+        self._routes: Dict[str, Tuple[StaticAsset, str]] = {}
+        self._build()
+
+    def _build(self):
+        files = {}
+        for root, dirs, filenames in os.walk(self.directory):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            for filename in filenames:
+                if filename.startswith("."):
+                    continue
+                full_path = os.path.join(root, filename)
+                path = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+                with open(full_path, "rb") as f:
+                    files[path] = f.read()
+
+        hashed_names = {}
+        for path, content in files.items():
+            if path.endswith(".html"):
+                continue
+            asset = StaticAsset(content, self._media_type(path))
+            hashed_path = _hashed_name(path, asset.digest)
+            hashed_names[path] = hashed_path
+            self._routes[hashed_path] = (asset, IMMUTABLE_CACHE_CONTROL)
+            # Старе ім'я лишається доступним (закладки, кешований HTML), але без довгого кешу
+            self._routes[path] = (asset, REVALIDATE_CACHE_CONTROL)
+
+        for path, content in files.items():
+            if not path.endswith(".html"):
+                continue
+            html = self._rewrite_references(path, content.decode("utf-8"), hashed_names)
+            self._routes[path] = (StaticAsset(html.encode("utf-8"), "text/html; charset=utf-8"),
+                                  REVALIDATE_CACHE_CONTROL)
+
+        compressed = sum(1 for asset, _ in self._routes.values() if len(asset.variants) > 1)
+        logging.info(f"Підготовлено статику веб-додатку: {len(files)} файлів, стиснуто {compressed} "
+                     f"(brotli {'увімкнено' if brotli is not None else 'недоступний'}).")
+
+    @staticmethod
+    def _media_type(path: str) -> str:
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if media_type.startswith("text/") or media_type == "application/javascript":
+            media_type += "; charset=utf-8"
+        return media_type
+
+    @staticmethod
+    def _rewrite_references(html_path: str, html: str, hashed_names: Dict[str, str]) -> str:
+        base_dir = posixpath.dirname(html_path)
+
+        def replace(match):
+            reference = match.group("path")
+            target = posixpath.normpath(posixpath.join(base_dir, reference.lstrip("/")))
+            hashed_path = hashed_names.get(target)
+            if hashed_path is None:
+                return match.group(0)
+            new_reference = posixpath.relpath(hashed_path, base_dir or ".")
+            if reference.startswith("/"):
+                new_reference = "/" + hashed_path
+            return f"{match.group('attr')}{new_reference}{match.group('end')}"
+
+        return _REFERENCE_RE.sub(replace, html)
+
+    def url_for(self, path: str) -> Optional[str]:
+        """Ім'я з хешем для файлу (потрібно тестам і шаблонам). None - файлу немає."""
+        asset_route = self._routes.get(path)
+        if asset_route is None:
+            return None
+        return _hashed_name(path, asset_route[0].digest)
+
+    def lookup(self, path: str) -> Optional[Tuple[StaticAsset, str]]:
+        path = path.lstrip("/")
+        if path == "" or path.endswith("/"):
+            path += INDEX_FILE
+        return self._routes.get(path)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        path = scope["path"]
+        root_path = scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+
+        if scope["method"] not in ("GET", "HEAD"):
+            response = PlainTextResponse("Method Not Allowed", status_code=405, headers={"Allow": "GET, HEAD"})
+            await response(scope, receive, send)
+            return
+
+        asset_route = self.lookup(path)
+        if asset_route is None:
+            await PlainTextResponse("Not Found", status_code=404)(scope, receive, send)
+            return
+        asset, cache_control = asset_route
+
+        request_headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        encoding = _choose_encoding(request_headers.get("accept-encoding", ""), asset.variants)
+        etag = asset.etag(encoding)
+        headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+
+        if etag_matches(request_headers.get("if-none-match"), etag):
+            await Response(status_code=304, headers=headers)(scope, receive, send)
+            return
+
+        body = asset.variants[encoding]
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        if scope["method"] == "HEAD":
+            headers["Content-Length"] = str(len(body))
+            body = b""
+        await Response(body, media_type=asset.media_type, headers=headers)(scope, receive, send)
@@ -0,0 +1,42 @@
+import hashlib
+import hmac
+import json
+import logging
+from fastapi import APIRouter, HTTPException, Header, Request, Response
+from telegram import Update
+from telegram.ext import Application
+from bot.config import BOT_TOKEN, WEBHOOK_PATH, WEBHOOK_SECRET
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def get_webhook_secret() -> str:
+    """Секрет вебхука: з WEBHOOK_SECRET, інакше похідний від токена бота."""
+    if WEBHOOK_SECRET:
+        return WEBHOOK_SECRET
+    return hashlib.sha256(b"wartovyi-webhook:" + (BOT_TOKEN or "").encode()).hexdigest()
+
+
+def create_webhook_router(application: Application, secret: str = None) -> APIRouter:
+    """
+    Створює ендпоінт, який приймає оновлення від Telegram і кладе їх у чергу
+    оновлень PTB. Обробка відбувається так само, як при полінгу, тому відповідь
+    Telegram повертається одразу, не чекаючи на обробники.
+    """
+    secret = secret or get_webhook_secret()
+    router = APIRouter()
+
+    @router.post(WEBHOOK_PATH, include_in_schema=False)
+    async def telegram_webhook(request: Request,
+                               secret_token: str = Header(None, alias=SECRET_HEADER)):
+        if not secret_token or not hmac.compare_digest(secret_token, secret):
+            raise HTTPException(status_code=403, detail="Invalid secret token")
+        try:
+            update = Update.de_json(await request.json(), application.bot)
+        except (json.JSONDecodeError, TypeError, ValueError, KeyError) as e:
+            logging.warning(f"Вебхук: некоректне оновлення від Telegram: {e}")
+            raise HTTPException(status_code=400, detail="Invalid update")
+        await application.update_queue.put(update)
+        return Response(status_code=200)
+
+    return router
@@ -32,7 +32,7 @@ def test_db(monkeypatch):
     щоб запобігти її закриттю всередині функцій, що тестуються.
     """
     # 1. Створюємо справжнє з'єднання в пам'яті
-    real_conn = sqlite3.connect(":memory:")
+    real_conn = sqlite3.connect(":memory:", check_same_thread=False)
 
     # 2. Створюємо екземпляр нашої безпечної обгортки
     mock_conn_wrapper = MockConnection(real_conn)
@@ -40,6 +40,14 @@ def test_db(monkeypatch):
     # 3. Підміняємо sqlite3.connect так, щоб він завжди повертав нашу обгортку
     monkeypatch.setattr(sqlite3, "connect", lambda *args, **kwargs: mock_conn_wrapper)
 
+    # Скидаємо довгоживучі з'єднання, що лишилися від попередніх тестів
+    from bot.infrastructure.db_connection import close_all_connections
+    from bot.infrastructure.write_buffer import stats_buffer
+    from bot.infrastructure.chat_config_cache import chat_config_cache
+    close_all_connections()
+    stats_buffer.clear()
+    chat_config_cache.invalidate_all()
+
     # 4. Налаштовуємо схему бази даних.
     #    Тепер setup_database отримає нашу обгортку і буде працювати з нею.
     from bot.infrastructure.database import setup_database
@@ -49,6 +57,8 @@ def test_db(monkeypatch):
     yield real_conn
 
     # 6. Після завершення тесту закриваємо справжнє з'єднання
+    stats_buffer.clear()
+    close_all_connections()
     real_conn.close()
 
 
@@ -58,6 +68,12 @@ def api_client():
     """Створює клієнт для тестування FastAPI ендпоінтів."""
     from fastapi.testclient import TestClient
     from bot.web_backend.main import create_web_app
+    from bot.web_backend.auth_cache import auth_cache
+    from bot.web_backend.http_cache import response_cache
+
+    # Результати перевірок доступу з попередніх тестів не мають впливати на наступні
+    auth_cache.clear()
+    response_cache.invalidate()
 
     # Використовуємо patch, щоб ізолювати API-тести від бази даних
     with patch('bot.web_backend.routes.get_user_chats'), \
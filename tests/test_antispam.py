@@ -1,40 +1,35 @@
 import pytest
-from unittest.mock import patch
 from bot.features.message_filtering.antispam_service import calculate_spam_score
+from bot.infrastructure.chat_config_cache import ChatConfig
 
 
 @pytest.mark.asyncio
-@patch('bot.features.message_filtering.antispam_service.get_group_settings')
-@patch('bot.features.message_filtering.antispam_service.get_group_whitelist')
-@patch('bot.features.message_filtering.antispam_service.get_spam_triggers')
-@patch('bot.features.message_filtering.antispam_service.get_group_blocklist')
-async def test_spam_score_calculation(
-        mock_get_group_blocklist,
-        mock_get_spam_triggers,
-        mock_get_group_whitelist,
-        mock_get_group_settings
-):
+async def test_spam_score_calculation():
     """
     Тест для перевірки логіки підрахунку спам-балів.
     """
-    # Arrange: Налаштовуємо моки - що мають повертати наші імітовані функції
-    chat_id = -1001
-    mock_get_group_settings.return_value = {
-        'spam_threshold': 10, 'captcha_enabled': True, 'spam_filter_enabled': True,
-        'use_global_list': True, 'use_custom_list': True
-    }
-    mock_get_group_whitelist.return_value = ["білеслово"]
-    mock_get_spam_triggers.return_value = {"глобальний": 5, "спам": 8}
-    mock_get_group_blocklist.return_value = {"локальний": 10}
+    # Arrange: Готуємо знімок конфігурації чату з потрібними списками
+    config = ChatConfig.create(
+        group_id=-1001,
+        settings={
+            'spam_threshold': 10, 'captcha_enabled': True, 'spam_filter_enabled': True,
+            'use_global_list': True, 'use_custom_list': True
+        },
+        whitelist=["білеслово"],
+        global_triggers={"глобальний": 5, "спам": 8},
+        blocklist={"локальний": 10},
+        admin_id=None,
+        punishments={},
+    )
 
     # --- Test Case 1: Whitelisted word ---
-    score, triggers = calculate_spam_score("Привіт, це білеслово.", chat_id)
+    score, triggers = calculate_spam_score("Привіт, це білеслово.", config)
     assert score == 0
     assert "whitelist" in triggers[0]
 
     # --- Test Case 2: Global and local triggers ---
     message = "Це глобальний і локальний спам."
-    score, triggers = calculate_spam_score(message, chat_id)
+    score, triggers = calculate_spam_score(message, config)
     # Очікуємо 5 (глобальний) + 10 (локальний) + 8 (спам)
     assert score == 5 + 10 + 8
     assert len(triggers) == 3
@@ -42,10 +37,97 @@ async def test_spam_score_calculation(
     # --- Test Case 3: CAPS Lock and links ---
     # Повідомлення, яке точно пройде перевірку (більше 80% великих літер)
     message = "КУПЛЮ ГАРАЖ СРОЧНО T.ME/LINK"
-    score, triggers = calculate_spam_score(message, chat_id)
+    score, triggers = calculate_spam_score(message, config)
 
     # Очікуємо 5 (КАПС) + 3 (посилання)
     assert score == 8
     # Додамо більш точні перевірки, щоб бачити, які тригери спрацювали
     assert "КАПС (+5)" in triggers
-    assert "посилання x1 (+3)" in triggers
\ No newline at end of file
+    assert "посилання x1 (+3)" in triggers
+
+def test_trigger_matcher_matches_naive_search():
+    """
+    Тест перевіряє, що автомат пошуку дає ті самі бали та той самий
+    порядок спрацьованих слів, що й поштучна перевірка `trigger in text`.
+    """
+    global_triggers = {"пиши в лс": 8, "в лс": 5, "лс": 1, "заработок": 4, "p2p": 7, "Крипта": 6}
+    blocklist = {"в лс": 9, "арбітраж": 8}
+    config = ChatConfig.create(
+        group_id=-1001,
+        settings={'use_global_list': True, 'use_custom_list': True},
+        whitelist=["Адмін"],
+        global_triggers=global_triggers,
+        blocklist=blocklist,
+        admin_id=None,
+        punishments={},
+    )
+
+    def naive(text: str):
+        text_lower = text.lower()
+        for word in config.whitelist:
+            if word.lower() in text_lower:
+                return 0, [f"'{word}' (whitelist)"]
+        words = [f"'{t}' ({s})" for t, s in config.triggers.items() if t.lower() in text_lower]
+        return sum(s for t, s in config.triggers.items() if t.lower() in text_lower), words
+
+    messages = [
+        "Пиши в ЛС, є заработок на P2P і крипта",
+        "арбітражарбітраж влс в лс",
+        "звичайне повідомлення",
+        "Напиши адміну в лс",
+        "",
+    ]
+    for message in messages:
+        score, triggers = calculate_spam_score(message, config)
+        expected_score, expected_triggers = naive(message)
+        assert score == expected_score
+        assert triggers[:len(expected_triggers)] == expected_triggers
+
+
+def test_extract_message_features_counts():
+    """Тест перевіряє підрахунок ознак повідомлення, зокрема КАПСу з кирилицею та емодзі."""
+    from bot.features.message_filtering.antispam_service import extract_message_features
+
+    for message in ["ЇЖАК ҐАНОК Є ІДЕЯ t.me/x @a @b @c", "🔥 ЗНИЖКИ 🔥 www.shop.ua", "Ǆ title-case і ß", ""]:
+        features = extract_message_features(message)
+        assert features.length == len(message)
+        assert features.uppercase_count == sum(1 for c in message if c.isupper())
+
+    features = extract_message_features("Пиши @one @two @three https://a.b http://c.d")
+    assert features.url_count == 2
+    assert features.mention_count == 3
+
+
+def test_flood_tracker_detects_flood_and_evicts_idle_users():
+    """Тест перевіряє виявлення флуду та прибирання неактивних користувачів із трекера."""
+    from bot.features.message_filtering import antiflood_service
+    from bot.features.message_filtering.antiflood_service import FloodTracker, FLOOD_TIME_WINDOW
+
+    tracker = FloodTracker(chat_id=-1001)
+    # 3 повідомлення за вікно при чутливості 3 - ще не флуд, четверте - флуд
+    assert [tracker.hit(1, 3, 100.0 + i * 0.1) for i in range(4)] == [False, False, False, True]
+    # Після спрацювання історія очищується
+    assert tracker.hit(1, 3, 100.5) is False
+
+    # Повідомлення поза вікном не враховуються
+    assert [tracker.hit(2, 2, 100.0 + i * FLOOD_TIME_WINDOW) for i in range(5)] == [False] * 5
+
+    # Неактивні користувачі прибираються, коли пише хтось інший
+    tracker.hit(3, 3, 1000.0)
+    assert len(tracker) == 1
+    assert antiflood_service.get_flood_stats()['per_chat']['-1001'] == 1
+
+
+def test_flood_tracker_respects_global_limit(monkeypatch):
+    """Тест перевіряє, що загальна кількість відстежуваних користувачів обмежена."""
+    from bot.features.message_filtering import antiflood_service
+    from bot.features.message_filtering.antiflood_service import FloodTracker
+
+    monkeypatch.setattr(antiflood_service, 'MAX_TRACKED_USERS', antiflood_service._tracked_total + 10)
+    tracker = FloodTracker(chat_id=-1002)
+    for user_id in range(100):
+        tracker.hit(user_id, 5, 200.0)
+
+    assert len(tracker) == 10
+    # Залишаються найактивніші (останні) користувачі
+    assert tracker.hit(99, 1, 200.1) is True
@@ -48,4 +48,158 @@ def test_update_chat_setting_unauthorized(api_client):
 
         # Assert
         assert response.status_code == 403  # Forbidden
-        assert "not an admin" in response.json()['detail']
\ No newline at end of file
+        assert "not an admin" in response.json()['detail']
+
+def test_webhook_verifies_secret_and_queues_update():
+    """
+    Тест перевіряє, що вебхук приймає лише запити з правильним секретом
+    і передає оновлення в чергу PTB.
+    """
+    from fastapi.testclient import TestClient
+    from unittest.mock import AsyncMock, MagicMock
+    from telegram import Bot, Update
+    from bot.web_backend.main import create_web_app
+    from bot.web_backend.webhook import get_webhook_secret, SECRET_HEADER
+    from bot.config import WEBHOOK_PATH
+
+    telegram_app = MagicMock()
+    telegram_app.bot = Bot("123456:TEST")
+    telegram_app.update_queue.put = AsyncMock()
+    client = TestClient(create_web_app(telegram_app))
+    update = {"update_id": 1, "callback_query": {
+        "id": "1", "chat_instance": "1", "data": "captcha:x",
+        "from": {"id": 54321, "is_bot": False, "first_name": "Test"}
+    }}
+
+    assert client.post(WEBHOOK_PATH, json=update).status_code == 403
+    assert client.post(WEBHOOK_PATH, json=update, headers={SECRET_HEADER: "wrong"}).status_code == 403
+    telegram_app.update_queue.put.assert_not_called()
+
+    response = client.post(WEBHOOK_PATH, json=update, headers={SECRET_HEADER: get_webhook_secret()})
+    assert response.status_code == 200
+    queued = telegram_app.update_queue.put.call_args.args[0]
+    assert isinstance(queued, Update) and queued.callback_query.data == "captcha:x"
+
+
+def test_allowed_updates_match_registered_handlers():
+    """Тест перевіряє, що бот підписується лише на типи оновлень, які обробляє."""
+    from unittest.mock import AsyncMock, MagicMock, PropertyMock
+    from telegram import Update
+    from telegram.ext import Application
+    from bot.core.dispatcher import register_handlers, get_allowed_updates
+
+    app = Application.builder().token("123456:TEST").build()
+    # Періодичні завдання тут не потрібні
+    with patch.object(Application, 'job_queue', new_callable=PropertyMock, return_value=MagicMock()):
+        register_handlers(app)
+    allowed = get_allowed_updates(app)
+
+    # Редаговані повідомлення не обробляються, тож і не запитуються
+    assert set(allowed) == {Update.MESSAGE, Update.CALLBACK_QUERY, Update.CHAT_MEMBER, Update.MY_CHAT_MEMBER}
+
+    # Фільтр, що пропускає редагування, додає EDITED_MESSAGE
+    from telegram.ext import MessageHandler, filters
+    app.add_handler(MessageHandler(filters.TEXT, AsyncMock()), group=1)
+    assert Update.EDITED_MESSAGE in get_allowed_updates(app)
+
+
+@pytest.mark.asyncio
+async def test_admin_checks_are_cached_until_admin_changes():
+    """
+    Тест перевіряє, що повторні запити панелі не розкодовують заголовок і не ходять у БД,
+    а зміна адміна групи скидає кеш.
+    """
+    import base64
+    from fastapi import HTTPException
+    from bot.web_backend.routes import verify_user_access
+    from bot.web_backend.auth_cache import auth_cache
+    from bot.infrastructure.chat_config_cache import chat_config_cache
+
+    auth_cache.clear()
+    header = base64.b64encode(json.dumps({"id": 12345}).encode()).decode()
+
+    with patch('bot.web_backend.routes.is_group_admin', return_value=True) as mock_is_admin, \
+            patch('bot.web_backend.routes.base64.b64decode', wraps=base64.b64decode) as mock_decode:
+        for _ in range(5):
+            assert await verify_user_access(header, -1001) == 12345
+        assert mock_is_admin.await_count == 1
+        assert mock_decode.call_count == 1
+
+        # Інший чат перевіряється окремо, але заголовок уже розкодовано
+        await verify_user_access(header, -1002)
+        assert mock_is_admin.await_count == 2
+        assert mock_decode.call_count == 1
+
+    # set_group_admin та видалення даних групи скидають кеш конфігурації чату, а з ним і кеш доступу
+    chat_config_cache.invalidate(-1001)
+    with patch('bot.web_backend.routes.is_group_admin', return_value=False) as mock_is_admin:
+        with pytest.raises(HTTPException) as error:
+            await verify_user_access(header, -1001)
+        assert error.value.status_code == 403
+        # Відмова теж кешується
+        with pytest.raises(HTTPException):
+            await verify_user_access(header, -1001)
+        assert mock_is_admin.await_count == 1
+        # Доступ до чату -1002 лишився в кеші
+        assert await verify_user_access(header, -1002) == 12345
+
+
+def test_static_assets_are_hashed_precompressed_and_revalidated(api_client):
+    """
+    Тест перевіряє, що index.html посилається на файли з хешем вмісту в імені,
+    ці файли віддаються стиснутими з довгим кешем, а повторний запит з ETag дає 304.
+    """
+    import gzip
+    import os
+    import re
+
+    index = api_client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert index.status_code == 200
+    assert index.headers["cache-control"] == "no-cache"
+    script = re.search(r'src="(js/app\.[0-9a-f]+\.js)"', index.text).group(1)
+    assert re.search(r'href="css/style\.[0-9a-f]+\.css"', index.text)
+
+    raw = api_client.get(f"/{script}", headers={"Accept-Encoding": "gzip, br;q=0"})
+    assert raw.headers["content-encoding"] == "gzip"
+    assert "immutable" in raw.headers["cache-control"]
+    assert raw.headers["vary"] == "Accept-Encoding"
+    # Клієнт розпаковує сам; порівнюємо з файлом на диску
+    with open(os.path.join(os.path.dirname(__file__), "..", "webapp", "js", "app.js"), "rb") as f:
+        assert raw.content == f.read()
+    assert int(raw.headers["content-length"]) == len(gzip.compress(raw.content, compresslevel=9, mtime=0))
+
+    not_modified = api_client.get(f"/{script}", headers={"Accept-Encoding": "gzip",
+                                                          "If-None-Match": raw.headers["etag"]})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+
+    assert api_client.get("/js/app.js").headers["cache-control"] == "no-cache"
+    assert api_client.get("/missing.js").status_code == 404
+
+
+def test_rarely_changing_api_responses_support_etag(api_client):
+    """
+    Тест перевіряє ETag/304 для перекладів та глобального списку спам-слів
+    і те, що зміна списку дає нову версію відповіді.
+    """
+    from bot.infrastructure.chat_config_cache import chat_config_cache
+
+    translations = api_client.get("/api/translations/uk")
+    assert translations.status_code == 200
+    etag = translations.headers["etag"]
+    assert api_client.get("/api/translations/uk", headers={"If-None-Match": etag}).status_code == 304
+    assert api_client.get("/api/translations/en", headers={"If-None-Match": etag}).status_code == 200
+
+    with patch('bot.web_backend.routes.get_spam_triggers', return_value={"казино": 20}) as mock_triggers:
+        first = api_client.get("/api/spam-words")
+        assert first.json() == {"казино": 20}
+        assert api_client.get("/api/spam-words", headers={"If-None-Match": first.headers["etag"]}).status_code == 304
+        assert mock_triggers.await_count == 1
+
+        # add_spam_trigger / delete_spam_trigger викликають invalidate_all
+        mock_triggers.return_value = {"казино": 20, "ставки": 15}
+        chat_config_cache.invalidate_all()
+        second = api_client.get("/api/spam-words", headers={"If-None-Match": first.headers["etag"]})
+        assert second.status_code == 200
+        assert second.headers["etag"] != first.headers["etag"]
+        assert mock_triggers.await_count == 2
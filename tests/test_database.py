@@ -44,4 +44,574 @@ def test_add_group_and_get_chats(test_db):
     user_chats = get_user_chats(user_id)
     assert len(user_chats) == 1
     assert user_chats[0]['id'] == group_id
-    assert user_chats[0]['name'] == group_name
\ No newline at end of file
+    assert user_chats[0]['name'] == group_name
+
+def test_connection_reused_and_transaction_rolls_back(test_db):
+    """
+    Тест перевіряє, що з'єднання потоку перевикористовується,
+    а транзакція відкочується при помилці.
+    """
+    from bot.infrastructure.db_connection import get_connection, transaction
+
+    # Assert: повторний виклик повертає те саме з'єднання
+    assert get_connection() is get_connection()
+
+    # Act: транзакція, що завершилась помилкою, не повинна залишити змін
+    with pytest.raises(RuntimeError):
+        with transaction() as cursor:
+            cursor.execute("REPLACE INTO spam_triggers (trigger, score) VALUES (?, ?)", ("відкат", 5))
+            raise RuntimeError("boom")
+
+    # Assert
+    assert "відкат" not in get_spam_triggers()
+
+
+@pytest.mark.asyncio
+async def test_db_executor_bounds_queue_and_reports_metrics():
+    """
+    Тест перевіряє, що пул потоків БД відхиляє запити понад ліміт черги
+    і рахує метрики очікування.
+    """
+    import asyncio
+    import threading
+    from bot.infrastructure.async_database import DatabaseExecutor, DatabaseBusyError
+
+    # Arrange: один потік і черга з одного місця
+    executor = DatabaseExecutor(max_workers=1, max_pending=1)
+    release = threading.Event()
+    blocked = asyncio.ensure_future(executor.run(release.wait, 5))
+    await asyncio.sleep(0)
+
+    # Act & Assert: другий запит не вміщується в чергу
+    with pytest.raises(DatabaseBusyError):
+        await executor.run(lambda: None)
+
+    release.set()
+    assert await blocked is True
+
+    metrics = executor.get_metrics()
+    assert metrics['rejected'] == 1
+    assert metrics['completed'] == 1
+    assert metrics['pending'] == 0
+    executor.shutdown()
+
+
+def test_buffered_stats_are_flushed_before_stats_query(test_db):
+    """
+    Тест перевіряє, що відкладені логи та лічильники агрегуються в буфері
+    і потрапляють у статистику під час запиту.
+    """
+    from bot.infrastructure.database import log_action, increment_daily_stat, get_group_stats
+    from bot.infrastructure.write_buffer import stats_buffer
+
+    # Arrange
+    group_id = -100777
+
+    # Act: три інкременти одного поля агрегуються в один запис буфера
+    for _ in range(3):
+        increment_daily_stat(group_id, 'messages_total')
+    increment_daily_stat(group_id, 'messages_deleted', 2)
+    log_action(group_id, 42, "Спамер", 'spam_detected', 'Score: 15')
+    assert stats_buffer.pending_count() == 3
+
+    stats = get_group_stats(group_id, 30)
+
+    # Assert
+    assert stats_buffer.pending_count() == 0
+    assert stats['totals']['total_messages'] == 3
+    assert stats['totals']['total_deleted'] == 2
+    assert stats['top_violators'][0]['user_id'] == 42
+
+
+def test_rollup_tables_match_raw_logs(test_db):
+    """
+    Тест перевіряє, що зведені таблиці заповнюються з наявних логів при міграції
+    і далі оновлюються разом із записом нових логів.
+    """
+    from bot.infrastructure.database import log_action, get_group_stats, setup_stats_tables
+    from bot.infrastructure.db_connection import transaction
+
+    group_id = -100888
+    # Arrange: "старі" логи, записані до появи зведених таблиць
+    with transaction() as cursor:
+        cursor.execute("DROP TABLE hourly_activity")
+        cursor.execute("DROP TABLE user_violations")
+        cursor.executemany(
+            "INSERT INTO action_logs (group_id, user_id, user_name, action_type, timestamp) "
+            "VALUES (?, ?, ?, ?, datetime('now', '-1 hours'))",
+            [(group_id, 1, "Перший", 'spam_detected'), (group_id, 2, "Другий", 'user_banned'),
+             (group_id, 3, "Третій", 'message_sent'), (group_id, 3, "Третій", 'captcha_passed')])
+    setup_stats_tables()
+
+    # Act: нові логи проходять через буфер запису
+    log_action(group_id, 2, "Другий", 'warning_given')
+    log_action(group_id, 2, "Другий", 'spam_detected')
+    log_action(group_id, 3, "Третій", 'message_sent')
+    stats = get_group_stats(group_id, 30)
+
+    # Assert
+    assert [(row['user_id'], row['violation_count']) for row in stats['top_violators']] == [(2, 3), (1, 1)]
+    assert sum(row['count'] for row in stats['hourly_activity']) == 2
+
+
+def test_stats_queries_use_indexes(test_db):
+    """
+    Тест перевіряє через EXPLAIN QUERY PLAN, що запити статистики шукають по індексах,
+    а не сканують таблиці повністю.
+    """
+    from bot.infrastructure import database
+    from bot.infrastructure.db_connection import read_cursor
+
+    queries = [
+        (database.STATS_TOTALS_SQL, (-1001, 30)),
+        (database.STATS_DAILY_SQL, (-1001, 30)),
+        (database.STATS_TOP_VIOLATORS_SQL, (-1001, 30)),
+        (database.STATS_HOURLY_SQL, (-1001,)),
+    ]
+    with read_cursor() as cursor:
+        for sql, params in queries:
+            plan = [row['detail'] for row in cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+            table_steps = [step for step in plan if step.startswith(('SCAN', 'SEARCH'))]
+            assert table_steps, plan
+            for step in table_steps:
+                assert step.startswith('SEARCH') and 'USING' in step, plan
+                # Діапазон за часом теж має обмежуватись індексом, а не фільтруватись після читання
+                assert 'date>?' in step or 'hour_bucket>?' in step, plan
+
+
+def test_chat_config_cached_until_setter_invalidates(test_db):
+    """
+    Тест перевіряє, що знімок конфігурації чату кешується
+    і оновлюється після зміни списків через функції-сеттери.
+    """
+    from bot.infrastructure.database import get_chat_config, add_group_spam_trigger
+
+    # Arrange
+    group_id = -100555
+    add_group_if_not_exists(group_id, "Кешована Група")
+
+    # Act
+    first = get_chat_config(group_id)
+    second = get_chat_config(group_id)
+    add_group_spam_trigger(group_id, "Нове Слово", 7)
+    third = get_chat_config(group_id)
+
+    # Assert: повторне звернення повертає той самий знімок, сеттер його скидає
+    assert first is second
+    assert "нове слово" not in first.triggers
+    assert third.triggers["нове слово"] == 7
+    with pytest.raises(TypeError):
+        third.triggers["інше"] = 1
+
+
+def test_chat_config_cache_evicts_least_recently_used():
+    """Тест перевіряє, що кеш конфігурацій обмежений за розміром (LRU)."""
+    from bot.infrastructure.chat_config_cache import ChatConfig, ChatConfigCache
+
+    cache = ChatConfigCache(max_size=2)
+    for group_id in (1, 2):
+        cache.put(ChatConfig.create(group_id, {}, [], {}, {}, None, {}), cache.generation)
+    cache.get(1)
+    cache.put(ChatConfig.create(3, {}, [], {}, {}, None, {}), cache.generation)
+
+    assert cache.get(2) is None
+    assert cache.get(1) is not None and cache.get(3) is not None
+
+
+def test_prune_action_logs_respects_retention_and_archives(test_db, tmp_path):
+    """
+    Тест перевіряє очищення старих логів пакетами з урахуванням терміну групи,
+    архівацію видалених рядків та їхній повторний імпорт.
+    """
+    import datetime
+    from bot.infrastructure.database import add_group_if_not_exists, set_group_setting
+    from bot.infrastructure.db_connection import transaction, read_cursor
+    from bot.infrastructure.log_retention import prune_action_logs, import_archived_logs
+
+    now = datetime.datetime(2024, 6, 30, 12, 0, 0)
+    add_group_if_not_exists(-1, "Довгий термін")
+    set_group_setting(-1, 'log_retention_days', 365)
+    add_group_if_not_exists(-2, "Назавжди")
+    set_group_setting(-2, 'log_retention_days', 0)
+
+    # Arrange: по 5 записів на групу за 100 днів до now і по одному свіжому
+    old = (now - datetime.timedelta(days=100)).strftime('%Y-%m-%d %H:%M:%S')
+    fresh = (now - datetime.timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S')
+    rows = []
+    for group_id in (-1, -2, -3):
+        rows += [(group_id, 7, "Користувач", 'message_sent', old)] * 5
+        rows.append((group_id, 7, "Користувач", 'message_sent', fresh))
+    with transaction() as cursor:
+        cursor.executemany(
+            "INSERT INTO action_logs (group_id, user_id, user_name, action_type, timestamp) VALUES (?, ?, ?, ?, ?)", rows)
+
+    # Act: глобальний термін 30 днів, пакети по 2 рядки
+    deleted = prune_action_logs(retention_days=30, archive_dir=str(tmp_path), batch_size=2, pause=0, now=now)
+
+    # Assert: видалено лише старі записи групи без власного терміну
+    assert deleted == 5
+    with read_cursor() as cursor:
+        cursor.execute("SELECT group_id, COUNT(*) AS count FROM action_logs GROUP BY group_id ORDER BY group_id")
+        assert [tuple(row) for row in cursor.fetchall()] == [(-3, 1), (-2, 6), (-1, 6)]
+
+    # Умови очищення шукають по індексах, а не перечитують рядки груп, які не очищаються
+    from bot.infrastructure.log_retention import _plan_prune
+    targets = _plan_prune(30, now)
+    assert len(targets) == 2
+    with read_cursor() as cursor:
+        for target in targets:
+            plan = [row['detail'] for row in cursor.execute(f"EXPLAIN QUERY PLAN {target.sql}", (*target.params, 2))]
+            assert any(step.startswith('SEARCH action_logs USING INDEX') and 'timestamp<?' in step
+                       for step in plan), plan
+
+    archive = tmp_path / f"action_logs-{old[:7]}.jsonl.gz"
+    assert import_archived_logs(str(archive)) == 5
+    # Повторний імпорт не дублює записи
+    assert import_archived_logs(str(archive)) == 0
+    with read_cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM action_logs WHERE group_id = -3")
+        assert cursor.fetchone()[0] == 6
+
+
+def test_group_teardown_is_chunked_and_resumable(test_db):
+    """
+    Тест перевіряє, що дані групи видаляються порціями з усіх таблиць групи
+    (включно з punishment_settings), а перерване видалення продовжується з місця зупинки.
+    """
+    from bot.infrastructure.database import (
+        add_group_if_not_exists, set_group_admin, add_warning, set_punishment_settings,
+        schedule_group_deletion, delete_group_data_chunk, get_pending_group_deletions, GROUP_SCOPED_TABLES
+    )
+    from bot.infrastructure.db_connection import transaction, read_cursor
+
+    # Arrange: дані двох груп
+    for group_id in (-1, -2):
+        add_group_if_not_exists(group_id, f"Група {group_id}")
+        set_group_admin(group_id, 100)
+        add_warning(7, group_id)
+        set_punishment_settings(group_id, 1, "mute", 60)
+        with transaction() as cursor:
+            cursor.executemany("INSERT INTO action_logs (group_id, user_id, action_type) VALUES (?, ?, 'spam_detected')",
+                               [(group_id, user_id) for user_id in range(7)])
+
+    # Act: починаємо видалення і "падаємо" після кількох порцій
+    schedule_group_deletion(-1)
+    for _ in range(3):
+        assert delete_group_data_chunk(-1, chunk_size=2) is False
+    assert get_pending_group_deletions() == [-1]
+
+    # Після "перезапуску" продовжуємо до кінця
+    chunks = 0
+    while not delete_group_data_chunk(-1, chunk_size=2):
+        chunks += 1
+    assert chunks > 0
+
+    # Assert: у жодній таблиці не лишилось даних групи -1, дані групи -2 не зачеплені
+    assert get_pending_group_deletions() == []
+    with read_cursor() as cursor:
+        for table, id_column in GROUP_SCOPED_TABLES:
+            cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE {id_column} = -1", ())
+            assert cursor.fetchone()[0] == 0, table
+        cursor.execute("SELECT COUNT(*) FROM action_logs WHERE group_id = -2")
+        assert cursor.fetchone()[0] == 7
+        cursor.execute("SELECT COUNT(*) FROM punishment_settings WHERE group_id = -2")
+        assert cursor.fetchone()[0] == 1
+
+
+@pytest.mark.asyncio
+async def test_chat_state_persistence_is_lazy_compact_and_dirty_only(test_db):
+    """Перевіряє збереження стану чатів: компактний формат, ліниве завантаження, запис лише змінених."""
+    import copy
+    import time
+    from unittest.mock import patch
+    from bot.infrastructure.chat_persistence import ChatStatePersistence
+    from bot.infrastructure.async_database import save_chat_states
+    from bot.features.message_filtering.antiflood_service import FloodTracker
+    from bot.features.group_join.raid_service import RaidState
+
+    now = time.time()
+    tracker = FloodTracker(-1001)
+    for user_id in range(20):
+        tracker.hit(user_id, 5, now - 1)
+        tracker.hit(user_id, 5, now)
+    raid = RaidState()
+    raid.register_join(now)
+    raid.captcha_members = {42: 1, 43: 0}
+    chat_data = {'flood_tracker': tracker, 'raid_state': raid, 'other': object()}
+
+    persistence = ChatStatePersistence()
+    # PTB передає глибоку копію chat_data
+    await persistence.update_chat_data(-1001, copy.deepcopy(chat_data))
+    await persistence.flush()
+
+    blob = test_db.execute("SELECT data FROM chat_state WHERE chat_id = -1001").fetchone()[0]
+    # 20 користувачів по 2 мітки: 14 байтів на користувача замість десятків у pickle
+    assert len(blob) < 20 * 14 + 100
+
+    # Незмінений стан повторно не пишеться
+    with patch('bot.infrastructure.chat_persistence.save_chat_states') as mock_save:
+        await persistence.update_chat_data(-1001, copy.deepcopy(chat_data))
+        await persistence.flush()
+        mock_save.assert_not_called()
+
+    # Після "перезапуску" нічого не завантажується наперед, а стан чату - при першому оновленні
+    restarted = ChatStatePersistence()
+    assert await restarted.get_chat_data() == {}
+    restored = {}
+    await restarted.refresh_chat_data(-1001, restored)
+    assert set(restored) == {'flood_tracker', 'raid_state'}
+    assert len(restored['flood_tracker']) == 20
+    assert restored['raid_state'].captcha_members == {42: 1, 43: 0}
+    # Флуд рахується з урахуванням відновленої історії
+    assert [restored['flood_tracker'].hit(0, 5, now + 0.5) for _ in range(4)] == [False, False, False, True]
+
+    with patch('bot.infrastructure.chat_persistence.get_chat_state') as mock_get:
+        await restarted.refresh_chat_data(-1001, restored)
+        mock_get.assert_not_called()
+
+    # Видалений чат (бота прибрали з групи) забувається повністю
+    await restarted.drop_chat_data(-1001)
+    assert -1001 not in restarted._loaded and -1001 not in restarted._stored
+    assert test_db.execute("SELECT COUNT(*) FROM chat_state").fetchone()[0] == 0
+
+    # Порожній стан видаляє рядок і не тримається в пам'яті
+    await persistence.update_chat_data(-1002, copy.deepcopy(chat_data))
+    await persistence.flush()
+    await persistence.update_chat_data(-1002, {})
+    await persistence.flush()
+    assert test_db.execute("SELECT COUNT(*) FROM chat_state").fetchone()[0] == 0
+    assert -1002 not in persistence._stored
+
+
+def test_chat_dashboard_reads_requested_sections_in_one_transaction(test_db):
+    """
+    Тест перевіряє, що дані панелі читаються однією транзакцією,
+    повертаються лише запитані розділи, а буфер статистики дописується заздалегідь.
+    """
+    from bot.infrastructure.database import (
+        get_chat_dashboard, add_group_spam_trigger, add_group_whitelist_word, increment_daily_stat,
+        get_group_settings, get_group_blocklist, get_group_whitelist, get_punishment_settings,
+        DASHBOARD_SECTIONS
+    )
+
+    # Arrange
+    group_id = -100555
+    add_group_if_not_exists(group_id, "Dashboard Group")
+    add_group_spam_trigger(group_id, "казино", 20)
+    add_group_whitelist_word(group_id, "робота")
+    increment_daily_stat(group_id, 'messages_total', 4)
+
+    statements = []
+    test_db.set_trace_callback(statements.append)
+
+    # Act
+    partial = get_chat_dashboard(group_id, ('blocklist', 'stats'))
+    full = get_chat_dashboard(group_id)
+    test_db.set_trace_callback(None)
+
+    # Assert
+    assert set(partial) == {'blocklist', 'stats'}
+    assert partial['blocklist'] == {"казино": 20}
+    assert partial['stats']['historical']['totals']['total_messages'] == 4
+    assert partial['stats']['current']['whitelist_count'] == 1
+
+    assert set(full) == set(DASHBOARD_SECTIONS)
+    assert full['settings'] == get_group_settings(group_id)
+    assert full['blocklist'] == get_group_blocklist(group_id)
+    assert full['whitelist'] == get_group_whitelist(group_id)
+    assert full['punishments'] == get_punishment_settings(group_id)
+
+    # По одній транзакції читання на кожен виклик ('BEGIN ' - запис буфера, він іде до неї),
+    # усі SELECT - всередині, і жодна транзакція не лишилась відкритою
+    assert statements.index("BEGIN ") < statements.index("BEGIN")
+    assert statements.count("BEGIN") == 2
+    in_read_transaction = False
+    for statement in statements:
+        if statement == "BEGIN":
+            in_read_transaction = True
+        elif statement in ("ROLLBACK", "COMMIT"):
+            in_read_transaction = False
+        elif statement.lstrip().startswith("SELECT"):
+            assert in_read_transaction, statement
+    assert not test_db.in_transaction
+
+
+@pytest.mark.asyncio
+async def test_stats_export_streams_pages_in_csv_jsonl_and_gzip(test_db):
+    """
+    Тест перевіряє, що експорт читає логи сторінками в межах діапазону дат,
+    не плутає групи, а CSV, JSON Lines та gzip-варіант містять ті самі рядки.
+    """
+    import csv
+    import datetime
+    import gzip
+    import io
+    import json
+    from unittest.mock import patch
+    from bot.infrastructure import stats_export
+    from bot.infrastructure.stats_export import stream_export, parse_export_range
+    from bot.infrastructure.database import increment_daily_stat
+
+    # Arrange: 25 логів групи -1 за три дні та один лог іншої групи
+    with test_db:
+        test_db.executemany(
+            "INSERT INTO action_logs (group_id, user_id, user_name, action_type, details, timestamp) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(-1, i, f"user,{i}", 'spam_detected', 'Score: "15"', f"2024-03-0{1 + i % 3} 12:00:{i:02d}")
+             for i in range(25)] + [(-2, 99, "other", 'spam_detected', '', "2024-03-02 12:00:00")]
+        )
+    increment_daily_stat(-1, 'messages_total', 3)
+    start, end = parse_export_range("2024-03-02", "2024-03-03")
+
+    async def collect(export_format, compress=False, source='logs', range_=(start, end)):
+        return b"".join([chunk async for chunk in stream_export(source, export_format, -1, *range_,
+                                                                 compress=compress, page_size=4)])
+
+    # Act
+    with patch.object(stats_export, 'fetch_export_page', wraps=stats_export.fetch_export_page) as page_reader:
+        csv_body = await collect('csv')
+    jsonl_body = await collect('jsonl')
+    gzip_body = await collect('csv', compress=True)
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    daily_body = await collect('jsonl', source='daily', range_=(today, today))
+
+    # Assert: 1 та 2 березня - 16 рядків (i % 3 == 1 або 2), сторінками по 4
+    rows = list(csv.reader(io.StringIO(csv_body.decode())))
+    assert rows[0] == ['ID', 'Time', 'User ID', 'User Name', 'Action', 'Details']
+    assert len(rows) == 1 + 16
+    assert page_reader.call_count == 5
+    assert {row[3] for row in rows[1:]} >= {"user,1", "user,2"}
+    assert [row[1] for row in rows[1:]] == sorted(row[1] for row in rows[1:])
+
+    lines = [json.loads(line) for line in jsonl_body.decode().splitlines()]
+    assert [line['id'] for line in lines] == [int(row[0]) for row in rows[1:]]
+    assert lines[0]['details'] == 'Score: "15"'
+
+    assert gzip.decompress(gzip_body) == csv_body
+    assert json.loads(daily_body)['messages_total'] == 3
+
+    with pytest.raises(ValueError):
+        parse_export_range("2024-03-05", "2024-03-01")
+
+
+@pytest.mark.asyncio
+async def test_live_stats_coalesces_increments_per_chat(test_db):
+    """
+    Тест перевіряє, що прирости лічильників з increment_daily_stat доходять лише
+    до підписників свого чату, одним оновленням за інтервал, а без підписників не накопичуються.
+    """
+    from bot.infrastructure.database import increment_daily_stat
+    from bot.infrastructure.live_stats import LiveStatsHub
+    from unittest.mock import patch
+
+    hub = LiveStatsHub(interval=3600)
+    with patch('bot.infrastructure.database.live_stats', hub):
+        # Ніхто не дивиться - нічого не накопичується
+        increment_daily_stat(-1, 'messages_total')
+        assert hub.flush() == 0
+
+        first = hub.subscribe(-1)
+        second = hub.subscribe(-1)
+        other = hub.subscribe(-2)
+        for _ in range(5):
+            increment_daily_stat(-1, 'messages_total')
+        increment_daily_stat(-1, 'messages_deleted', 2)
+        increment_daily_stat(-1, 'captcha_passed')
+
+        # Act: одна розсилка за інтервал
+        assert hub.flush() == 1
+
+        # Assert
+        expected = {'messages_total': 5, 'messages_deleted': 2, 'captcha_passed': 1}
+        assert await first.next_update(0.1) == expected
+        assert await second.next_update(0.1) == expected
+        assert await other.next_update(0.01) is None
+        assert hub.updates_sent == 2
+
+        # Відписаний чат знову нічого не накопичує; процеси-обробники дізнаються про зміни списку
+        watched = []
+        hub.add_watch_listener(watched.append)
+        for subscription in (first, second, other):
+            hub.unsubscribe(subscription)
+        assert watched == [frozenset({-2}), frozenset()]
+        increment_daily_stat(-1, 'messages_total')
+        assert hub.flush() == 0
+        assert hub.get_metrics()['subscriptions'] == 0
+
+        # Процес-обробник передає головному процесу лише чати, відкриті в панелях
+        forwarded = []
+        hub.set_forwarder(forwarded.append)
+        hub.set_watched(frozenset({-3}))
+        increment_daily_stat(-3, 'users_joined', 4)
+        increment_daily_stat(-3, 'users_joined')
+        increment_daily_stat(-4, 'users_joined')
+        hub.flush()
+        assert forwarded == [{-3: {'users_joined': 5}}]
+
+    hub.stop()
+
+
+@pytest.mark.asyncio
+async def test_readded_group_finishes_teardown_in_chunks_and_keeps_new_settings(test_db):
+    """
+    Тест перевіряє, що при повторному додаванні бота недочищене видалення завершується
+    порціями через потік БД, кожна порція бере блокування запису одразу,
+    а пізніша порція фонового завдання вже не чіпає нові налаштування групи.
+    """
+    from bot.infrastructure.database import (
+        add_group_if_not_exists, set_group_admin, get_group_admin_id, schedule_group_deletion,
+        delete_group_data_chunk, get_pending_group_deletions
+    )
+    from bot.features.bot_management.group_teardown_job import finish_group_deletion
+    from unittest.mock import patch
+
+    add_group_if_not_exists(-1, "Стара група")
+    set_group_admin(-1, 100)
+    schedule_group_deletion(-1)
+
+    statements = []
+    test_db.set_trace_callback(statements.append)
+    with patch('bot.features.bot_management.group_teardown_job.CHUNK_PAUSE_SECONDS', 0):
+        await finish_group_deletion(-1)
+    test_db.set_trace_callback(None)
+
+    add_group_if_not_exists(-1, "Нова група")
+    set_group_admin(-1, 200)
+
+    # Фонове завдання, що встигло отримати -1 у списку до повторного додавання
+    assert delete_group_data_chunk(-1) is True
+    assert get_pending_group_deletions() == []
+    assert get_group_admin_id(-1) == 200
+    assert "BEGIN IMMEDIATE" in statements
+
+
+@pytest.mark.asyncio
+async def test_prune_job_releases_db_thread_between_batches(test_db, tmp_path):
+    """
+    Тест перевіряє, що асинхронне очищення виконує кожен пакет окремим зверненням
+    до потоку БД, а архів повертається командою імпорту.
+    """
+    import datetime
+    from unittest.mock import patch
+    from bot.infrastructure import log_retention
+    from bot.infrastructure.db_connection import transaction, read_cursor
+
+    now = datetime.datetime(2024, 6, 30, 12, 0, 0)
+    old = (now - datetime.timedelta(days=100)).strftime('%Y-%m-%d %H:%M:%S')
+    with transaction() as cursor:
+        cursor.executemany(
+            "INSERT INTO action_logs (group_id, user_id, user_name, action_type, timestamp) VALUES (?, ?, ?, ?, ?)",
+            [(-1, 7, "Користувач", 'message_sent', old)] * 5)
+
+    with patch.object(log_retention, 'run_in_db_executor', wraps=log_retention.run_in_db_executor) as executor_call:
+        deleted = await log_retention.prune_action_logs_async(
+            retention_days=30, archive_dir=str(tmp_path), batch_size=2, pause=0, now=now)
+
+    assert deleted == 5
+    # Межі очищення + пакети по 2 рядки (2 + 2 + 1)
+    assert executor_call.await_count == 1 + 3
+
+    log_retention.main(["import", str(tmp_path / f"action_logs-{old[:7]}.jsonl.gz")])
+    with read_cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM action_logs WHERE group_id = -1")
+        assert cursor.fetchone()[0] == 5
@@ -2,6 +2,15 @@ import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 
 
+def _chat_config(settings: dict, admin_id=None, punishments=None):
+    """Створює знімок конфігурації чату для тестів."""
+    from bot.infrastructure.chat_config_cache import ChatConfig
+    return ChatConfig.create(
+        group_id=-10012345, settings=settings, whitelist=[], global_triggers={},
+        blocklist={}, admin_id=admin_id, punishments=punishments or {}
+    )
+
+
 # --- Тестування обробників (Handlers) ---
 
 @pytest.mark.asyncio
@@ -19,14 +28,15 @@ async def test_start_handler():
 
 
 @pytest.mark.asyncio
-@patch('bot.features.group_join.new_member_handler.get_group_settings')
+@patch('bot.features.group_join.new_member_handler.get_chat_config')
+@patch('bot.features.group_join.new_member_handler.schedule_captcha_timeout')
 # Додаємо фікстуру test_db
-async def test_new_member_handler_captcha_enabled(mock_get_settings, test_db):
+async def test_new_member_handler_captcha_enabled(mock_schedule_timeout, mock_get_config, test_db):
     """
     Перевіряє, що для нового учасника створюється CAPTCHA.
     """
     from bot.features.group_join.new_member_handler import new_member_handler
-    mock_get_settings.return_value = {'captcha_enabled': True}
+    mock_get_config.return_value = _chat_config({'captcha_enabled': True})
 
     update = MagicMock()
     # Встановлюємо реальні числові ID
@@ -46,19 +56,70 @@ async def test_new_member_handler_captcha_enabled(mock_get_settings, test_db):
 
     context.bot.restrict_chat_member.assert_called_once()
     context.bot.send_message.assert_called_once()
-    context.job_queue.run_once.assert_called_once()
+    mock_schedule_timeout.assert_called_once()
+    assert mock_schedule_timeout.call_args.args[:2] == (-10012345, 54321)
     call_args = context.bot.send_message.call_args
     assert "верифікація" in call_args.kwargs['text']
 
 
 @pytest.mark.asyncio
-# Додаємо новий патч для get_group_admin_id
-@patch('bot.features.message_filtering.message_handler.get_group_admin_id')
-@patch('bot.features.message_filtering.message_handler.get_group_settings')
+@patch('bot.features.group_join.new_member_handler.get_chat_config')
+@patch('bot.features.group_join.new_member_handler.dispatch')
+async def test_new_member_restriction_is_lifted_when_captcha_is_dropped(mock_dispatch, mock_get_config, test_db):
+    """
+    Перевіряє, що таймаут капчі запускається до надсилання повідомлення,
+    а якщо повідомлення відкинуто - обмеження знімається і таймаут скасовується.
+    """
+    from bot.features.group_join import captcha_timeout
+    from bot.features.group_join.new_member_handler import new_member_handler
+    from bot.features.group_join.captcha_service import MEMBER_PERMISSIONS
+    from bot.infrastructure.database import get_captcha_timeouts
+    from bot.infrastructure.outbound_dispatcher import OutboundDroppedError
+    mock_get_config.return_value = _chat_config({'captcha_enabled': True})
+
+    update = MagicMock()
+    update.chat_member.chat.id = -10012345
+    update.chat_member.new_chat_member.user.id = 54321
+    update.chat_member.new_chat_member.user.is_bot = False
+    update.chat_member.new_chat_member.user.language_code = 'uk'
+    update.chat_member.new_chat_member.status = 'member'
+    update.chat_member.old_chat_member.status = 'left'
+    context = MagicMock()
+    context.chat_data = {}
+
+    async def dispatch(priority, method, **kwargs):
+        if method is context.bot.send_message:
+            # Поки повідомлення чекає в черзі, таймаут уже діє
+            assert (-10012345, 54321) in captcha_timeout.captcha_wheel
+            raise OutboundDroppedError("Outbound call is stale")
+        return True
+
+    mock_dispatch.side_effect = dispatch
+    await new_member_handler(update, context)
+
+    restrictions = [call.kwargs['permissions'] for call in mock_dispatch.call_args_list
+                    if call.args[1] is context.bot.restrict_chat_member]
+    assert restrictions[-1] == MEMBER_PERMISSIONS
+    assert (-10012345, 54321) not in captcha_timeout.captcha_wheel
+    assert get_captcha_timeouts() == []
+
+    # Надіслане повідомлення прив'язується до вже запущеного таймауту
+    async def dispatch_sent(priority, method, **kwargs):
+        return MagicMock(message_id=777)
+
+    mock_dispatch.side_effect = dispatch_sent
+    await new_member_handler(update, context)
+    assert captcha_timeout.captcha_wheel.get((-10012345, 54321))['message_id'] == 777
+    assert get_captcha_timeouts()[0]['message_id'] == 777
+    await captcha_timeout.cancel_captcha_timeout(-10012345, 54321)
+
+
+@pytest.mark.asyncio
+@patch('bot.features.message_filtering.message_handler.get_chat_config')
 @patch('bot.features.message_filtering.message_handler.calculate_spam_score')
 @patch('bot.features.message_filtering.message_handler.add_warning')
 async def test_message_handler_deletes_spam(
-        mock_add_warning, mock_calc_score, mock_get_settings, mock_get_admin_id, test_db
+        mock_add_warning, mock_calc_score, mock_get_config, test_db
 ):
     """
     Перевіряє, що обробник повідомлень видаляє спам, надсилає попередження і лог.
@@ -66,11 +127,14 @@ async def test_message_handler_deletes_spam(
     from bot.features.message_filtering.message_handler import message_handler
 
     # 1. Arrange
-    mock_get_settings.return_value = {'spam_filter_enabled': True, 'spam_threshold': 10}
     mock_calc_score.return_value = (15, ["'спам' (15)"])
     mock_add_warning.return_value = 1
     # Імітуємо, що для цього чату є локальний адмін з ID 999
-    mock_get_admin_id.return_value = 999
+    mock_get_config.return_value = _chat_config(
+        {'spam_filter_enabled': True, 'spam_threshold': 10},
+        admin_id=999,
+        punishments={1: {"action": "mute", "duration": 1440}}
+    )
 
     update = MagicMock()
     update.message.chat.id = -10012345
@@ -104,4 +168,406 @@ async def test_message_handler_deletes_spam(
     # Перевіряємо другий виклик - лог адміну
     second_call_args = context.bot.send_message.call_args_list[1]
     assert second_call_args.kwargs['chat_id'] == 999  # Перевіряємо, що лог іде адміну
-    assert "СПАМ ВИЯВЛЕНО" in second_call_args.kwargs['text']
\ No newline at end of file
+    assert "СПАМ ВИЯВЛЕНО" in second_call_args.kwargs['text']
+
+# --- Тестування черги вихідних запитів ---
+
+@pytest.mark.asyncio
+async def test_outbound_dispatcher_orders_by_priority_and_retries():
+    """Перевіряє пріоритети черги, повтор після RetryAfter та відкидання сповіщень при переповненні."""
+    import asyncio
+    from datetime import timedelta
+    from telegram.error import RetryAfter
+    from bot.infrastructure.outbound_dispatcher import OutboundDispatcher, OutboundDroppedError, Priority
+
+    dispatcher = OutboundDispatcher(max_queued=2)
+    calls = []
+    failures = {'ban': 1}
+
+    async def api_call(name, chat_id):
+        calls.append(name)
+        if failures.get(name):
+            failures[name] -= 1
+            raise RetryAfter(timedelta(milliseconds=10))
+        return name
+
+    # Усі запити ставляться в чергу до того, як обробник встигне їх забрати
+    log = dispatcher.submit(Priority.LOG, api_call, 'log', chat_id=999)
+    notification = dispatcher.submit(Priority.NOTIFICATION, api_call, 'notify', chat_id=-1)
+    dropped = dispatcher.submit(Priority.NOTIFICATION, api_call, 'extra', chat_id=-1)
+    ban = dispatcher.submit(Priority.MODERATION, api_call, 'ban', chat_id=-1)
+
+    results = await asyncio.wait_for(asyncio.gather(log, notification, ban), timeout=2)
+
+    assert results == ['log', 'notify', 'ban']
+    # Модерація виконується першою, а після 429 повторюється
+    assert calls == ['ban', 'notify', 'log', 'ban']
+    with pytest.raises(OutboundDroppedError):
+        await dropped
+
+    metrics = dispatcher.get_metrics()
+    assert metrics['sent'] == 3
+    assert metrics['retried'] == 1
+    assert metrics['dropped'] == 1
+
+    await dispatcher.shutdown()
+
+    # Сповіщення, скасоване поки чекало на ліміт чату, звільняє місце в черзі
+    dispatcher = OutboundDispatcher(chat_burst=1)
+    delayed = [dispatcher.submit(Priority.NOTIFICATION, api_call, f'late{i}', chat_id=-2) for i in range(3)]
+    await asyncio.sleep(0.05)
+    assert dispatcher.get_metrics()['queued_notifications'] == 2
+    for future in delayed:
+        future.cancel()
+    await asyncio.sleep(0)
+    assert dispatcher.get_metrics()['queued_notifications'] == 0
+    await dispatcher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_deletion_scheduler_batches_per_chat():
+    """Перевіряє, що відкладені видалення групуються по чатах у пакети до 100 повідомлень, а чати видаляються одночасно."""
+    import asyncio
+    from bot.features.message_filtering.delete_message_job import DeletionScheduler
+
+    scheduler = DeletionScheduler(bucket_seconds=5)
+    for message_id in range(150):
+        scheduler.schedule(-1, message_id, 30, now=1000.0 + message_id / 100)
+    scheduler.schedule(-2, 1, 30, now=1000.0)
+    # Ще не настав час - нічого не видаляється
+    scheduler.schedule(-2, 2, 300, now=1000.0)
+
+    # Перший пакет чату -1 не завершується, доки не почалось видалення в чаті -2
+    started = asyncio.Event()
+
+    async def delete_messages(chat_id, message_ids):
+        if chat_id == -2:
+            started.set()
+            raise Exception("Message can't be deleted")
+        await asyncio.wait_for(started.wait(), 1)
+        return True
+
+    bot = MagicMock()
+    bot.delete_messages = AsyncMock(side_effect=delete_messages)
+
+    deleted = await scheduler.flush_due(bot, now=1040.0)
+
+    assert bot.delete_messages.call_count == 3
+    batches = [(call.kwargs['chat_id'], len(call.kwargs['message_ids'])) for call in bot.delete_messages.call_args_list]
+    assert sorted(batches) == [(-2, 1), (-1, 50), (-1, 100)]
+    assert [batch for batch in batches if batch[0] == -1] == [(-1, 100), (-1, 50)]
+    assert deleted == 150
+    metrics = scheduler.get_metrics()
+    assert metrics['failed_messages'] == 1
+    assert metrics['pending'] == 1
+
+
+def test_timing_wheel_expires_in_batches_and_cancels():
+    """Перевіряє колесо таймерів: пакетне спрацювання, скасування та таймери довші за оберт."""
+    from bot.infrastructure.timing_wheel import TimingWheel
+
+    wheel = TimingWheel(tick_seconds=1, slots=8, now=1000.0)
+    for user_id in range(5):
+        wheel.add((-1, user_id), 1002.5, {'user': user_id})
+    wheel.add((-1, 99), 1020.0)  # більше ніж оберт колеса
+    wheel.add((-1, 100), 990.0)  # вже прострочений (наприклад, відновлений після перезапуску)
+    assert wheel.cancel((-1, 3)) is True
+
+    assert [key for key, _ in wheel.advance(1001.0)] == [(-1, 100)]
+    expired = wheel.advance(1003.0)
+    assert sorted(key[1] for key, _ in expired) == [0, 1, 2, 4]
+    # Слот таймера (-1, 99) вже проходили, але його оберт ще не настав
+    assert wheel.advance(1012.0) == []
+    assert [key for key, _ in wheel.advance(1020.0)] == [(-1, 99)]
+    assert len(wheel) == 0
+
+
+@pytest.mark.asyncio
+async def test_captcha_timeouts_survive_restart(test_db):
+    """Перевіряє, що таймаути капчі зберігаються в БД і відновлюються після перезапуску."""
+    from bot.features.group_join import captcha_timeout
+    from bot.infrastructure.timing_wheel import TimingWheel
+
+    with patch.object(captcha_timeout, 'captcha_wheel', TimingWheel()):
+        await captcha_timeout.schedule_captcha_timeout(-1, 10, 500, 'uk', delay=-1)
+        await captcha_timeout.schedule_captcha_timeout(-1, 11, 501, 'uk')
+        await captcha_timeout.cancel_captcha_timeout(-1, 11)
+
+    # "Перезапуск": порожнє колесо, таймаути читаються з БД
+    with patch.object(captcha_timeout, 'captcha_wheel', TimingWheel()):
+        context = MagicMock()
+        context.bot.ban_chat_member = AsyncMock()
+        context.bot.unban_chat_member = AsyncMock()
+        context.bot.delete_message = AsyncMock()
+        context.bot.send_message = AsyncMock()
+
+        await captcha_timeout.load_captcha_timeouts_job(context)
+        assert len(captcha_timeout.captcha_wheel) == 1
+        with patch.object(captcha_timeout.time, 'time', return_value=captcha_timeout.time.time() + 2):
+            await captcha_timeout.captcha_timeouts_tick_job(context)
+
+    context.bot.ban_chat_member.assert_called_once_with(chat_id=-1, user_id=10, until_date=None)
+    context.bot.delete_message.assert_called_once_with(chat_id=-1, message_id=500)
+    assert await captcha_timeout.get_captcha_timeouts() == []
+
+
+def test_captcha_callback_is_signed_and_compact():
+    """Перевіряє, що кнопки капчі вміщаються в 64 байти, не розкривають відповідь і не підробляються."""
+    from bot.features.group_join.captcha_service import (
+        create_captcha_keyboard, decode_captcha_callback, encode_captcha_callback, correct_option_index, HUMAN_EMOJIS
+    )
+
+    keyboard = create_captcha_keyboard(-1001234567890123, 9876543210)
+    buttons = keyboard.inline_keyboard[0]
+    payloads = [decode_captcha_callback(button.callback_data) for button in buttons]
+
+    assert all(len(button.callback_data.encode()) <= 64 for button in buttons)
+    assert [payload.choice for payload in payloads] == [0, 1, 2, 3]
+    # Кнопка з емодзі людини - саме та, номер якої виводиться з HMAC
+    correct = correct_option_index(payloads[0].user_id, payloads[0].chat_id, payloads[0].nonce)
+    assert buttons[correct].text in HUMAN_EMOJIS
+
+    # Змінений номер кнопки чи спроби без правильного підпису не приймається
+    forged = buttons[0].callback_data[:-2] + ("AA" if not buttons[0].callback_data.endswith("AA") else "BB")
+    assert decode_captcha_callback(forged) is None
+    assert decode_captcha_callback("captcha:123:👨:👨") is None
+    assert decode_captcha_callback(encode_captcha_callback(payloads[1]._replace(choice=correct))) is not None
+
+
+@pytest.mark.asyncio
+@patch('bot.features.group_join.captcha_handler.cancel_captcha_timeout')
+async def test_captcha_handler_rejects_replayed_buttons(mock_cancel, test_db):
+    """Перевіряє, що після помилки старі кнопки капчі недійсні, тож спроби не скидаються повтором."""
+    from bot.features.group_join.captcha_handler import captcha_handler
+    from bot.features.group_join.captcha_service import (
+        create_captcha_keyboard, decode_captcha_callback, correct_option_index
+    )
+
+    def click(keyboard, correct: bool, button: int = None):
+        buttons = keyboard.inline_keyboard[0]
+        payload = decode_captcha_callback(buttons[0].callback_data)
+        right = correct_option_index(payload.user_id, payload.chat_id, payload.nonce)
+        index = button if button is not None else right if correct else (right + 1) % len(buttons)
+        update = MagicMock()
+        update.callback_query.data = buttons[index].callback_data
+        update.callback_query.from_user.id = 54321
+        update.callback_query.from_user.language_code = 'uk'
+        update.callback_query.message.chat.id = -10012345
+        update.callback_query.answer = AsyncMock()
+        update.callback_query.edit_message_text = AsyncMock()
+        update.callback_query.edit_message_reply_markup = AsyncMock()
+        return update
+
+    context = MagicMock(spec=['bot', 'chat_data'])
+    context.chat_data = {}
+    context.bot.ban_chat_member = AsyncMock()
+    context.bot.unban_chat_member = AsyncMock()
+
+    # Перша помилка - нова клавіатура з новим nonce
+    keyboard = create_captcha_keyboard(54321, -10012345)
+    update = click(keyboard, correct=False)
+    await captcha_handler(update, context)
+    new_keyboard = update.callback_query.edit_message_reply_markup.call_args.kwargs['reply_markup']
+    old_nonce = decode_captcha_callback(keyboard.inline_keyboard[0][0].callback_data).nonce
+    assert decode_captcha_callback(new_keyboard.inline_keyboard[0][0].callback_data).nonce != old_nonce
+    context.bot.ban_chat_member.assert_not_called()
+
+    # Повтор будь-якої кнопки старої клавіатури відхиляється
+    old_payload = decode_captcha_callback(keyboard.inline_keyboard[0][0].callback_data)
+    old_right = correct_option_index(old_payload.user_id, old_payload.chat_id, old_payload.nonce)
+    replay = click(keyboard, correct=True, button=old_right)
+    await captcha_handler(replay, context)
+    replay.callback_query.edit_message_text.assert_not_called()
+    mock_cancel.assert_not_called()
+
+    # Повідомлення з капчею вже недоступне - запит просто отримує відповідь
+    gone = click(new_keyboard, correct=True)
+    gone.callback_query.message = None
+    await captcha_handler(gone, context)
+    gone.callback_query.answer.assert_called_once()
+    mock_cancel.assert_not_called()
+
+    # Друга помилка - користувача видалено
+    await captcha_handler(click(new_keyboard, correct=False), context)
+    context.bot.ban_chat_member.assert_called_once()
+    mock_cancel.assert_called_once_with(-10012345, 54321)
+
+
+@pytest.mark.asyncio
+@patch('bot.features.group_join.new_member_handler.get_chat_config')
+@patch('bot.features.group_join.raid_service.get_chat_config')
+@patch('bot.features.group_join.raid_service.schedule_captcha_timeouts')
+@patch('bot.features.group_join.captcha_handler.cancel_captcha_timeout')
+async def test_raid_mode_batches_joiners_into_shared_captcha(
+        mock_cancel, mock_schedule_timeouts, mock_raid_config, mock_get_config, test_db
+):
+    """Перевіряє, що сплеск входів вмикає режим рейду зі спільною капчею і звітом власнику."""
+    from bot.features.group_join.new_member_handler import new_member_handler
+    from bot.features.group_join.captcha_handler import captcha_handler
+    from bot.features.group_join.captcha_service import decode_captcha_callback, correct_option_index
+    from bot.features.group_join.raid_service import (
+        raid_batch_job, raid_monitor_job, get_raid_state, RAID_JOIN_THRESHOLD, RAID_QUIET_SECONDS
+    )
+    mock_get_config.return_value = _chat_config({'captcha_enabled': True})
+    mock_raid_config.return_value = _chat_config({'captcha_enabled': True}, admin_id=777)
+
+    context = MagicMock()
+    context.chat_data = {}
+    context.bot.restrict_chat_member = AsyncMock()
+    context.bot.send_message = AsyncMock()
+
+    def join(user_id):
+        update = MagicMock()
+        update.chat_member.chat.id = -10012345
+        update.chat_member.chat.title = "Test"
+        update.chat_member.new_chat_member.user.id = user_id
+        update.chat_member.new_chat_member.user.is_bot = False
+        update.chat_member.new_chat_member.user.language_code = 'uk'
+        update.chat_member.new_chat_member.user.full_name = f"User {user_id}"
+        update.chat_member.new_chat_member.user.mention_html.return_value = f"User {user_id}"
+        update.chat_member.new_chat_member.status = 'member'
+        update.chat_member.old_chat_member.status = 'left'
+        return update
+
+    async def send_now(_priority, method, *args, rate_chat_id=None, **kwargs):
+        return await method(*args, **kwargs)
+
+    # Перші входи ще обробляються окремо; порогове значення вмикає рейд.
+    # Окремі капчі надсилаються без черги, щоб ліміт чату не розтягнув входи поза вікно
+    with patch('bot.features.group_join.new_member_handler.schedule_captcha_timeout'), \
+            patch('bot.features.group_join.new_member_handler.dispatch', side_effect=send_now):
+        for user_id in range(1, RAID_JOIN_THRESHOLD + 6):
+            await new_member_handler(join(user_id), context)
+
+    state = get_raid_state(context.chat_data)
+    assert state.active
+    assert len(state.pending) == 6
+    owner_messages = [c for c in context.bot.send_message.call_args_list if c.kwargs['chat_id'] == 777]
+    assert len(owner_messages) == 1
+    context.job_queue.run_once.assert_called_once()
+
+    # Пакет: обмеження для кожного, але одне повідомлення з капчею
+    context.bot.send_message.reset_mock()
+    context.job.chat_id = -10012345
+    context.job.data = {'chat_title': "Test"}
+    await raid_batch_job(context)
+    assert context.bot.restrict_chat_member.call_count == RAID_JOIN_THRESHOLD - 1 + 6
+    context.bot.send_message.assert_called_once()
+    mock_schedule_timeouts.assert_called_once()
+    assert len(mock_schedule_timeouts.call_args.args[1]) == 6
+    assert state.pending == []
+
+    # Спільну капчу може пройти лише учасник пакета; повідомлення не редагується
+    buttons = context.bot.send_message.call_args.kwargs['reply_markup'].inline_keyboard[0]
+    payload = decode_captcha_callback(buttons[0].callback_data)
+    right = correct_option_index(payload.user_id, payload.chat_id, payload.nonce)
+
+    def click(user_id):
+        update = MagicMock()
+        update.callback_query.data = buttons[right].callback_data
+        update.callback_query.from_user.id = user_id
+        update.callback_query.from_user.language_code = 'uk'
+        update.callback_query.message.chat.id = -10012345
+        update.callback_query.answer = AsyncMock()
+        update.callback_query.edit_message_text = AsyncMock()
+        return update
+
+    outsider = click(1)
+    await captcha_handler(outsider, context)
+    mock_cancel.assert_not_called()
+
+    member = click(RAID_JOIN_THRESHOLD + 5)
+    await captcha_handler(member, context)
+    mock_cancel.assert_called_once_with(-10012345, RAID_JOIN_THRESHOLD + 5)
+    member.callback_query.edit_message_text.assert_not_called()
+    assert RAID_JOIN_THRESHOLD + 5 not in state.captcha_members
+
+    # Після тиші рейд завершується зі звітом власнику
+    context.bot.send_message.reset_mock()
+    state.last_join -= RAID_QUIET_SECONDS
+    await raid_monitor_job(context)
+    assert not state.active
+    context.job.schedule_removal.assert_called_once()
+    assert context.bot.send_message.call_args.kwargs['chat_id'] == 777
+
+    # Спільну капчу не вдалося надіслати - обмеження знімаються, таймаутів немає
+    from bot.features.group_join.captcha_service import MEMBER_PERMISSIONS
+    state.pending = [(100, "User 100", "User 100", 'uk'), (101, "User 101", "User 101", 'uk')]
+    context.bot.send_message = AsyncMock(side_effect=Exception("Outbound call is stale"))
+    context.bot.restrict_chat_member.reset_mock()
+    mock_schedule_timeouts.reset_mock()
+    await raid_batch_job(context)
+    mock_schedule_timeouts.assert_not_called()
+    lifted = [c.kwargs['user_id'] for c in context.bot.restrict_chat_member.call_args_list
+              if c.kwargs['permissions'] == MEMBER_PERMISSIONS]
+    assert sorted(lifted) == [100, 101]
+    assert 100 not in state.captcha_members and 101 not in state.captcha_members
+
+
+def test_worker_pool_routes_by_chat_and_restarts_dead_workers():
+    """Перевіряє, що оновлення чату завжди йдуть в один процес, а завислі процеси перезапускаються."""
+    from bot.core.worker_pool import (WorkerPool, MSG_UPDATE, MSG_INVALIDATE, MSG_RELOAD_TRANSLATIONS,
+                                      EVENT_INVALIDATE, EVENT_RELOAD_TRANSLATIONS, HEARTBEAT_TIMEOUT_SECONDS)
+    from bot.infrastructure.chat_config_cache import chat_config_cache
+    from bot.infrastructure.sharding import update_chat_id
+
+    message = {'update_id': 1, 'message': {'message_id': 1, 'date': 0, 'chat': {'id': -100500, 'type': 'supergroup'}}}
+    callback = {'update_id': 2, 'callback_query': {'id': '1', 'chat_instance': '1', 'from': {'id': 7},
+                                                   'message': {'message_id': 2, 'chat': {'id': -100500}}}}
+    member = {'update_id': 3, 'chat_member': {'chat': {'id': -100501}}}
+    assert update_chat_id(message) == update_chat_id(callback) == -100500
+    assert update_chat_id(member) == -100501
+    assert update_chat_id({'update_id': 4}) is None
+
+    pool = WorkerPool(3)
+    assert pool.route(message) == pool.route(callback) != pool.route(member)
+    index = pool.route(message)
+    assert pool._queues[index].get(timeout=5) == (MSG_UPDATE, message)
+
+    # Інвалідація кешу розсилається всім процесам
+    chat_config_cache.add_invalidation_listener(pool.broadcast_invalidation)
+    try:
+        chat_config_cache.invalidate(-100500)
+    finally:
+        chat_config_cache.remove_invalidation_listener(pool.broadcast_invalidation)
+    for worker_queue in pool._queues:
+        items = [worker_queue.get(timeout=5) for _ in range(worker_queue.qsize())]
+        assert items[-1] == (MSG_INVALIDATE, -100500)
+
+    # Інвалідація з обробника 1 (наприклад, set_group_admin) скидає кеш головного процесу
+    # і розсилається решті обробників, але не назад відправнику
+    seen = []
+    chat_config_cache.add_invalidation_listener(seen.append)
+    chat_config_cache.add_invalidation_listener(pool.broadcast_invalidation)
+    try:
+        pool.handle_event(EVENT_INVALIDATE, (1, -100501))
+    finally:
+        chat_config_cache.remove_invalidation_listener(pool.broadcast_invalidation)
+        chat_config_cache.remove_invalidation_listener(seen.append)
+    assert seen == [-100501]
+    assert pool._queues[0].get(timeout=5) == pool._queues[2].get(timeout=5) == (MSG_INVALIDATE, -100501)
+    assert pool._queues[1].empty()
+
+    # Запит обробника на перезавантаження перекладів: головний процес перечитує їх сам і розсилає всім
+    with patch('bot.core.worker_pool.reload_translations') as mock_reload:
+        pool.handle_event(EVENT_RELOAD_TRANSLATIONS, None)
+    mock_reload.assert_called_once()
+    for worker_queue in pool._queues:
+        assert worker_queue.get(timeout=5) == (MSG_RELOAD_TRANSLATIONS, None)
+
+    # Живий, завершений і завислий процеси
+    now = 1000.0
+    healthy, dead, hung = MagicMock(), MagicMock(), MagicMock()
+    healthy.is_alive.return_value = True
+    dead.is_alive.return_value = False
+    hung.is_alive.return_value = True
+    pool._processes = [healthy, dead, hung]
+    for heartbeat, age in zip(pool._heartbeats, (1, 1, HEARTBEAT_TIMEOUT_SECONDS + 1)):
+        heartbeat.value = now - age
+
+    with patch.object(pool, '_spawn') as mock_spawn:
+        assert pool.check_health(now) == [1, 2]
+    assert [c.args[0] for c in mock_spawn.call_args_list] == [1, 2]
+    hung.terminate.assert_called_once()
+    healthy.terminate.assert_not_called()
+    assert pool.get_metrics()['workers'][2]['restarts'] == 1
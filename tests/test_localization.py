@@ -26,10 +26,8 @@ def test_fallback_language(monkeypatch):
     from bot.infrastructure import localization
     importlib.reload(localization)
 
-    def mock_exists(path):
-        return "en.json" in path  # Тільки англійський файл "існує"
-
-    monkeypatch.setattr("os.path.exists", mock_exists)
+    # Тільки англійський файл "існує"
+    monkeypatch.setattr("os.listdir", lambda path: ["en.json"])
     monkeypatch.setattr(localization, "load_translation_file",
                         lambda lang: {"start": f"Hello from {lang}"})
 
@@ -56,4 +54,35 @@ def test_key_not_found():
     importlib.reload(localization)
 
     text = localization.get_text("uk", "non_existent_key_12345")
-    assert text == "KEY_NOT_FOUND: non_existent_key_12345"
\ No newline at end of file
+    assert text == "KEY_NOT_FOUND: non_existent_key_12345"
+
+
+def test_catalogs_loaded_once_without_disk_access_on_hot_path(monkeypatch):
+    """Перевіряє, що після завантаження get_text не звертається до диска, а перезавантаження оновлює тексти."""
+    from bot.infrastructure import localization
+    importlib.reload(localization)
+
+    files = {"uk": {"hello": "Привіт, {name}!"}, "ru": {"hello": "Привет", "only_ru": "Только ru"},
+             "en": {"hello": "Hello", "only_en": "Only en", "price": "{amount:.2f} UAH"}}
+    monkeypatch.setattr("os.listdir", lambda path: [f"{lang}.json" for lang in files])
+    monkeypatch.setattr(localization, "load_translation_file", lambda lang: dict(files[lang]))
+    localization.load_translations()
+
+    def no_disk(*args, **kwargs):
+        raise AssertionError("звернення до диска під час get_text")
+
+    with patch("os.path.exists", no_disk), patch("os.listdir", no_disk), patch("builtins.open", no_disk):
+        assert localization.get_text("uk-UA", "hello", name="Дмитро") == "Привіт, Дмитро!"
+        # Запасні мови вже злиті в каталог uk
+        assert localization.get_text("uk", "only_ru") == "Только ru"
+        assert localization.get_text("uk", "only_en") == "Only en"
+        assert localization.get_text("de", "hello") == "Hello"
+        assert localization.get_text(None, "price", amount=3) == "3.00 UAH"
+        # Без потрібного параметра повертається шаблон як є
+        assert localization.get_text("uk", "hello", other=1) == "Привіт, {name}!"
+        assert localization.get_translations("xx") == files["en"]
+
+    files["uk"]["hello"] = "Вітаю!"
+    assert localization.reload_translations() == ["en", "ru", "uk"]
+    assert localization.get_text("uk", "hello") == "Вітаю!"
+    importlib.reload(localization)
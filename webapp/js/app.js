@@ -230,10 +230,12 @@ document.addEventListener('DOMContentLoaded', () => {
 
 
         try {
-            // Завантажуємо основні налаштування
-            const settingsResponse = await fetch(`/api/settings/${chatId}`, { headers: commonHeaders });
+            // Для групи налаштування та покарання приходять одним запитом
+            const endpoint = isGlobal ? '/api/settings/global' : `/api/chat/${chatId}/dashboard?fields=settings,punishments`;
+            const settingsResponse = await fetch(endpoint, { headers: commonHeaders });
             if (!settingsResponse.ok) throw new Error('Не вдалося завантажити налаштування.');
-            const settings = await settingsResponse.json();
+            const dashboard = await settingsResponse.json();
+            const settings = isGlobal ? dashboard : dashboard.settings;
 
             document.getElementById('captcha-toggle').checked = settings.captcha_enabled;
             document.getElementById('spamfilter-toggle').checked = settings.spam_filter_enabled;
@@ -245,9 +247,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
             // Завантажуємо налаштування покарань, якщо це не глобальні налаштування
             if (!isGlobal) {
-                const punishmentsResponse = await fetch(`/api/punishments/${chatId}`, { headers: commonHeaders });
-                if (!punishmentsResponse.ok) throw new Error('Не вдалося завантажити правила покарань.');
-                const punishments = await punishmentsResponse.json();
+                const punishments = dashboard.punishments;
 
                 for (const level in punishments) {
                     const rule = punishments[level];
@@ -364,10 +364,10 @@ document.addEventListener('DOMContentLoaded', () => {
         async loadList() {
             this.listUl.innerHTML = `<li>${t('loading_chats')}</li>`;
             try {
-                const endpoint = this.currentListType === 'blocklist' ? `/api/spam-words/${selectedChatId}` : `/api/whitelist/${selectedChatId}`;
-                const response = await fetch(endpoint, { headers: commonHeaders });
+                const section = this.currentListType === 'blocklist' ? 'blocklist' : 'whitelist';
+                const response = await fetch(`/api/chat/${selectedChatId}/dashboard?fields=${section}`, { headers: commonHeaders });
                 if (!response.ok) throw new Error('Failed to load list');
-                const data = await response.json();
+                const data = (await response.json())[section];
 
                 this.listUl.innerHTML = '';
                 if (this.currentListType === 'blocklist') {
@@ -454,6 +454,7 @@ document.addEventListener('DOMContentLoaded', () => {
             if (statsChatSelector) {
                 statsChatSelector.addEventListener('change', (e) => {
                     this.currentChatId = e.target.value;
+                    if (this.liveController) this.liveController.abort();
                     if (this.currentChatId) this.loadStats();
                     else document.getElementById('stats-container').classList.add('hidden');
                 });
@@ -499,11 +500,12 @@ document.addEventListener('DOMContentLoaded', () => {
             container.classList.add('hidden');
             noDataContainer.classList.add('hidden');
             try {
-                const response = await fetch(`/api/stats/${this.currentChatId}?days=${this.currentPeriod}`, { headers: commonHeaders });
+                const response = await fetch(`/api/chat/${this.currentChatId}/dashboard?fields=stats&days=${this.currentPeriod}`, { headers: commonHeaders });
                 if (!response.ok) throw new Error('Failed to load stats');
-                const data = await response.json();
+                const data = (await response.json()).stats;
                 this.renderStats(data);
                 container.classList.remove('hidden');
+                this.startLiveFeed();
             } catch (error) {
                 console.error('Error loading stats:', error);
                 noDataContainer.classList.remove('hidden');
@@ -512,7 +514,15 @@ document.addEventListener('DOMContentLoaded', () => {
 
         renderStats(data) {
             const { historical, current } = data;
-            const totals = historical.totals || {};
+            this.totals = { ...(historical.totals || {}) };
+            this.renderTotals(this.totals);
+            this.drawActivityChart(historical.daily || []);
+            this.drawHourlyChart(historical.hourly_activity || []);
+            this.renderViolators(historical.top_violators || []);
+            this.renderCurrentStatus(current);
+        },
+
+        renderTotals(totals) {
             document.getElementById('total-messages').textContent = this.formatNumber(totals.total_messages || 0);
             document.getElementById('spam-blocked').textContent = this.formatNumber(totals.total_deleted || 0);
             const userGrowth = (totals.total_joined || 0) - (totals.total_left || 0);
@@ -520,10 +530,46 @@ document.addEventListener('DOMContentLoaded', () => {
             const captchaTotal = (totals.total_captcha_passed || 0) + (totals.total_captcha_failed || 0);
             const captchaRate = captchaTotal > 0 ? Math.round((totals.total_captcha_passed / captchaTotal) * 100) : 0;
             document.getElementById('captcha-success').textContent = captchaRate + '%';
-            this.drawActivityChart(historical.daily || []);
-            this.drawHourlyChart(historical.hourly_activity || []);
-            this.renderViolators(historical.top_violators || []);
-            this.renderCurrentStatus(current);
+        },
+
+        // Живі прирости лічильників (Server-Sent Events через fetch, бо потрібен заголовок X-User-Data)
+        async startLiveFeed() {
+            if (this.liveController) this.liveController.abort();
+            const controller = new AbortController();
+            this.liveController = controller;
+            const chatId = this.currentChatId;
+            const totalsKeys = {
+                messages_total: 'total_messages', messages_deleted: 'total_deleted',
+                users_joined: 'total_joined', users_left: 'total_left',
+                captcha_passed: 'total_captcha_passed', captcha_failed: 'total_captcha_failed',
+                warnings_given: 'total_warnings', bans_given: 'total_bans'
+            };
+            try {
+                const response = await fetch(`/api/stats/${chatId}/live`, { headers: commonHeaders, signal: controller.signal });
+                if (!response.ok || !response.body) return;
+                const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+                let buffer = '';
+                while (true) {
+                    const { value, done } = await reader.read();
+                    if (done) break;
+                    buffer += value;
+                    let boundary;
+                    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                        const event = buffer.slice(0, boundary);
+                        buffer = buffer.slice(boundary + 2);
+                        const dataLine = event.split('\n').find(line => line.startsWith('data: '));
+                        if (!dataLine || chatId !== this.currentChatId) continue;
+                        const { deltas } = JSON.parse(dataLine.slice(6));
+                        for (const [field, delta] of Object.entries(deltas)) {
+                            const key = totalsKeys[field];
+                            if (key) this.totals[key] = (this.totals[key] || 0) + delta;
+                        }
+                        this.renderTotals(this.totals);
+                    }
+                }
+            } catch (error) {
+                if (error.name !== 'AbortError') console.error('Live stats error:', error);
+            }
         },
 
         drawActivityChart(dailyData) {
@@ -701,8 +747,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
                 if (!response.ok) throw new Error('Failed to export');
 
-                const data = await response.json();
-                const blob = new Blob([data.csv], { type: 'text/csv' });
+                const blob = await response.blob();
                 const url = window.URL.createObjectURL(blob);
                 const a = document.createElement('a');
                 a.href = url;